@@ -1,4 +1,8 @@
 from .basetable import Table, TableSet, VectorException
+from .registry import register_reader, register_writer, \
+    register_set_reader, register_set_writer, register_chunk_reader, \
+    register_chunk_writer, register_extensions, register_detector
+from .streaming import iter_read, open_writer
 from .masked import __masked__, set_masked_default
 from .version import __version__
 
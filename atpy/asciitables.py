@@ -128,8 +128,7 @@ def read_ascii(self, filename, **kwargs):
         kwargs.pop('Outputter')
     table = ascii.read(filename, **kwargs)
 
-    for name in table.colnames:
-        self.add_column(name, table[name])
+    self.add_columns([(name, table[name]) for name in table.colnames])
 
 
 def write_ascii(self, filename, **kwargs):
@@ -4,13 +4,17 @@ from __future__ import print_function, division
 
 import string
 import warnings
-from copy import deepcopy
+from collections import namedtuple
 
 import numpy as np
 import numpy.ma as ma
 
 from .exceptions import VectorException
-from .structhelper import append_field, drop_fields
+from .columnstore import ColumnStore
+from .varstring import StringColumn
+from .indexing import PrimaryKeyIndex, KeyLocator, SortedIndex
+from . import operations
+from . import query
 from .odict import odict
 from . import registry
 from .masked import __masked__
@@ -37,21 +41,52 @@ default_format[np.unicode_] = 's'
 
 class ColumnHeader(object):
 
+    __slots__ = ['dtype', 'unit', 'description', 'null', 'format']
+
     def __init__(self, dtype, unit=None, description=None, null=None, format=None):
-        self.__dict__['dtype'] = dtype
+        object.__setattr__(self, 'dtype', dtype)
+        object.__setattr__(self, 'null', null)
         self.unit = unit
         self.description = description
-        self.__dict__['null'] = null
         self.format = format
 
     def __setattr__(self, attribute, value):
         if attribute in ['unit', 'description', 'format']:
-            self.__dict__[attribute] = value
+            object.__setattr__(self, attribute, value)
         elif attribute in ['null', 'dtype']:
             raise Exception("Cannot change %s through the columns object" % attribute)
         else:
             raise AttributeError(attribute)
 
+    def copy(self, **kwargs):
+        '''
+        Return a copy of the header, optionally with different values for
+        some attributes (including dtype and null)
+        '''
+        attributes = dict((name, getattr(self, name)) for name in self.__slots__)
+        attributes.update(kwargs)
+        return ColumnHeader(**attributes)
+
+    def _promoted(self, dtype):
+        '''
+        Return a copy of the header for a column converted to a new type. A
+        default format is changed to the default for the new type.
+        '''
+        format = self.format
+        if self.dtype.kind in 'SU':
+            if format == '%is' % self.dtype.itemsize:
+                format = '%is' % dtype.itemsize
+        elif format == default_format.get(self.dtype.type, None):
+            format = default_format.get(dtype.type, format)
+        return self.copy(dtype=dtype, format=format)
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name in self.__slots__:
+            object.__setattr__(self, name, state[name])
+
     def __repr__(self):
         s = "type=%s" % str(self.dtype)
         if self.unit:
@@ -83,8 +118,79 @@ class ColumnHeader(object):
         return not self.__eq__(other)
 
 
+class Schema(odict):
+    '''
+    The ordered column headers of a table.
+
+    A schema can be shared by reference between several tables, for example
+    a table and the selections returned by where() and rows(), so that
+    creating these tables does not copy any metadata. A table copies a
+    shared schema (but not the headers in it) before giving access to it
+    through Table.columns, and the headers inherited from the shared schema
+    are only copied when they are accessed, so that changing a header
+    through one table does not affect the others.
+    '''
+
+    def __init__(self):
+        odict.__init__(self)
+        self.shared = False
+        self._inherited = set()
+
+    def copy(self):
+        new = odict.copy(self)
+        new._inherited = set(id(header) for header in self._values)
+        return new
+
+    def subset(self, names):
+        '''
+        Return a new schema with only the given columns, in the given order
+        '''
+        new = self.__class__()
+        for name in names:
+            new[name] = odict.__getitem__(self, name)
+        new._inherited = set(id(header) for header in new._values)
+        return new
+
+    def _own(self, index):
+        header = self._values[index]
+        if not self.shared and id(header) in self._inherited:
+            self._inherited.discard(id(header))
+            header = header.copy()
+            self._values[index] = header
+        return header
+
+    def __getitem__(self, key):
+        if type(key) == int:
+            return self._own(key)
+        else:
+            return self._own(self.index(key))
+
+    def _get_values(self):
+        return [self._own(index) for index in range(len(self._values))]
+
+    values = property(_get_values, odict._set_values)
+
+    def items(self):
+        return zip(self._keys, self.values)
+
+    def __eq__(self, other):
+        if not isinstance(other, odict) or self.keys != other.keys:
+            return False
+        for index in range(len(self._keys)):
+            if self._values[index] != other._values[index]:
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
 class Table(object):
 
+    # The class used to store the column data. This can be overridden by
+    # subclasses to use a different storage backend.
+    _store_class = ColumnStore
+
     def fits_read(self, *args, **kwargs):
         warnings.warn("WARNING: fits_read is deprecated; use read instead")
         kwargs['type'] = 'fits'
@@ -182,6 +288,16 @@ class Table(object):
                 The read method attempts to automatically guess the
                 file/database format based on the arguments supplied. The type
                 can be overridden by setting this argument.
+
+            *compact*: [ True | False ]
+                Whether to convert each column to the smallest type that can
+                hold its values after reading (see Table.compact)
+
+            *columns*: [ list of strings ]
+                The names of the columns to read, in the order in which they
+                should appear in the table. Table types that support it only
+                read these columns from the file/database, and for other
+                table types the remaining columns are removed after reading.
         '''
 
         if 'verbose' in kwargs:
@@ -189,12 +305,17 @@ class Table(object):
         else:
             verbose = True
 
+        compact = kwargs.pop('compact', False)
+
+        columns = kwargs.pop('columns', None)
+
+        if type(columns) == str:
+            columns = [columns]
+
         if 'type' in kwargs:
             table_type = kwargs.pop('type').lower()
-        elif isinstance(args[0], basestring):
-            table_type = registry._determine_type(args[0], verbose)
         else:
-            raise Exception('Could not determine table type')
+            table_type, args = registry._detect_type(args, verbose)
 
         original_filters = warnings.filters[:]
 
@@ -211,6 +332,8 @@ class Table(object):
                 warnings.simplefilter("ignore")
 
             if table_type in registry._readers:
+                if columns is not None and table_type in registry._column_readers:
+                    kwargs['columns'] = columns
                 registry._readers[table_type](self, *args, **kwargs)
             else:
                 raise Exception("Unknown table type: " + table_type)
@@ -218,6 +341,12 @@ class Table(object):
         finally:
             warnings.filters = original_filters
 
+        if columns is not None:
+            self._project(columns)
+
+        if compact:
+            self.compact(narrow=True)
+
         return
 
     def write(self, *args, **kwargs):
@@ -266,10 +395,97 @@ class Table(object):
 
         return
 
+    def _get_data(self):
+        return self._store.structured()
+
+    def _set_data(self, data):
+        self._store.set_structured(data)
+        self._sorted_by = None
+        self._stats = {}
+
+    data = property(_get_data, _set_data, doc='''
+        A structured array containing all the columns. This is built from the
+        individual columns the first time it is accessed after the columns
+        have been changed.
+        ''')
+
+    # The schema, keywords, and comments can be shared between a table and
+    # the tables returned by where() and rows(). The schema is copied (see
+    # Schema) when it is accessed through the columns attribute, and the
+    # keywords and comments are copied the first time they are accessed, on
+    # a table that shares them. Methods that only read the column headers
+    # use _schema to avoid copying.
+
+    def _share_metadata(self, table):
+        self.__dict__['_schema'] = table._schema
+        self.__dict__['_schema'].shared = True
+        for attribute in ['_keywords', '_comments']:
+            self.__dict__[attribute] = table.__dict__[attribute]
+        self.__dict__['_shared_metadata'] = True
+        table.__dict__['_shared_metadata'] = True
+
+    def _unshare_metadata(self):
+        if self.__dict__.get('_shared_metadata', False):
+            self.__dict__['_keywords'] = self.__dict__['_keywords'].copy()
+            self.__dict__['_comments'] = self.__dict__['_comments'][:]
+            self.__dict__['_shared_metadata'] = False
+
+    def _get_columns(self):
+        if self._schema.shared:
+            self._schema = self._schema.copy()
+        return self._schema
+
+    def _set_columns(self, columns):
+        if not isinstance(columns, Schema):
+            schema = Schema()
+            for name, column in columns.items():
+                schema[name] = column
+            columns = schema
+        self._schema = columns
+
+    def _get_schema(self):
+        self._schema.shared = True
+        return self._schema
+
+    def _set_schema(self, schema):
+        if list(schema.keys) != list(self.names):
+            raise Exception("Column names do not match")
+        for name in schema:
+            if odict.__getitem__(schema, name).dtype != self._store.column(name).dtype:
+                raise Exception("Column types do not match")
+        schema.shared = True
+        self._schema = schema
+
+    def _get_keywords(self):
+        self._unshare_metadata()
+        return self.__dict__['_keywords']
+
+    def _set_keywords(self, keywords):
+        self._unshare_metadata()
+        self.__dict__['_keywords'] = keywords
+
+    def _get_comments(self):
+        self._unshare_metadata()
+        return self.__dict__['_comments']
+
+    def _set_comments(self, comments):
+        self._unshare_metadata()
+        self.__dict__['_comments'] = comments
+
+    columns = property(_get_columns, _set_columns)
+    schema = property(_get_schema, _set_schema, doc='''
+        The column headers, as a Schema object that is shared with the table
+        rather than copied. This can be assigned to another table with the
+        same column names and types, so that tables with the same layout
+        (for example read from many files) share a single set of headers.
+        ''')
+    keywords = property(_get_keywords, _set_keywords)
+    comments = property(_get_comments, _set_comments)
+
     def __getattr__(self, attribute):
 
         if attribute == 'names':
-            return self.__dict__['data'].dtype.names
+            return self._store.names
         elif attribute == 'units':
             print("WARNING: Table.units is deprecated - use Table.columns to access this information")
             return dict([(name, self.columns[name].unit) for name in self.names])
@@ -283,48 +499,205 @@ class Table(object):
             print("WARNING: Table.formats is deprecated - use Table.columns to access this information")
             return dict([(name, self.columns[name].format) for name in self.names])
         elif attribute == 'shape':
-            return (len(self.data), len(self.names))
+            return (self.__len__(), len(self.names))
         else:
             try:
-                return self.__dict__['data'][attribute]
+                return self.__dict__['_store'].column(attribute)
             except:
                 raise AttributeError(attribute)
 
     def __getitem__(self, item):
+        if isinstance(item, basestring) and item in self._store:
+            return self._store.column(item)
         return self.data[item]
 
     def __setitem__(self, item, value):
-        if 'data' in self.__dict__:
-            if isinstance(self.data, np.ndarray):
-                if item in self.data.dtype.names:
-                    self.data[item] = value
-                    return
+        if '_store' in self.__dict__:
+            if isinstance(item, basestring) and item in self._store:
+                self._store.set_values(item, value)
+                self._column_modified(item)
+                return
         raise ValueError("Column %s does not exist" % item)
 
     def keys(self):
-        return self.data.dtype.names
+        return self._store.names
 
-    def append(self, table):
+    def _check_compatible(self, table):
+        if self._schema is table._schema:
+            return
+        if self.columns.keys != table.columns.keys:
+            raise Exception("Column names do not match")
         for colname in self.columns:
-            if self.columns.keys != table.columns.keys:
-                raise Exception("Column names do not match")
             if self.columns[colname].dtype.type != table.columns[colname].dtype.type:
                 raise Exception("Column types do not match")
-        self.data = np.hstack((self.data, table.data))
 
-    def __setattr__(self, attribute, value):
-        if 'data' in self.__dict__:
-            if isinstance(self.data, np.ndarray):
-                if attribute in self.data.dtype.names:
-                    self.data[attribute] = value
-                    return
-        self.__dict__[attribute] = value
+    def _extend_primary_index(self, table):
+        if self._primary_index is not None:
+            self._primary_index.extend(table._store.column(self._primary_key), len(self))
+
+    def append(self, table):
+        self._check_compatible(table)
+        self._extend_primary_index(table)
+        self._store.extend(table._store)
+        self._invalidate_indexes()
+        self._sorted_by = None
+        self._stats = {}
+
+    def append_rows(self, table):
+        '''
+        Append the rows of another table with the same columns. Unlike
+        append(), this keeps spare space at the end of each column (doubling
+        it when it runs out), so that appending many small tables one after
+        the other takes a time proportional to the total number of rows. Use
+        freeze() once all the rows have been appended to release the spare
+        space.
+
+        Required Arguments:
+
+            *table*: [ Table ]
+                The table containing the rows to append. If this table has
+                no columns yet, the columns and metadata are taken from this
+                table.
+        '''
 
-    def __len__(self):
         if len(self.columns) == 0:
-            return 0
+            self._share_metadata(table)
+            self._store = table._store.take(slice(None))
+            self._store.materialize()
+            return
+
+        self._check_compatible(table)
+        self._extend_primary_index(table)
+        self._store.append_rows(table._store)
+        self._invalidate_indexes()
+        self._sorted_by = None
+        self._stats = {}
+
+    def freeze(self):
+        '''
+        Release the spare space left at the end of the columns by
+        append_rows().
+        '''
+
+        self._store.freeze()
+
+        return
+
+    @classmethod
+    def concatenate(cls, tables):
+        '''
+        Return a new table containing the rows of several tables, one after
+        the other. The tables should have the same columns, but the columns
+        can have different types as long as they are all numerical or all
+        strings, in which case the type that can hold all the values is used
+        (e.g. the longest string). The metadata is taken from the first
+        table.
+
+        Required Arguments:
+
+            *tables*: [ list of Table instances, or iterable ]
+                The tables to concatenate. If this is a list or tuple, the
+                total number of rows is computed first, and each column is
+                only allocated once. Otherwise, the tables are appended one
+                at a time with append_rows(), so that each table can be
+                released (for example when reading them from a generator).
+        '''
+
+        if not isinstance(tables, (list, tuple)):
+            table = None
+            for other in tables:
+                if table is None:
+                    table = cls()
+                    table._masked = other._masked
+                    table.table_name = other.table_name
+                    table.append_rows(other)
+                    primary_key = other._primary_key
+                else:
+                    schema = table._promoted_schema([other])
+                    table._store.append_rows(other._store)
+                    table._schema = schema
+            if table is None:
+                raise Exception("No tables to concatenate")
+            table.freeze()
         else:
-            return len(self.data)
+            if len(tables) == 0:
+                raise Exception("No tables to concatenate")
+            first = tables[0]
+            table = cls()
+            table._masked = first._masked
+            table.table_name = first.table_name
+            table._share_metadata(first)
+            table._schema = first._promoted_schema(tables[1:])
+            table._store = first._store_class.concatenate([other._store for other in tables])
+            primary_key = first._primary_key
+
+        if primary_key is not None:
+            table.set_primary_key(primary_key)
+
+        return table
+
+    def _promoted_schema(self, tables):
+        '''
+        Check that the columns of other tables are compatible with the
+        columns of this table, and return the column headers with the types
+        that can hold the values of all the tables
+        '''
+
+        schema = self._schema
+
+        for table in tables:
+
+            if table._schema is schema:
+                continue
+
+            if list(schema.keys) != list(table._schema.keys):
+                raise Exception("Column names do not match")
+
+            for name in schema:
+
+                header = odict.__getitem__(schema, name)
+                other = odict.__getitem__(table._schema, name)
+
+                if header.dtype == other.dtype:
+                    continue
+
+                if (header.dtype.kind in 'SU') != (other.dtype.kind in 'SU'):
+                    raise Exception("Column types do not match")
+
+                dtype = np.promote_types(header.dtype, other.dtype)
+
+                if dtype == header.dtype:
+                    continue
+
+                if schema is self._schema:
+                    schema = schema.copy()
+                schema[name] = header._promoted(dtype)
+
+        return schema
+
+    def __setattr__(self, attribute, value):
+        if '_store' in self.__dict__:
+            if attribute in self._store:
+                self._store.set_values(attribute, value)
+                self._column_modified(attribute)
+                return
+        object.__setattr__(self, attribute, value)
+
+    def _column_modified(self, name):
+        '''
+        Discard the indexes, sort order, and statistics that depend on a
+        column whose values have been changed
+        '''
+        self._stats.pop(name, None)
+        if name == self._primary_key:
+            self._primary_index = None
+        if name in self._indexes:
+            self._indexes[name] = None
+        if self._sorted_by is not None and name in [key for key, _ in self._sorted_by]:
+            self._sorted_by = None
+
+    def __len__(self):
+        return len(self._store)
 
     def reset(self):
         '''
@@ -332,15 +705,19 @@ class Table(object):
         '''
         self.keywords = odict()
         self.comments = []
-        self.columns = odict()
-        self.data = None
+        self.columns = Schema()
+        self._store = self._store_class()
         self._primary_key = None
+        self._primary_index = None
+        self._indexes = {}
+        self._sorted_by = None
+        self._stats = {}
         return
 
     def _raise_vector_columns(self):
         names = []
         for name in self.names:
-            if self.data[name].ndim > 1:
+            if self._store.column(name).ndim > 1:
                 names.append(name)
         if names:
             names = string.join(names, ", ")
@@ -456,7 +833,8 @@ class Table(object):
             after=after, position=position)
 
     def add_column(self, name, data, unit='', null='', description='', \
-        format=None, dtype=None, column_header=None, before=None, after=None, position=None, mask=None, fill=None):
+        format=None, dtype=None, column_header=None, before=None, after=None, position=None, mask=None, fill=None,
+        categorical=False, variable_length=False):
         '''
         Add a column to the table
 
@@ -511,6 +889,115 @@ class Table(object):
             *fill*: [ value ]
                 If masked arrays are used, this value is used as the fill
                 value in the numpy masked array.
+
+            *categorical*: [ True | False ]
+                Whether to store the column as categorical (see
+                Table.set_categorical)
+
+            *variable_length*: [ True | False ]
+                Whether to store the column as variable-length strings (see
+                Table.set_variable_length)
+        '''
+
+        if before:
+            try:
+                position = list(self.names).index(before)
+            except:
+                raise Exception("Column %s does not exist" % before)
+        elif after:
+            try:
+                position = list(self.names).index(after) + 1
+            except:
+                raise Exception("Column %s does not exist" % before)
+
+        data, column = self._prepare_column(data, unit=unit, null=null, \
+            description=description, format=format, dtype=dtype, \
+            column_header=column_header, mask=mask, fill=fill, \
+            variable_length=variable_length)
+
+        self._store.add(name, data, position=position)
+
+        if categorical:
+            self._store.set_categorical(name)
+
+        if not np.equal(position, None):
+            self.columns.insert(position, name, column)
+        else:
+            self.columns[name] = column
+
+        return
+
+    def add_columns(self, columns, before=None, after=None, position=None):
+        '''
+        Add several columns to the table at once. This is faster than calling
+        add_column for each column, since the columns are validated together
+        and the table is only updated once.
+
+        Required Arguments:
+
+            *columns*: [ list of tuples ]
+                A list of (name, data) or (name, data, metadata) tuples, where
+                metadata is a dictionary containing any of the optional
+                keyword arguments of add_column that describe a single column
+                (unit, null, description, format, dtype, column_header, mask,
+                fill, and variable_length).
+
+        Optional Keyword Arguments:
+
+            *before*: [ string ]
+                Column before which the new columns should be inserted
+
+            *after*: [ string ]
+                Column after which the new columns should be inserted
+
+            *position*: [ integer ]
+                Position at which the new columns should be inserted (0 =
+                first column)
+        '''
+
+        if before:
+            try:
+                position = list(self.names).index(before)
+            except:
+                raise Exception("Column %s does not exist" % before)
+        elif after:
+            try:
+                position = list(self.names).index(after) + 1
+            except:
+                raise Exception("Column %s does not exist" % after)
+
+        names, arrays, headers = [], [], []
+
+        for item in columns:
+
+            if len(item) == 2:
+                name, data = item
+                metadata = {}
+            else:
+                name, data, metadata = item
+
+            data, column = self._prepare_column(data, **metadata)
+
+            names.append(name)
+            arrays.append(data)
+            headers.append(column)
+
+        self._store.add_many(names, arrays, position=position)
+
+        for i, name in enumerate(names):
+            if np.equal(position, None):
+                self.columns[name] = headers[i]
+            else:
+                self.columns.insert(position + i, name, headers[i])
+
+        return
+
+    def _prepare_column(self, data, unit='', null='', description='', \
+        format=None, dtype=None, column_header=None, mask=None, fill=None,
+        variable_length=False):
+        '''
+        Convert data to an array suitable for storing in the table, and
+        create the corresponding column header.
         '''
 
         if column_header is not None:
@@ -535,10 +1022,17 @@ class Table(object):
                 warnings.warn("format= argument overriden by column_header=")
             format = column_header.format
 
-        if self._masked:
+        if variable_length or isinstance(data, StringColumn):
+            if self._masked:
+                if mask is None:
+                    mask = np.zeros(len(data), dtype=bool)
+                data = StringColumn.from_values(data, mask=np.asarray(mask, dtype=bool))
+            else:
+                data = StringColumn.from_values(data)
+        elif self._masked:
             if null:
                 warnings.warn("null= argument can only be used if Table does not use masked arrays (ignored)")
-            data = ma.array(data, dtype=dtype, mask=mask, fill_value=fill)
+            data = ma.array(data, dtype=dtype, mask=mask, fill_value=fill, copy=True)
         else:
             if np.any(mask):
                 warnings.warn("mask= argument can only be used if Table uses masked arrays (ignored)")
@@ -560,30 +1054,6 @@ class Table(object):
 
             dtype = data.dtype
 
-        if data.ndim > 1:
-            newdtype = (name, data.dtype, (data.shape[1],))
-        else:
-            newdtype = (name, data.dtype)
-
-        if before:
-            try:
-                position = list(self.names).index(before)
-            except:
-                raise Exception("Column %s does not exist" % before)
-        elif after:
-            try:
-                position = list(self.names).index(after) + 1
-            except:
-                raise Exception("Column %s does not exist" % before)
-
-        if len(self.columns) > 0:
-            self.data = append_field(self.data, data, dtype=newdtype, position=position, masked=self._masked)
-        else:
-            if self._masked:
-                self.data = ma.array(zip(data), dtype=[newdtype], mask=zip(data.mask), fill_value=data.fill_value)
-            else:
-                self.data = np.array(zip(data), dtype=[newdtype])
-
         if not format or format in ['e', 'g', 'f']:
             format = default_format[dtype.type]
 
@@ -596,12 +1066,21 @@ class Table(object):
 
         column = ColumnHeader(dtype, unit=unit, description=description, null=null, format=format)
 
-        if not np.equal(position, None):
-            self.columns.insert(position, name, column)
-        else:
-            self.columns[name] = column
+        return data, column
 
-        return
+    def _add_arrays(self, names, arrays, headers):
+        '''
+        Add columns from arrays that are already owned by the table, without
+        copying them.
+        '''
+
+        if self._masked:
+            arrays = [ma.array(array, copy=False) for array in arrays]
+
+        self._store.add_many(names, arrays)
+
+        for i, name in enumerate(names):
+            self.columns[name] = headers[i]
 
     def remove_column(self, remove_name):
         print("WARNING: remove_column is deprecated - use remove_columns instead")
@@ -624,11 +1103,22 @@ class Table(object):
         for remove_name in remove_names:
             self.columns.pop(remove_name)
 
-        self.data = drop_fields(self.data, remove_names, masked=self._masked)
+        self._store.remove(remove_names)
 
         # Remove primary key if needed
         if self._primary_key in remove_names:
             self._primary_key = None
+            self._primary_index = None
+
+        for remove_name in remove_names:
+            self._indexes.pop(remove_name, None)
+            self._stats.pop(remove_name, None)
+
+        if self._sorted_by is not None:
+            for key, _ in self._sorted_by:
+                if key in remove_names:
+                    self._sorted_by = None
+                    break
 
         return
 
@@ -655,6 +1145,203 @@ class Table(object):
 
         return
 
+    def select_columns(self, names):
+        '''
+        Return a new table containing only specific columns, without copying
+        any data. The new table shares its data with the original table, so
+        that changes to the values in one are seen in the other. Use
+        compact() on the new table to give it its own copy of the data.
+
+        Required Argument:
+
+            *names*: [ list of strings ]
+                A list containing the names of the columns to select, in the
+                order in which they should appear in the new table.
+
+        Returns:
+
+            A new table instance, containing only the columns selected
+        '''
+
+        if type(names) == str:
+            names = [names]
+
+        new_table = self.__class__()
+
+        new_table.table_name = self.table_name
+
+        new_table._share_metadata(self)
+
+        new_table._schema = self._schema.subset(names)
+
+        new_table._store = self._store.project(names)
+
+        if self._primary_key in names:
+            new_table._primary_key = self._primary_key
+
+        for name in self._indexes:
+            if name in names:
+                new_table._indexes[name] = self._indexes[name]
+
+        if self._sorted_by is not None:
+            if all(key in names for key, _ in self._sorted_by):
+                new_table._sorted_by = self._sorted_by
+
+        for name in names:
+            if name in self._stats:
+                new_table._stats[name] = self._stats[name].copy()
+
+        return new_table
+
+    def _project(self, names):
+        '''
+        Keep only the given columns, in the given order. This is used after
+        reading to select the columns for table types that cannot read only
+        some of the columns.
+        '''
+
+        for name in names:
+            if not name in self.names:
+                raise Exception("Column %s does not exist" % name)
+
+        if list(self.names) == list(names):
+            return
+
+        self.keep_columns(names)
+
+        if list(self.names) != list(names):
+            self._schema = self._schema.subset(names)
+            self._store = self._store.project(names)
+
+    def compact(self, narrow=False, tolerance=0.):
+        '''
+        Give each column its own contiguous copy of the data. This is useful
+        after select_columns() to release the memory used by the original
+        table, or before writing out a table that is a view into a larger
+        table.
+
+        Optional Keyword Arguments:
+
+            *narrow*: [ True | False ]
+                Whether to also convert each column to the smallest type that
+                can hold its values: integer columns are converted to the
+                smallest integer type (or to booleans if they only contain 0
+                and 1), and 64-bit float columns to 32-bit floats if this
+                does not change the values.
+
+            *tolerance*: [ float ]
+                The largest relative error allowed when converting 64-bit
+                floats to 32-bit floats (default is 0).
+
+        Returns the number of bytes saved by narrowing the columns.
+        '''
+
+        self._store.compact()
+
+        if not narrow:
+            return 0
+
+        saved = 0
+
+        for name in self.names:
+
+            values = self._store.column(name)
+            dtype = operations.narrow_dtype(values, self.stats(name),
+                                            self._schema[name].null, tolerance)
+
+            if dtype is None:
+                continue
+
+            saved += values.size * (values.dtype.itemsize - dtype.itemsize)
+
+            if isinstance(values, ma.MaskedArray):
+                fill_value = values.fill_value
+                if not operations._fits(fill_value, dtype):
+                    fill_value = None
+                values = ma.array(ma.getdata(values).astype(dtype),
+                                  mask=ma.getmaskarray(values),
+                                  fill_value=fill_value)
+            else:
+                values = values.astype(dtype)
+
+            self._store.replace(name, values)
+
+            columns = self.columns
+            columns[name] = columns[name].copy(dtype=values.dtype)
+
+            # The values are unchanged, so the sort order is kept
+            if name == self._primary_key:
+                self._primary_index = None
+            if name in self._indexes:
+                self._indexes[name] = None
+            self._stats.pop(name, None)
+
+        return saved
+
+    def set_categorical(self, name):
+        '''
+        Store a column as categorical, that is, as an array of integer codes
+        and a sorted array of the distinct values in the column. This saves
+        memory for string columns with few distinct values, and makes
+        sorting, grouping, and comparisons in query() use the codes rather
+        than the values.
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the column
+
+        The values are decoded each time the column is accessed (e.g. t.a),
+        so changes should be made by setting the column through the table
+        (e.g. t.a = values) rather than by modifying the returned array. The
+        decoded values are used when writing the table out.
+        '''
+
+        if not name in self.names:
+            raise Exception("No such column: %s" % name)
+
+        self._store.set_categorical(name)
+
+        return
+
+    def set_variable_length(self, name):
+        '''
+        Store a string column as variable-length strings, that is, as a
+        single buffer containing all the strings one after the other, and
+        the position of each string in the buffer. This saves memory for
+        columns where a few strings are much longer than the others, since
+        the strings are not padded to the length of the longest one.
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the column
+
+        The column is then returned as a StringColumn (e.g. t.a), which can
+        be indexed like an array and provides vectorized lengths(),
+        equal(), and startswith() methods. In query(), the startswith() and
+        strlen() functions can be used with these columns. Values should be
+        changed by setting the column through the table (e.g. t.a = values).
+        '''
+
+        if not name in self.names:
+            raise Exception("No such column: %s" % name)
+
+        self._store.set_variable_length(name)
+
+        return
+
+    def _key_values(self, name):
+        '''
+        Return the values of a column to use for sorting or grouping, which
+        are the codes for categorical columns
+        '''
+        if self._store.is_categorical(name):
+            return self._store.codes(name)
+        elif self._store.is_variable_length(name):
+            return self._store.column(name).to_array()
+        return self._store.column(name)
+
     def rename_column(self, old_name, new_name):
         '''
         Rename a column from the table
@@ -674,19 +1361,24 @@ class Table(object):
         if not old_name in self.names:
             raise Exception("Column " + old_name + " not found")
 
-        # tuple.index was only introduced in Python 2.6, so need to use list()
-        pos = list(self.names).index(old_name)
-        self.data.dtype.names = self.names[:pos] + (new_name, ) + self.names[pos + 1:]
-
-        if self._masked:
-            self.data.mask.dtype.names = self.data.dtype.names[:]
+        self._store.rename(old_name, new_name)
 
         self.columns.rename(old_name, new_name)
 
-        # Update primary key if needed
+        # Update primary key and indexes if needed
         if self._primary_key == old_name:
             self._primary_key = new_name
 
+        if old_name in self._indexes:
+            self._indexes[new_name] = self._indexes.pop(old_name)
+
+        if old_name in self._stats:
+            self._stats[new_name] = self._stats.pop(old_name)
+
+        if self._sorted_by is not None:
+            self._sorted_by = [(new_name if key == old_name else key, r)
+                               for key, r in self._sorted_by]
+
         return
 
     def describe(self):
@@ -694,7 +1386,7 @@ class Table(object):
         Prints a description of the table
         '''
 
-        if self.data is None:
+        if len(self.names) == 0:
             print("Table is empty")
             return
 
@@ -736,7 +1428,52 @@ class Table(object):
 
         return
 
-    def sort(self, keys):
+    def stats(self, name):
+        '''
+        Return statistics for a column, as a tuple with the fields min, max,
+        count, null_count, mean, and std. Masked values, values equal to the
+        column null value, and NaN values are counted in null_count and are
+        excluded from the other statistics. The mean and standard deviation
+        are None for string columns.
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the column
+
+        The statistics are computed the first time they are requested, and
+        are kept until the column is modified through the table (e.g.
+        t['a'] = values) or rows are appended. Changes made in place to the
+        column arrays (e.g. t.a[0] = 1) are not detected.
+        '''
+
+        if not name in self.names:
+            raise Exception("No such column: %s" % name)
+
+        cached = self._stats.get(name, {})
+
+        if len(cached) < len(operations.ColumnStats._fields):
+            column = self._store.column(name)
+            result = operations.column_stats(column, self._schema[name].null)
+            cached = result._asdict()
+            self._stats[name] = cached
+
+        return operations.ColumnStats(**cached)
+
+    def _null_count(self, name):
+        if 'null_count' in self._stats.get(name, {}):
+            return self._stats[name]['null_count']
+        return self.stats(name).null_count
+
+    def _cache_stats(self, name, **stats):
+        '''
+        Record statistics for a column that are already known, for example
+        because they were found while reading the column from a file. The
+        statistics not given are computed when they are needed.
+        '''
+        self._stats.setdefault(name, {}).update(stats)
+
+    def sort(self, keys, reverse=False):
         '''
         Sort the table according to one or more keys. This operates
         on the existing table (and does not return a new table).
@@ -745,10 +1482,62 @@ class Table(object):
 
             *keys*: [ string | list of strings ]
                 The key(s) to order by
+
+        Optional Keyword Arguments:
+
+            *reverse*: [ True | False | list of booleans ]
+                Whether to sort in descending order, either for all the keys
+                or separately for each key.
+
+        The sort is stable, and masked values are placed last. The table
+        remembers the keys it was last sorted by, so that sorting again by
+        the same keys (or by the first of these keys) does nothing, and so
+        that between() and lookup() on the first key use a binary search.
+        This is forgotten when the values of a key column are set through
+        the table (but not when the arrays are modified in place).
         '''
+
         if not type(keys) == list:
             keys = [keys]
-        self.data.sort(order=keys)
+
+        if type(reverse) == list:
+            if len(reverse) != len(keys):
+                raise Exception("reverse= should have one value for each key")
+        else:
+            reverse = [reverse] * len(keys)
+
+        for key in keys:
+            if not key in self.names:
+                raise Exception("No such column: %s" % key)
+
+        sorted_by = list(zip(keys, [bool(r) for r in reverse]))
+
+        if self._sorted_by is not None and \
+            self._sorted_by[:len(sorted_by)] == sorted_by:
+            return
+
+        order = operations.sort_order([self._key_values(key) for key in keys], reverse)
+
+        self._store.reorder(order)
+        self._primary_index = None
+        self._invalidate_indexes()
+        self._sorted_by = sorted_by
+
+    def _sorted_on(self, name):
+        '''
+        Return the number of rows (excluding masked values) that are known to
+        be in ascending order of a column, or None if they are not
+        '''
+
+        if self._sorted_by is None or self._sorted_by[0] != (name, False):
+            return None
+
+        values = self._store.column(name)
+
+        if isinstance(values, ma.MaskedArray):
+            return len(values) - ma.count_masked(values)
+        else:
+            return len(values)
 
     def row(self, row_number, python_types=False):
         '''
@@ -771,6 +1560,74 @@ class Table(object):
         else:
             return self.data[row_number]
 
+    def iter_chunks(self, nrows, as_table=False):
+        '''
+        Iterate over the table in chunks of a fixed number of rows
+
+        Required Arguments:
+
+            *nrows*: [ integer ]
+                The number of rows in each chunk (the last chunk may be
+                shorter)
+
+        Optional Keyword Arguments:
+
+            *as_table*: [ True | False ]
+                Whether to return each chunk as a dictionary of column
+                arrays (False) or as a table instance (True)
+
+        The column arrays in the chunks are views into the columns of the
+        table, or for a selection returned by where(), are only gathered for
+        the rows in the chunk.
+        '''
+
+        if nrows < 1:
+            raise Exception("nrows should be a positive integer")
+
+        n_rows = len(self)
+
+        for start in range(0, n_rows, nrows):
+            end = min(start + nrows, n_rows)
+            if as_table:
+                yield self.where(slice(start, end))
+            else:
+                chunk = odict()
+                for name in self.names:
+                    chunk[name] = self._store.column_chunk(name, start, end)
+                yield chunk
+
+    def iter_rows(self, named=False, chunk_size=10000):
+        '''
+        Iterate over the rows of the table, with python types
+
+        Optional Keyword Arguments:
+
+            *named*: [ True | False ]
+                Whether to return each row as a tuple (False) or as a named
+                tuple with the column names as fields (True)
+
+            *chunk_size*: [ integer ]
+                The number of rows converted to python types at a time
+
+        This is much faster than calling row() for each row, since the values
+        are converted one column and one chunk at a time. Masked values are
+        returned as None.
+        '''
+
+        if named:
+            row_class = namedtuple('Row', self.names, rename=True)._make
+        else:
+            row_class = None
+
+        for chunk in self.iter_chunks(chunk_size):
+            rows = zip(*[values.tolist() for values in chunk.values])
+            if row_class is None:
+                for row in rows:
+                    yield row
+            else:
+                for row in rows:
+                    yield row_class(row)
+
     def rows(self, row_ids):
         '''
         Select specific rows from the table and return a new table instance
@@ -799,20 +1656,90 @@ class Table(object):
         Returns:
 
             A new table instance, containing only the rows selected
+
+        The new table only holds the numbers of the selected rows. The data
+        for each column is gathered from this table the first time the column
+        is accessed, so that successive selections do not copy the data.
+        Until then, a column of this table is copied the first time it is
+        accessed (e.g. t.a or t.data), so that changing its values in place
+        does not affect the new table. Use compact() on the new table to
+        gather all the columns immediately.
         '''
 
         new_table = self.__class__()
 
-        new_table.table_name = deepcopy(self.table_name)
+        new_table.table_name = self.table_name
+
+        new_table._share_metadata(self)
+
+        new_table._store = self._store.take(mask)
+
+        # The primary key index is rebuilt when it is next needed
+        new_table._primary_key = self._primary_key
 
-        new_table.columns = deepcopy(self.columns)
-        new_table.keywords = deepcopy(self.keywords)
-        new_table.comments = deepcopy(self.comments)
+        # Sorted indexes that have been built are remapped now, so that later
+        # changes to this table do not affect them. The others are rebuilt
+        # from the selected values when they are next needed.
+        if self._preserves_order(mask):
+            selection = mask
+            if isinstance(selection, slice) or np.asarray(selection).dtype != np.bool_:
+                selection = self._rows_to_mask(selection)
+        else:
+            selection = None
+
+        for name in self._indexes:
+            index = self._indexes[name]
+            if index is not None and selection is not None:
+                new_table._indexes[name] = index.remap(np.asarray(selection))
+            else:
+                new_table._indexes[name] = None
 
-        new_table.data = self.data[mask]
+        # Selecting rows in increasing order keeps them sorted
+        if self._sorted_by is not None and self._preserves_order(mask):
+            new_table._sorted_by = self._sorted_by
 
         return new_table
 
+    def _preserves_order(self, mask):
+        '''
+        Return whether a selection of rows keeps them in the same order
+        '''
+        if isinstance(mask, slice):
+            return mask.step is None or mask.step > 0
+        mask = np.asarray(mask)
+        if mask.dtype == np.bool_ or mask.size < 2:
+            return True
+        return bool(mask.min() >= 0 and np.all(np.diff(mask) > 0))
+
+    def query(self, expression):
+        '''
+        Select the rows for which an expression is true and return a new
+        table instance
+
+        Required Arguments:
+
+            *expression*: [ string ]
+                An expression using the column names, for example
+                "mag < 15 and (ra > 10) & flag == 0". Comparisons, arithmetic
+                operators, and/or/not (or &, | and ~, which have the same
+                meaning and precedence), and the functions abs, sqrt, exp,
+                log, log10, sin, cos, tan, arcsin, arccos, arctan, arctan2,
+                floor, ceil, isnan, and isfinite can be used.
+
+        Returns:
+
+            A new table instance, containing only the rows selected, as
+            returned by where()
+
+        The expression is evaluated for a limited number of rows at a time,
+        so that the temporary arrays do not grow with the size of the table,
+        and the parts of an and (or) expression are only evaluated for rows
+        for which the previous parts are true (false). Comparisons involving
+        masked values are neither true nor false, so that the rows with
+        masked values are not selected by the comparison or its negation.
+        '''
+        return self.where(query.query_rows(self, expression))
+
     def add_comment(self, comment):
         '''
         Add a comment to the table
@@ -855,21 +1782,249 @@ class Table(object):
 
             *key*: [ string ]
                 The column to use as a primary key
+
+        This also builds a hash index on the column, which is used to look up
+        rows by key with the loc attribute (see Table.loc).
         '''
 
         if not key in self.names:
             raise Exception("No such column: %s" % key)
-        else:
-            if self.columns[key].null != '':
-                if np.any(self.data[key] == self.columns[key].null):
-                    raise Exception("Primary key column cannot contain null values")
-            elif len(np.unique(self.data[key])) != len(self.data[key]):
-                raise Exception("Primary key column cannot contain duplicate values")
-            else:
-                self._primary_key = key
+
+        if self._null_count(key) > 0:
+            raise Exception("Primary key column cannot contain null values")
+
+        self._primary_index = PrimaryKeyIndex(self._store.column(key))
+        self._primary_key = key
+
+        return
+
+    def _get_primary_index(self):
+        if self._primary_key is None:
+            raise Exception("Table does not have a primary key")
+        if self._primary_index is None:
+            self._primary_index = PrimaryKeyIndex(self._store.column(self._primary_key))
+        return self._primary_index
+
+    def add_index(self, name):
+        '''
+        Add a sorted index on a column, which makes between() and lookup()
+        on that column use a binary search instead of scanning the whole
+        column. The index is kept when selecting rows with where() or rows(),
+        and is rebuilt when needed after the column is modified.
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the column to index
+        '''
+
+        if not name in self.names:
+            raise Exception("No such column: %s" % name)
+
+        if self._store.column(name).ndim > 1:
+            raise Exception("Cannot index vector column %s" % name)
+
+        self._indexes[name] = SortedIndex(self._store.column(name))
+
+        return
+
+    def remove_index(self, name):
+        '''
+        Remove the sorted index on a column
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the indexed column
+        '''
+
+        if not name in self._indexes:
+            raise Exception("Column %s is not indexed" % name)
+
+        self._indexes.pop(name)
 
         return
 
+    def _invalidate_indexes(self):
+        for name in self._indexes:
+            self._indexes[name] = None
+
+    def _get_index(self, name):
+        '''
+        Return the sorted index for a column, or None if the column is not
+        indexed
+        '''
+
+        if not name in self._indexes:
+            return None
+
+        index = self._indexes[name]
+
+        if index is None:
+            index = SortedIndex(self._store.column(name))
+
+        self._indexes[name] = index
+
+        return index
+
+    def _get_sorted_index(self, name):
+        '''
+        Return the sorted index for a column, or an index using the column
+        values directly if the table is sorted by the column, or None
+        '''
+
+        index = self._get_index(name)
+
+        if index is None:
+            n_sorted = self._sorted_on(name)
+            if n_sorted is not None:
+                values = ma.getdata(self._store.column(name))[:n_sorted]
+                index = SortedIndex.from_sorted(values)
+
+        return index
+
+    def between(self, name, low, high):
+        '''
+        Select the rows for which the value in a column is between two values
+        (inclusive) and return a new table instance. If the column is indexed
+        (see add_index), or the table is sorted by the column (see sort), a
+        binary search is used.
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the column
+
+            *low*, *high*: [ value ]
+                The limits of the range of values to select
+
+        Returns:
+
+            A new table instance, containing only the rows selected
+        '''
+
+        index = self._get_sorted_index(name)
+
+        if index is None:
+            values = self._store.column(name)
+            # Masked values are not selected, as when using an index
+            return self.where(ma.filled((values >= low) & (values <= high), False))
+        else:
+            return self.where(index.between(low, high))
+
+    def lookup(self, name, values):
+        '''
+        Select the rows for which the value in a column is equal to a value,
+        or to one of several values, and return a new table instance. If the
+        column is indexed (see add_index), or the table is sorted by the
+        column (see sort), a binary search is used.
+
+        Required Arguments:
+
+            *name*: [ string ]
+                The name of the column
+
+            *values*: [ value or list of values ]
+                The value(s) to select
+
+        Returns:
+
+            A new table instance, containing only the rows selected
+        '''
+
+        index = self._get_sorted_index(name)
+
+        if index is None:
+            column = self._store.column(name)
+            if isinstance(column, ma.MaskedArray):
+                # Masked values are not selected, as when using an index
+                return self.where(np.in1d(ma.getdata(column), values) &
+                                  ~ma.getmaskarray(column))
+            return self.where(np.in1d(column, values))
+        else:
+            return self.where(index.equal(values))
+
+    def join(self, other, keys, how='inner', suffixes=('_1', '_2')):
+        '''
+        Join this table with another table on one or more key columns and
+        return a new table instance
+
+        Required Arguments:
+
+            *other*: [ Table ]
+                The table to join with this table
+
+            *keys*: [ string or list of strings ]
+                The name(s) of the column(s) to match rows on. These columns
+                should be present in both tables.
+
+        Optional Keyword Arguments:
+
+            *how*: [ 'inner' | 'left' | 'outer' ]
+                Whether to keep only the rows present in both tables
+                ('inner'), all the rows of this table ('left'), or all the
+                rows of both tables ('outer').
+
+            *suffixes*: [ tuple of two strings ]
+                The suffixes to add to the names of non-key columns present
+                in both tables, for this table and the other table.
+
+        Returns:
+
+            A new table instance, containing the columns of both tables
+
+        Rows are matched by sorting the keys of the other table and using a
+        binary search if there is a single key and the other table is sorted
+        or much smaller than this table, and by hashing the keys otherwise.
+        Missing values in left and outer joins are masked if either table
+        uses masked arrays, and are set to the column null value otherwise
+        (NaN, the largest integer, or 'None' if no null value is defined).
+        Rows with a masked key are never matched.
+        '''
+        return operations.join(self, other, keys, how=how, suffixes=suffixes)
+
+    def group_by(self, keys):
+        '''
+        Group the rows of the table by the values of one or more columns
+
+        Required Arguments:
+
+            *keys*: [ string or list of strings ]
+                The name(s) of the column(s) to group rows by
+
+        Returns:
+
+            A TableGroups instance. Its agg() method computes aggregates of
+            columns for each group, and returns a new table with one row per
+            group, in increasing order of the keys. For example:
+
+                t.group_by('field_id').agg({'flux': 'mean',
+                                            'mag': ['min', 'max'],
+                                            'id': 'count'})
+
+        Rows are grouped with vectorized operations: the keys are converted
+        to integer group numbers, which are then used with np.bincount or
+        with ufunc.reduceat on the rows sorted by group. Rows with a masked
+        key are not included in any group.
+        '''
+        return operations.TableGroups(self, keys)
+
+    def _rows_to_mask(self, rows):
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    @property
+    def loc(self):
+        '''
+        Access rows through the values of the primary key. For example,
+        t.loc[1234] returns the row with key 1234 and t.loc[[12, 34, 56]]
+        returns a new table with the rows for the three keys, in that order.
+        A KeyError is raised if a key is not present. The primary key should
+        first be set with set_primary_key.
+        '''
+        return KeyLocator(self)
+
 
 class TableSet(object):
 
@@ -991,10 +2146,8 @@ class TableSet(object):
 
         if 'type' in kwargs:
             table_type = kwargs.pop('type').lower()
-        elif type(args[0]) == str:
-            table_type = registry._determine_type(args[0], verbose)
         else:
-            raise Exception('Could not determine table type')
+            table_type, args = registry._detect_type(args, verbose)
 
         original_filters = warnings.filters[:]
 
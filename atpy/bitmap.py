@@ -0,0 +1,62 @@
+from __future__ import print_function, division
+
+import numpy as np
+
+# Number of bits set in each possible byte
+_BITS_SET = np.array([bin(i).count('1') for i in range(256)], dtype=np.intp)
+
+
+def pack(valid):
+    '''
+    Pack a boolean array (True for valid values) into a validity bitmap,
+    with one bit per element
+    '''
+    return np.packbits(np.asarray(valid, dtype=bool).ravel())
+
+
+def unpack(bitmap, start, end):
+    '''
+    Return a boolean array with the bits from position start to end
+    '''
+    first = start // 8
+    bits = np.unpackbits(bitmap[first:(end + 7) // 8])
+    return bits[start - 8 * first:end - 8 * first].astype(bool)
+
+
+def take(bitmap, positions):
+    '''
+    Return a boolean array with the bits at the given positions
+    '''
+    positions = np.asarray(positions, dtype=np.intp)
+    return ((bitmap[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+
+def write(bitmap, start, valid):
+    '''
+    Set the bits starting at position start to the values in a boolean
+    array, in place. The bitmap should be large enough to hold them.
+    '''
+    valid = np.asarray(valid, dtype=bool).ravel()
+    end = start + len(valid)
+    first, last = start // 8, (end + 7) // 8
+    bits = np.unpackbits(bitmap[first:last])
+    bits[start - 8 * first:end - 8 * first] = valid
+    bitmap[first:last] = np.packbits(bits)
+
+
+def count(bitmap, n):
+    '''
+    Return the number of bits set among the first n bits
+    '''
+    full = n // 8
+    total = _BITS_SET[bitmap[:full]].sum()
+    if n > 8 * full:
+        total += unpack(bitmap, 8 * full, n).sum()
+    return int(total)
+
+
+def nbytes(n):
+    '''
+    Return the number of bytes needed for a bitmap with n bits
+    '''
+    return (n + 7) // 8
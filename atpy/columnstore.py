@@ -0,0 +1,1099 @@
+from __future__ import print_function, division
+
+import numpy as np
+import numpy.ma as ma
+
+from . import bitmap
+from .varstring import StringColumn
+
+
+def _positions(index, shape):
+    '''
+    Return the positions in a bitmap of the elements of the given rows, for
+    a column with elements of the given shape
+    '''
+    width = int(np.prod(shape))
+    if width == 1:
+        return index
+    return (index[:, np.newaxis] * width + np.arange(width)).ravel()
+
+
+def _fill_value(array):
+    '''
+    Return the fill value of a masked array, or None if it is the default
+    '''
+    fill_value = array.fill_value
+    if np.all(fill_value == ma.default_fill_value(array)):
+        return None
+    return fill_value
+
+
+def _code_type(n_categories):
+    '''
+    Return the smallest unsigned integer type for the codes of a categorical
+    column with the given number of categories
+    '''
+    return np.min_scalar_type(max(n_categories - 1, 0))
+
+
+class ColumnStore(object):
+    '''
+    Column-oriented storage for the data in a Table.
+
+    Each column is held in its own contiguous array, so that adding,
+    removing, or operating on a column only touches that column. A structured
+    array containing all the columns is only built when it is requested
+    through structured(). Once built, the columns are views into it, so that
+    changes made through either are seen by both.
+
+    A store returned by take() is a selection: it holds a vector of row
+    indices into the arrays of the original store, and a column is only
+    gathered the first time it is accessed. Taking rows from a selection
+    composes the index vectors, so chained selections never gather the
+    intermediate results. Columns of the original store that are referenced
+    by a selection are copied the first time they are accessed through
+    column() or structured() (or modified through set_values()), so that
+    changing the returned arrays in place does not affect the selection.
+
+    Rows can be appended with append_rows(), which keeps spare capacity at
+    the end of each column (doubling it whenever it runs out), so that
+    appending many small batches only costs the size of each batch on
+    average. The spare capacity is released by freeze().
+
+    Masked columns are stored as a plain array of values and, only if the
+    column contains masked values, a validity bitmap with one bit per value.
+    A masked array is only created when the column is accessed through
+    column(), and its mask then replaces the bitmap until compact() or
+    freeze() packs it again. Selections and appends operate on the bitmaps
+    directly.
+
+    Categorical columns are stored as an array of integer codes and a sorted
+    array of the distinct values (the categories), so that the order of the
+    codes is the same as the order of the values. Selections, sorting, and
+    appends operate on the codes, and the values are only decoded when the
+    column is accessed through column(), column_chunk(), or structured().
+    The decoded arrays are new arrays, so values should be changed with
+    set_values() rather than in place.
+
+    Variable-length string columns are stored as an array with the start and
+    end position of each string, and a buffer of bytes holding the strings
+    (see StringColumn). Selections, sorting, and appends operate on the
+    positions, so that the buffer is shared with the original column until
+    compact() is called. column() returns a StringColumn, and structured()
+    contains the strings padded to the longest string.
+    '''
+
+    def __init__(self):
+        self._names = []
+        self._arrays = {}
+        self._pending = {}
+        self._shared = set()
+        self._buffers = {}
+        self._masked = set()
+        self._validity = {}
+        self._live = {}
+        self._fill = {}
+        self._categories = {}
+        self._strings = {}
+        self._string_buffers = {}
+        self._length = 0
+        self._structured = None
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, name):
+        return name in self._arrays or name in self._pending
+
+    def __iter__(self):
+        return iter(self._names)
+
+    @property
+    def names(self):
+        return tuple(self._names)
+
+    @property
+    def dtype(self):
+        dtype = []
+        for name in self._names:
+            source = self._source(name)
+            if name in self._categories:
+                dtype.append((name, self._categories[name].dtype))
+            elif name in self._strings:
+                dtype.append((name, StringColumn(source, self._strings[name]).dtype))
+            else:
+                dtype.append((name, source.dtype, source.shape[1:]))
+        return np.dtype(dtype)
+
+    @property
+    def masked(self):
+        return len(self._masked) > 0
+
+    @property
+    def shared(self):
+        return len(self._shared) > 0
+
+    def _source(self, name):
+        '''
+        Return the array of values for a column, or the array it will be
+        gathered from if it has not been gathered yet. This should only be
+        used to find out the type or shape of a column.
+        '''
+        if name in self._pending:
+            return self._pending[name][0]
+        else:
+            return self._arrays[name]
+
+    def _gather(self, name):
+        '''
+        Gather a column that has not been accessed yet, and return its array
+        of values (without the mask)
+        '''
+        if name in self._pending:
+            source, validity, index = self._pending.pop(name)
+            self._arrays[name] = source[index]
+            if validity is not None:
+                valid = bitmap.take(validity, _positions(index, source.shape[1:]))
+                if not np.all(valid):
+                    self._validity[name] = bitmap.pack(valid)
+        return self._arrays[name]
+
+    def _values(self, name):
+        '''
+        Gather a column and return its array of values (without the mask),
+        decoding categorical columns
+        '''
+        values = self._gather(name)
+        if name in self._categories:
+            return self._categories[name][values]
+        elif name in self._strings:
+            return StringColumn(values, self._strings[name]).to_array()
+        return values
+
+    def _bitmap(self, name):
+        '''
+        Return the validity bitmap for a column that has been gathered, or
+        None if the column does not contain masked values. If a masked array
+        was created for the column, the bitmap is first updated from its mask.
+        '''
+        if name in self._live:
+            mask = ma.getmask(self._live[name])
+            if mask is not ma.nomask and mask.any():
+                self._validity[name] = bitmap.pack(~mask)
+            else:
+                self._validity.pop(name, None)
+        return self._validity.get(name, None)
+
+    def _release(self, name):
+        '''
+        Pack the mask of the masked array created for a column (if any) into
+        the bitmap, and release the masked array
+        '''
+        self._bitmap(name)
+        self._live.pop(name, None)
+
+    def _mask(self, name, start, end):
+        '''
+        Return the mask for rows start to end of a gathered column
+        '''
+        values = self._arrays[name]
+        validity = self._validity.get(name, None)
+        if validity is None:
+            return ma.nomask
+        width = int(np.prod(values.shape[1:]))
+        valid = bitmap.unpack(validity, start * width, end * width)
+        return ~valid.reshape((end - start,) + values.shape[1:])
+
+    def _unshare(self, name):
+        '''
+        Give a column whose array is also used by a selection that has not
+        gathered it yet its own copy of the data, so that the array can be
+        changed in place without affecting the selection
+        '''
+        if name in self._shared and not name in self._categories \
+            and not name in self._strings:
+            self._release(name)
+            self._arrays[name] = self._arrays[name].copy()
+            self._shared.discard(name)
+            self._buffers.pop(name, None)
+            self._structured = None
+
+    def column(self, name):
+        '''
+        Return the array for a single column. If the array is also used by a
+        selection, it is copied first (see _unshare).
+        '''
+        self._unshare(name)
+        return self._column(name)
+
+    def _column(self, name):
+        '''
+        Return the array for a single column, which may be shared with a
+        selection, so it should not be changed in place
+        '''
+        if name in self._categories:
+            return self._decode(name, self.codes(name))
+        elif name in self._strings:
+            return self.column_chunk(name, 0, self._length)
+        values = self._gather(name)
+        if name in self._masked:
+            if not name in self._live:
+                mask = self._mask(name, 0, self._length)
+                self._live[name] = ma.array(values, mask=mask, copy=False,
+                                            fill_value=self._fill.get(name, None))
+                self._validity.pop(name, None)
+            return self._live[name]
+        else:
+            return values
+
+    def _chunk(self, name, start, end):
+        '''
+        Return the stored values of a column for rows start to end (the codes
+        of categorical columns, and the string positions of variable-length
+        string columns) and their mask, which is None if the column is not
+        masked
+        '''
+
+        if name in self._pending:
+            source, validity, index = self._pending[name]
+            values = source[index[start:end]]
+            if not name in self._masked:
+                return values, None
+            elif validity is None:
+                return values, ma.nomask
+            positions = _positions(index[start:end], source.shape[1:])
+            return values, ~bitmap.take(validity, positions).reshape(values.shape)
+
+        values = self._arrays[name][start:end]
+
+        if name in self._masked:
+            return values, self._mask(name, start, end)
+        else:
+            return values, None
+
+    def column_chunk(self, name, start, end, decode=True):
+        '''
+        Return the values of a column for rows start to end, without
+        gathering the whole column if it has not been gathered yet. For
+        categorical columns, the codes are returned if decode is False.
+        '''
+
+        if name in self._live:
+            return self._live[name][start:end]
+
+        values, mask = self._chunk(name, start, end)
+
+        if name in self._strings:
+            return StringColumn(values, self._strings[name], mask=mask)
+
+        if name in self._categories:
+            if decode:
+                values = self._categories[name][values]
+            else:
+                return values if mask is None else ma.array(values, mask=mask, fill_value=0)
+
+        if mask is None:
+            return values
+        else:
+            return ma.array(values, mask=mask, copy=False,
+                            fill_value=self._fill.get(name, None))
+
+    def is_categorical(self, name):
+        return name in self._categories
+
+    def categories(self, name):
+        '''
+        Return the sorted array of distinct values of a categorical column
+        '''
+        return self._categories[name]
+
+    def is_variable_length(self, name):
+        return name in self._strings
+
+    def codes(self, name):
+        '''
+        Return the codes of a categorical column, as a masked array if the
+        column is masked
+        '''
+        codes = self._gather(name)
+        if name in self._masked:
+            return ma.array(codes, mask=self._mask(name, 0, self._length),
+                            copy=False, fill_value=0)
+        return codes
+
+    def _decode(self, name, codes):
+        '''
+        Convert codes of a categorical column to values
+        '''
+        categories = self._categories[name]
+        if isinstance(codes, ma.MaskedArray):
+            return ma.array(categories[ma.getdata(codes)], mask=ma.getmask(codes),
+                            fill_value=self._fill.get(name, None))
+        return categories[codes]
+
+    def _encode(self, name):
+        '''
+        Replace the values of a gathered column by codes and categories
+        '''
+        categories, codes = np.unique(self._arrays[name], return_inverse=True)
+        self._arrays[name] = codes.ravel().astype(_code_type(len(categories)))
+        self._categories[name] = categories
+
+    def set_categorical(self, name):
+        '''
+        Store a column as codes and categories
+        '''
+
+        if name in self._categories:
+            return
+
+        if len(self._source(name).shape) > 1:
+            raise Exception("Vector column %s cannot be categorical" % name)
+
+        if name in self._strings:
+            raise Exception("Variable-length column %s cannot be categorical" % name)
+
+        self._gather(name)
+        self._release(name)
+        self._encode(name)
+        self._shared.discard(name)
+        self._buffers.pop(name, None)
+        self._structured = None
+
+    def set_variable_length(self, name):
+        '''
+        Store a column as variable-length strings
+        '''
+
+        if name in self._strings:
+            return
+
+        if len(self._source(name).shape) > 1:
+            raise Exception("Vector column %s cannot be variable-length" % name)
+
+        self._release(name)
+        values = self._values(name)
+
+        strings = StringColumn.from_values(values)
+        self._arrays[name] = strings.spans
+        self._strings[name] = strings.buffer
+        self._string_buffers.pop(name, None)
+        self._categories.pop(name, None)
+        if name in self._masked:
+            self._fill[name] = None
+        self._shared.discard(name)
+        self._buffers.pop(name, None)
+        self._structured = None
+
+    def null_count(self, name):
+        '''
+        Return the number of masked values in a column
+        '''
+        if not name in self._masked:
+            return 0
+        self._gather(name)
+        if name in self._live:
+            return int(ma.count_masked(self._live[name]))
+        validity = self._validity.get(name, None)
+        if validity is None:
+            return 0
+        size = self._arrays[name].size
+        return size - bitmap.count(validity, size)
+
+    def set_values(self, name, value):
+        '''
+        Set the values of a column in place. If the column array is also used
+        by a selection, column() copies it first so that the selection is not
+        affected.
+        '''
+
+        array = self.column(name)
+
+        # Categorical columns are decoded, changed, and encoded again
+        if name in self._categories:
+            array[...] = value
+            self.replace(name, array)
+            return
+
+        if name in self._strings:
+            if not isinstance(value, StringColumn):
+                array = array.to_array()
+                array[...] = value
+                value = array
+            self.replace(name, value)
+            return
+
+        array[...] = value
+
+    def _set(self, name, array):
+        '''
+        Store the array for a column, converting masked arrays to an array of
+        values and a validity bitmap
+        '''
+
+        self._live.pop(name, None)
+        self._validity.pop(name, None)
+
+        # Variable-length string columns store the positions of the strings
+        if isinstance(array, StringColumn) or name in self._strings:
+            if not isinstance(array, StringColumn):
+                array = StringColumn.from_values(array)
+            self._strings[name] = array.buffer
+            self._string_buffers.pop(name, None)
+            self._arrays[name] = array.spans
+            if array.mask is None:
+                self._masked.discard(name)
+                self._fill.pop(name, None)
+            else:
+                self._masked.add(name)
+                self._fill[name] = None
+                if array.mask.any():
+                    self._validity[name] = bitmap.pack(~array.mask)
+            return
+
+        if isinstance(array, ma.MaskedArray):
+            self._masked.add(name)
+            self._fill[name] = _fill_value(array)
+            mask = ma.getmask(array)
+            if mask is not ma.nomask and mask.any():
+                self._validity[name] = bitmap.pack(~mask)
+            self._arrays[name] = ma.getdata(array)
+        else:
+            self._masked.discard(name)
+            self._fill.pop(name, None)
+            self._arrays[name] = array
+
+        if name in self._categories:
+            self._encode(name)
+
+    def replace(self, name, array):
+        '''
+        Replace the array for a column by a new array with the same length
+        '''
+
+        if len(array) != self._length:
+            raise Exception("Column %s has %i rows but table has %i rows"
+                            % (name, len(array), self._length))
+
+        self._pending.pop(name, None)
+        self._shared.discard(name)
+        self._buffers.pop(name, None)
+        self._set(name, array)
+        self._structured = None
+
+    def add(self, name, array, position=None):
+        '''
+        Add a column, optionally at a given position (0 = first column)
+        '''
+        self.add_many([name], [array], position=position)
+
+    def add_many(self, names, arrays, position=None):
+        '''
+        Add several columns at once, optionally starting at a given position
+        (0 = first column). All the columns are checked before any is added.
+        '''
+
+        if self._names:
+            length = self._length
+        elif arrays:
+            length = len(arrays[0])
+
+        for i, name in enumerate(names):
+            if name in self or name in names[:i]:
+                raise Exception("Column %s already exists" % name)
+            if len(arrays[i]) != length:
+                raise Exception("Column %s has %i rows but table has %i rows"
+                                % (name, len(arrays[i]), length))
+
+        if position is None:
+            self._names.extend(names)
+        else:
+            self._names[position:position] = names
+
+        for i, name in enumerate(names):
+            self._set(name, arrays[i])
+
+        if arrays:
+            self._length = length
+            self._structured = None
+
+    def remove(self, names):
+        '''
+        Remove one or more columns. The remaining columns are not copied.
+        '''
+
+        names = set(names)
+
+        for name in names:
+            if not name in self:
+                raise Exception("Column %s does not exist" % name)
+            for attribute in [self._arrays, self._pending, self._buffers,
+                              self._validity, self._live, self._fill,
+                              self._categories, self._strings,
+                              self._string_buffers]:
+                attribute.pop(name, None)
+            self._shared.discard(name)
+            self._masked.discard(name)
+
+        self._names = [name for name in self._names if not name in names]
+
+        if not self._names:
+            self._length = 0
+
+        self._structured = None
+
+    def rename(self, old_name, new_name):
+        '''
+        Rename a column in place
+        '''
+
+        pos = self._names.index(old_name)
+        self._names[pos] = new_name
+
+        for attribute in [self._arrays, self._pending, self._buffers,
+                          self._validity, self._live, self._fill,
+                          self._categories, self._strings,
+                          self._string_buffers]:
+            if old_name in attribute:
+                attribute[new_name] = attribute.pop(old_name)
+
+        for attribute in [self._shared, self._masked]:
+            if old_name in attribute:
+                attribute.remove(old_name)
+                attribute.add(new_name)
+
+        if self._structured is not None:
+            self._structured.dtype.names = tuple(self._names)
+            if isinstance(self._structured, ma.MaskedArray):
+                self._structured.mask.dtype.names = tuple(self._names)
+
+    def structured(self):
+        '''
+        Return a structured array with all the columns, building it if needed
+        '''
+
+        # The structured array can be changed in place, so it is built again
+        # (copying the values) if its fields are also used by a selection
+        if self._structured is not None and \
+            any(not name in self._categories and not name in self._strings
+                for name in self._shared):
+            self._structured = None
+
+        if self._structured is None and self._names:
+
+            if self.masked:
+                array = ma.empty(self._length, dtype=self.dtype)
+            else:
+                array = np.empty(self._length, dtype=self.dtype)
+
+            for name in self._names:
+                column = self._column(name)
+                if name in self._strings:
+                    column = column.to_array()
+                array[name] = column
+                if isinstance(column, ma.MaskedArray):
+                    array[name].set_fill_value(column.fill_value)
+
+            # Categorical and variable-length string columns keep their
+            # codes or string positions, so their fields in the structured
+            # array are copies of the decoded values
+            encoded = {}
+            for name in list(self._categories) + list(self._strings):
+                encoded[name] = (self._gather(name), self._bitmap(name),
+                                 self._categories.get(name, None),
+                                 self._strings.get(name, None))
+
+            self.set_structured(array)
+
+            for name in encoded:
+                values, validity, categories, strings = encoded[name]
+                self._arrays[name] = values
+                if categories is not None:
+                    self._categories[name] = categories
+                else:
+                    self._strings[name] = strings
+                    self._fill[name] = None
+                self._live.pop(name, None)
+                if validity is not None:
+                    self._validity[name] = validity
+
+        return self._structured
+
+    def set_structured(self, array):
+        '''
+        Replace the contents of the store by the fields of a structured array.
+        The columns are then views into this array.
+        '''
+
+        self.__init__()
+
+        if array is None:
+            return
+
+        self._names = list(array.dtype.names)
+        self._length = len(array)
+        self._structured = array
+
+        if isinstance(array, ma.MaskedArray):
+            data = ma.getdata(array)
+            for name in self._names:
+                self._arrays[name] = data[name]
+                self._live[name] = array[name]
+                self._fill[name] = _fill_value(array[name])
+            self._masked = set(self._names)
+        else:
+            self._arrays = dict((name, array[name]) for name in self._names)
+
+    def materialize(self):
+        '''
+        Gather all the columns that have not been accessed yet
+        '''
+        for name in list(self._pending):
+            self._gather(name)
+
+    def _as_index(self, key):
+        '''
+        Convert a boolean mask, a slice, or a sequence of row numbers to an
+        array of (positive) row numbers.
+        '''
+
+        if isinstance(key, slice):
+            return np.arange(self._length)[key]
+
+        key = np.asarray(key)
+
+        if key.dtype == np.bool_:
+            if key.shape != (self._length,):
+                raise IndexError("Boolean mask has shape %s but table has %i rows"
+                                 % (str(key.shape), self._length))
+            return np.flatnonzero(key)
+
+        if key.size == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        if key.dtype.kind not in 'iu':
+            raise IndexError("Rows should be selected with a boolean mask or integer row numbers")
+
+        key = np.atleast_1d(key).astype(np.intp)
+
+        if key.min() < 0:
+            key = np.where(key < 0, key + self._length, key)
+
+        if key.min() < 0 or key.max() >= self._length:
+            raise IndexError("Row number out of range")
+
+        return key
+
+    def _new(self, names):
+        '''
+        Return an empty store with the same masked columns and fill values
+        '''
+        store = self.__class__()
+        store._masked = self._masked.intersection(names)
+        store._fill = dict((name, self._fill[name]) for name in store._masked)
+        store._categories = dict((name, self._categories[name])
+                                 for name in names if name in self._categories)
+        store._strings = dict((name, self._strings[name])
+                              for name in names if name in self._strings)
+        return store
+
+    def take(self, key):
+        '''
+        Return a new store containing only the rows selected by key (a
+        boolean mask, a slice, or an array of row numbers). The data is only
+        gathered when the columns of the new store are accessed.
+        '''
+
+        index = self._as_index(key)
+
+        store = self._new(self._names)
+
+        if not self._names:
+            return store
+
+        store._names = self._names[:]
+        store._length = len(index)
+
+        # Columns that have not been gathered yet are taken directly from the
+        # original arrays by composing the index vectors. Columns that share
+        # an index vector keep sharing the composed one.
+        composed = {}
+
+        for name in self._names:
+            if name in self._pending:
+                source, validity, source_index = self._pending[name]
+                if not id(source_index) in composed:
+                    composed[id(source_index)] = source_index[index]
+                store._pending[name] = (source, validity, composed[id(source_index)])
+            else:
+                store._pending[name] = (self._arrays[name], self._bitmap(name), index)
+                self._shared.add(name)
+
+        return store
+
+    def reorder(self, index):
+        '''
+        Reorder the rows of all the columns in place, given a permutation of
+        the row numbers. Columns that have not been gathered yet stay that
+        way.
+        '''
+
+        composed = {}
+
+        for name in self._names:
+            if name in self._pending:
+                source, validity, source_index = self._pending[name]
+                if not id(source_index) in composed:
+                    composed[id(source_index)] = source_index[index]
+                self._pending[name] = (source, validity, composed[id(source_index)])
+            else:
+                self._release(name)
+                values = self._arrays[name]
+                validity = self._validity.get(name, None)
+                if validity is not None:
+                    positions = _positions(index, values.shape[1:])
+                    self._validity[name] = bitmap.pack(bitmap.take(validity, positions))
+                self._arrays[name] = values[index]
+                self._shared.discard(name)
+                self._buffers.pop(name, None)
+
+        self._structured = None
+
+    def project(self, names):
+        '''
+        Return a new store containing only the given columns. The column
+        arrays are shared with this store, so no data is copied.
+        '''
+
+        for name in names:
+            if not name in self:
+                raise Exception("Column %s does not exist" % name)
+
+        store = self._new(names)
+
+        # If a structured array exists, use a multi-field view of it so that
+        # the structured array of the new store does not need to be rebuilt.
+        if self._structured is not None and not self._categories and \
+            not self._strings and not isinstance(self._structured, ma.MaskedArray):
+            view = self._structured[list(names)]
+            if np.may_share_memory(view, self._structured):
+                store.set_structured(view)
+                store._shared = self._shared.intersection(names)
+                return store
+
+        store._names = list(names)
+        store._length = self._length
+
+        for name in names:
+            if name in self._pending:
+                store._pending[name] = self._pending[name]
+            else:
+                store._arrays[name] = self._arrays[name]
+                if name in self._validity:
+                    store._validity[name] = self._validity[name]
+                if name in self._live:
+                    store._live[name] = self._live[name]
+
+        store._shared = self._shared.intersection(names)
+
+        return store
+
+    def compact(self):
+        '''
+        Make sure that each column has its own contiguous copy of the data,
+        releasing any larger buffer it was a view into, and pack the masks of
+        masked columns into bitmaps.
+        '''
+
+        self.materialize()
+
+        for name in self._names:
+            self._release(name)
+            array = self._arrays[name]
+            if array.base is not None or not array.flags.c_contiguous:
+                self._arrays[name] = array.copy()
+                self._shared.discard(name)
+            if name in self._validity:
+                size = bitmap.nbytes(array.size)
+                self._validity[name] = self._validity[name][:size].copy()
+            if name in self._strings:
+                strings = StringColumn(self._arrays[name], self._strings[name]).compact()
+                self._arrays[name] = strings.spans
+                self._strings[name] = strings.buffer
+
+        self._buffers = {}
+        self._string_buffers = {}
+        self._structured = None
+
+    def _valid(self, name, n_values):
+        '''
+        Return the validity of all the values of a gathered column as a
+        boolean array
+        '''
+        validity = self._bitmap(name)
+        if validity is None:
+            return np.ones(n_values, dtype=bool)
+        else:
+            return bitmap.unpack(validity, 0, n_values)
+
+    def _appended_values(self, name, other):
+        '''
+        Return the values of a column of another store, to be appended to
+        this store. For categorical columns, these are codes for the
+        categories of this store, which are extended if needed (in which case
+        the codes of this store are converted to the new categories).
+        '''
+
+        if name in self._strings:
+            return self._append_strings(name, other)
+
+        if not name in self._categories:
+            return other._values(name)
+
+        other_categories, other_codes = other._category_codes(name)
+
+        categories = self._categories[name]
+        merged = np.union1d(categories, other_categories)
+        code_type = _code_type(len(merged))
+
+        if len(merged) > len(categories):
+            remap = np.searchsorted(merged, categories).astype(code_type)
+            self._arrays[name] = remap[self._gather(name)]
+            self._categories[name] = merged
+            self._shared.discard(name)
+            self._buffers.pop(name, None)
+
+        return np.searchsorted(merged, other_categories).astype(code_type)[other_codes]
+
+    def _append_strings(self, name, other):
+        '''
+        Append the strings of a column of another store to the buffer of a
+        variable-length string column, and return their positions. The buffer
+        keeps spare capacity at the end (doubling it when it runs out).
+        '''
+
+        appended = other._string_values(name)
+
+        spans, strings = appended.spans, appended.buffer
+
+        used = self._strings[name]
+        start, end = len(used), len(used) + len(strings)
+
+        buffer = self._string_buffers.get(name, None)
+        if buffer is None or len(buffer) < end:
+            buffer = np.empty(max(end, 2 * start, 16), dtype=np.uint8)
+            buffer[:start] = used
+
+        buffer[start:end] = strings
+        self._string_buffers[name] = buffer
+        self._strings[name] = buffer[:end]
+
+        spans['start'] += start
+        spans['end'] += start
+
+        return spans
+
+    def _category_codes(self, name):
+        '''
+        Return the categories of a column and the code of each value, whether
+        or not the column is categorical
+        '''
+        if name in self._categories:
+            return self._categories[name], self._gather(name)
+        categories, codes = np.unique(self._gather(name), return_inverse=True)
+        return categories, codes.ravel()
+
+    def _string_values(self, name):
+        '''
+        Return the strings of a column as a StringColumn with a buffer only
+        containing these strings, whether or not the column is stored as
+        variable-length strings
+        '''
+        if name in self._strings:
+            return StringColumn(self._gather(name), self._strings[name]).compact()
+        return StringColumn.from_values(self._values(name))
+
+    def _merge_masked(self, name, other):
+        if name in other._masked and not name in self._masked:
+            self._masked.add(name)
+            self._fill[name] = other._fill[name]
+
+    def extend(self, other):
+        '''
+        Append the rows of another store with the same columns
+        '''
+
+        for name in self._names:
+
+            b = self._appended_values(name, other)
+            a = self._gather(name)
+            va, vb = self._bitmap(name), other._bitmap(name)
+
+            self._live.pop(name, None)
+            self._arrays[name] = np.concatenate((a, b))
+
+            if va is not None or vb is not None:
+                valid = np.concatenate((self._valid(name, a.size), other._valid(name, b.size)))
+                self._validity[name] = bitmap.pack(valid)
+
+            self._merge_masked(name, other)
+
+        self._shared = set()
+        self._buffers = {}
+        self._length += len(other)
+        self._structured = None
+
+    def append_rows(self, other):
+        '''
+        Append the rows of another store with the same columns, keeping spare
+        capacity at the end of each column for future appends.
+        '''
+
+        old_length = self._length
+        new_length = self._length + len(other)
+
+        for name in self._names:
+
+            self._gather(name)
+            self._release(name)
+
+            values = self._appended_values(name, other)
+            other_validity = other._bitmap(name)
+
+            validity = self._validity.get(name, None)
+
+            buffer = self._buffers.get(name, None)
+
+            if buffer is None:
+                array = self._arrays[name]
+                capacity = len(array)
+            else:
+                array = buffer
+                capacity = len(buffer)
+
+            dtype = np.promote_types(array.dtype, values.dtype)
+
+            if capacity < new_length or dtype != array.dtype:
+                capacity = max(new_length, 2 * capacity, 16)
+                buffer = np.zeros((capacity,) + array.shape[1:], dtype=dtype)
+                buffer[:old_length] = self._arrays[name]
+
+            buffer[old_length:new_length] = values
+
+            self._buffers[name] = buffer
+            self._arrays[name] = buffer[:new_length]
+
+            # The bitmap is only created once there are masked values, and
+            # grows in the same way as the buffer
+            if validity is not None or other_validity is not None:
+                width = int(np.prod(buffer.shape[1:]))
+                size = bitmap.nbytes(new_length * width)
+                if validity is None:
+                    validity = np.empty(bitmap.nbytes(capacity * width), dtype=np.uint8)
+                    validity.fill(255)
+                elif len(validity) < size:
+                    new = np.empty(max(size, 2 * len(validity)), dtype=np.uint8)
+                    new.fill(255)
+                    new[:len(validity)] = validity
+                    validity = new
+                if other_validity is None:
+                    valid = np.ones(values.size, dtype=bool)
+                else:
+                    valid = bitmap.unpack(other_validity, 0, values.size)
+                bitmap.write(validity, old_length * width, valid)
+                self._validity[name] = validity
+
+            self._merge_masked(name, other)
+
+        if self._names:
+            self._length = new_length
+            self._structured = None
+
+    @classmethod
+    def concatenate(cls, stores):
+        '''
+        Return a new store containing the rows of several stores with the same
+        columns, one after the other. Each column is allocated once, with a
+        type that can hold the values of all the stores.
+        '''
+
+        first = stores[0]
+
+        store = first._new(first._names)
+        store._names = list(first._names)
+        store._length = sum(len(other) for other in stores)
+
+        starts = np.cumsum([0] + [len(other) for other in stores])
+        dtypes = [other.dtype for other in stores]
+
+        for name in store._names:
+
+            shape = first._source(name).shape[1:]
+            width = int(np.prod(shape))
+
+            if name in first._strings:
+                column = StringColumn.concatenate([other._string_values(name) for other in stores])
+                store._arrays[name] = column.spans
+                store._strings[name] = column.buffer
+            elif name in first._categories:
+                pieces = [other._category_codes(name) for other in stores]
+                categories = pieces[0][0]
+                for other_categories, _ in pieces[1:]:
+                    categories = np.union1d(categories, other_categories)
+                codes = np.empty(store._length, dtype=_code_type(len(categories)))
+                for i, (other_categories, other_codes) in enumerate(pieces):
+                    remap = np.searchsorted(categories, other_categories)
+                    codes[starts[i]:starts[i + 1]] = remap[other_codes]
+                store._arrays[name] = codes
+                store._categories[name] = categories
+            else:
+                dtype = dtypes[0][name].base
+                for other_dtype in dtypes[1:]:
+                    dtype = np.promote_types(dtype, other_dtype[name].base)
+                array = np.empty((store._length,) + shape, dtype=dtype)
+                for i, other in enumerate(stores):
+                    array[starts[i]:starts[i + 1]] = other._values(name)
+                store._arrays[name] = array
+
+            # The bitmap is only created if one of the stores has masked values
+            bitmaps = [other._bitmap(name) for other in stores]
+            if any(validity is not None for validity in bitmaps):
+                validity = np.empty(bitmap.nbytes(store._length * width), dtype=np.uint8)
+                validity.fill(255)
+                for i, other_validity in enumerate(bitmaps):
+                    if other_validity is not None:
+                        n_values = len(stores[i]) * width
+                        bitmap.write(validity, starts[i] * width,
+                                     bitmap.unpack(other_validity, 0, n_values))
+                store._validity[name] = validity
+
+            for other in stores:
+                store._merge_masked(name, other)
+
+        return store
+
+    def freeze(self):
+        '''
+        Release the spare capacity left by append_rows(), and pack the masks
+        of masked columns into bitmaps.
+        '''
+
+        for name in self._buffers:
+            if len(self._buffers[name]) > self._length:
+                self._arrays[name] = self._arrays[name].copy()
+                self._shared.discard(name)
+
+        for name in list(self._live):
+            self._release(name)
+
+        for name in self._string_buffers:
+            self._strings[name] = self._strings[name].copy()
+        self._string_buffers = {}
+
+        for name in self._validity:
+            size = bitmap.nbytes(self._arrays[name].size)
+            if len(self._validity[name]) > size:
+                self._validity[name] = self._validity[name][:size].copy()
+
+        self._buffers = {}
+        self._structured = None
@@ -55,9 +55,9 @@ def _auto_decompress_to_fileobj(read, table, filename, *args, **kwargs):
         # Read in first few characters from file to determine compression
         header = open(filename, 'rb').read(4)
 
-        if header[:2] == '\x1f\x8b':  # gzip compression
+        if header[:2] == b'\x1f\x8b':  # gzip compression
             return read(table, gzip.GzipFile(filename), *args, **kwargs)
-        elif header[:3] == 'BZh':  # bzip compression
+        elif header[:3] == b'BZh':  # bzip compression
             return read(table, bz2.BZ2File(filename), *args, **kwargs)
         else:
             return read(table, filename, *args, **kwargs)
@@ -1,6 +1,7 @@
 from __future__ import print_function, division
 
 import os
+import io
 
 import numpy as np
 from astropy.io import fits
@@ -8,8 +9,13 @@ from astropy.io import fits
 from .exceptions import TableException
 from .helpers import smart_dtype, smart_mask
 from .decorators import auto_download_to_file, auto_fileobj_to_file
+from .streaming import ChunkWriter
 
 
+# The size of the header and data blocks, and of header cards, in a FITS file
+BLOCK_SIZE = 2880
+CARD_LENGTH = 80
+
 standard_keys = ['XTENSION', 'NAXIS', 'NAXIS1', 'NAXIS2', 'TFIELDS', \
     'PCOUNT', 'GCOUNT', 'BITPIX', 'EXTNAME']
 
@@ -44,7 +50,7 @@ def _list_tables(filename):
 # PyFITS can handle compression, so no decompression detection
 @auto_download_to_file
 @auto_fileobj_to_file
-def read(self, filename, hdu=None, memmap=False, verbose=True):
+def read(self, filename, hdu=None, memmap=False, verbose=True, columns=None):
     '''
     Read a table from a FITS file
 
@@ -61,6 +67,11 @@ def read(self, filename, hdu=None, memmap=False, verbose=True):
 
         *memmap*: [ bool ]
             Whether PyFITS should use memory mapping
+
+        *columns*: [ list of strings ]
+            The names of the columns to read. Only these fields are
+            converted and copied from the FITS table, so that if memmap is
+            True, the values of the other columns are not read from disk.
     '''
 
     self.reset()
@@ -80,15 +91,25 @@ def read(self, filename, hdu=None, memmap=False, verbose=True):
 
     table = hdu.data
     header = hdu.header
-    columns = hdu.columns
+    hdu_columns = hdu.columns
+
+    # Find the positions of the columns to read
+    names = list(hdu.data.dtype.names)
+    if columns is None:
+        positions = list(range(len(names)))
+    else:
+        for name in columns:
+            if not name in names:
+                raise Exception("Column %s does not exist" % name)
+        positions = [names.index(name) for name in columns]
 
     # Construct dtype for table
 
     dtype = []
 
-    for i in range(len(hdu.data.dtype)):
+    for i in positions:
 
-        name = hdu.data.dtype.names[i]
+        name = names[i]
         type = hdu.data.dtype[name]
         if type.subdtype:
             type, shape = type.subdtype
@@ -131,15 +152,19 @@ def read(self, filename, hdu=None, memmap=False, verbose=True):
 
     dtype = np.dtype(dtype)
 
+    units = [hdu_columns.units[i] for i in positions]
+    nulls = [hdu_columns.nulls[i] for i in positions]
+
     if self._masked:
-        self._setup_table(len(hdu.data), dtype, units=columns.units)
+        self._setup_table(len(hdu.data), dtype, units=units)
     else:
-        self._setup_table(len(hdu.data), dtype, units=columns.units, \
-                          nulls=columns.nulls)
+        self._setup_table(len(hdu.data), dtype, units=units, nulls=nulls)
 
     # Populate the table
 
-    for i, name in enumerate(columns.names):
+    for i in positions:
+
+        name = names[i]
 
         format, bzero = hdu.columns[i].format[-1], hdu.columns[i].bzero
 
@@ -159,15 +184,20 @@ def read(self, filename, hdu=None, memmap=False, verbose=True):
         self.data[name][:] = data[:]
 
         if self._masked:
-            if columns.nulls[i] == 'NAN.0':
+            if hdu_columns.nulls[i] == 'NAN.0':
                 null = np.nan
-            elif columns.nulls[i] == 'INF.0':
+            elif hdu_columns.nulls[i] == 'INF.0':
                 null = np.inf
             else:
-                null = columns.nulls[i]
-            self.data[name].mask = smart_mask(data, null)
+                null = hdu_columns.nulls[i]
+            mask = smart_mask(data, null)
+            self.data[name].mask = mask
             self.data[name].set_fill_value(null)
 
+            # The number of null values is known from the mask
+            if data.dtype.kind != 'f':
+                self._cache_stats(name, null_count=int(np.count_nonzero(mask)))
+
     for key in header.keys():
         if not key[:4] in ['TFOR', 'TDIS', 'TDIM', 'TTYP', 'TUNI'] and \
             not key in standard_keys:
@@ -298,16 +328,106 @@ def write(self, filename, overwrite=False):
             Whether to overwrite any existing file without warning
     '''
 
+    _check_overwrite(filename, overwrite)
+
+    try:
+        _to_hdu(self).writeto(filename)
+    except:
+        _to_hdu(self).writeto(filename, output_verify='silentfix')
+
+
+class FITSWriter(ChunkWriter):
+    '''
+    Write a table to a FITS file one chunk of rows at a time (see
+    atpy.open_writer). The headers are written using the metadata of the
+    first chunk, the rows of each chunk are appended to the file, and the
+    number of rows (NAXIS2) is updated in the header when the writer is
+    closed.
+
+    Required Arguments:
+
+        *filename*: [ string ]
+            The FITS file to write the table to
+
+    Optional Keyword Arguments:
+
+        *overwrite*: [ True | False ]
+            Whether to overwrite any existing file without warning
+    '''
+
+    def __init__(self, filename, overwrite=False, schema=None):
+        ChunkWriter.__init__(self, schema=schema)
+        _check_overwrite(filename, overwrite)
+        self.filename = filename
+
+    def _open(self, table):
+        self._file = open(self.filename, 'wb')
+        self._naxis2 = None
+        self._size = 0
+
+    def _write(self, table):
+
+        header, data = _to_bytes(table)
+
+        if self._naxis2 is None:
+
+            # Find the position of the NAXIS2 card of the table header (the
+            # primary header does not have one)
+            for position in range(0, len(header), CARD_LENGTH):
+                if header[position:position + 8] == b'NAXIS2  ':
+                    self._naxis2 = position
+                    break
+
+            self._file.write(header)
+
+        self._file.write(data)
+        self._size += len(data)
+
+    def _close(self):
+
+        # Pad the data to a whole number of FITS blocks
+        self._file.write(b'\x00' * (_padded(self._size) - self._size))
+
+        self._file.seek(self._naxis2)
+        self._file.write(fits.Card('NAXIS2', self.n_rows).image.encode('ascii'))
+        self._file.close()
+
+
+def _check_overwrite(filename, overwrite):
     if os.path.exists(filename):
         if overwrite:
             os.remove(filename)
         else:
             raise Exception("File exists: %s" % filename)
 
+
+def _padded(size):
+    '''
+    Return the size of data padded to a whole number of FITS blocks
+    '''
+    return (size + BLOCK_SIZE - 1) // BLOCK_SIZE * BLOCK_SIZE
+
+
+def _to_bytes(self):
+    '''
+    Return the FITS headers for the current table (a primary header and the
+    table header), and the rows of the table as they are written in a FITS
+    file
+    '''
+
+    hdu = _to_hdu(self)
+
+    output = io.BytesIO()
     try:
-        _to_hdu(self).writeto(filename)
+        hdu.writeto(output)
     except:
-        _to_hdu(self).writeto(filename, output_verify='silentfix')
+        hdu.writeto(output, output_verify='silentfix')
+    output = output.getvalue()
+
+    size = hdu.header['NAXIS1'] * len(self)
+    start = len(output) - _padded(size)
+
+    return output[:start], output[start:start + size]
 
 
 # PyFITS can handle compression, so no decompression detection
@@ -18,6 +18,7 @@ except AttributeError:  # For Numpy 1.4.1
 
 from .exceptions import TableException
 from .decorators import auto_download_to_file, auto_decompress_to_fileobj, auto_fileobj_to_file
+from .streaming import ChunkWriter
 
 
 try:
@@ -93,7 +94,7 @@ def _list_tables(file_handle):
 @auto_download_to_file
 @auto_decompress_to_fileobj
 @auto_fileobj_to_file
-def read(self, filename, table=None, verbose=True):
+def read(self, filename, table=None, verbose=True, columns=None):
     '''
     Read a table from an HDF5 file
 
@@ -112,6 +113,10 @@ def read(self, filename, table=None, verbose=True):
         *table*: [ string ]
             The name of the table to read from the HDF5 file (this is only
             required if there are more than one table in the file)
+
+        *columns*: [ list of strings ]
+            The names of the columns to read. Each of these columns is read
+            from the file separately, and the other columns are not read.
     '''
 
     _check_h5py_installed()
@@ -126,34 +131,162 @@ def read(self, filename, table=None, verbose=True):
         f = h5py.File(filename, 'r')
         g = f['/']
 
-    # If no table is requested, check that there is only one table
+    table = _find_table(g, table)
+
+    # Set the table name
+    self.table_name = str(table)
+
+    dtype = g[table].dtype
+
+    names = _select_columns(dtype, columns)
+
+    vlen = _vlen_columns(dtype)
+
+    if any(name in vlen for name in names):
+        _add_chunk(self, g[table], slice(None), names, vlen)
+    else:
+        if columns is not None:
+            dtype = np.dtype([(name, dtype[name]) for name in names])
+
+        self._setup_table(len(g[table]), dtype)
+
+        # Add columns to table
+        for name in names:
+            self.data[name][:] = g[table][name][:]
+
+    _read_keywords(self, g[table])
+
+    if f is not None:
+        f.close()
+
+
+def iter_read(filename, table=None, chunk_rows=100000, verbose=True,
+              columns=None):
+    '''
+    Read a table from an HDF5 file in chunks of rows, only reading the rows
+    of one chunk from the file at a time
+
+    Required Arguments:
+
+        *filename*: [ string ]
+            The HDF5 file to read the table from
+
+          OR
+
+        *file or group handle*: [ h5py.highlevel.File | h5py.highlevel.Group ]
+            The HDF5 file handle or group handle to read the table from
+
+    Optional Keyword Arguments:
+
+        *table*: [ string ]
+            The name of the table to read from the HDF5 file (this is only
+            required if there are more than one table in the file)
+
+        *chunk_rows*: [ integer ]
+            The maximum number of rows in each chunk
+
+        *columns*: [ list of strings ]
+            The names of the columns to read
+    '''
+
+    _check_h5py_installed()
+
+    from .basetable import Table
+
+    if isinstance(filename, h5py.highlevel.File) or isinstance(filename, h5py.highlevel.Group):
+        f, g = None, filename
+    else:
+        if not os.path.exists(filename):
+            raise Exception("File not found: %s" % filename)
+        f = h5py.File(filename, 'r')
+        g = f['/']
+
+    try:
+
+        table = _find_table(g, table)
+        dataset = g[table]
+        names = _select_columns(dataset.dtype, columns)
+        vlen = _vlen_columns(dataset.dtype)
+
+        first = None
+
+        for start in range(0, len(dataset), chunk_rows):
+
+            chunk = Table()
+            chunk.table_name = str(table)
+            _add_chunk(chunk, dataset, slice(start, start + chunk_rows), names, vlen)
+
+            # The chunks share the column headers and keywords of the first
+            if first is None:
+                _read_keywords(chunk, dataset)
+                first = chunk
+            else:
+                chunk._share_metadata(first)
+
+            yield chunk
+
+    finally:
+        if f is not None:
+            f.close()
+
+
+def _find_table(g, table):
+    '''
+    Return the name of the table to read, checking that there is only one
+    table if no table is requested
+    '''
     if table is None:
         tables = _list_tables(g)
         if len(tables) == 1:
-            table = tables.keys()[0]
+            table = list(tables.keys())[0]
         else:
             raise TableException(tables, 'table')
+    return table
 
-    # Set the table name
-    self.table_name = str(table)
 
-    self._setup_table(len(g[table]), g[table].dtype)
+def _select_columns(dtype, columns):
+    '''
+    Return the names of the columns to read, checking that they exist
+    '''
+    if columns is None:
+        return list(dtype.names)
+    for name in columns:
+        if not name in dtype.names:
+            raise Exception("Column %s does not exist" % name)
+    return list(columns)
+
+
+def _vlen_columns(dtype):
+    '''
+    Return the names of the variable-length string columns
+    '''
+    return [name for name in dtype.names
+            if h5py.check_dtype(vlen=dtype[name]) in STRING_TYPES]
 
-    # Add columns to table
-    for name in g[table].dtype.names:
-        self.data[name][:] = g[table][name][:]
 
-    for attribute in g[table].attrs:
+def _add_chunk(self, dataset, rows, names, vlen):
+    '''
+    Add the given columns of a range of rows of a dataset. If only some of
+    the columns are requested, each column is read separately. Variable-length
+    string columns are read into variable-length columns.
+    '''
+    if names == list(dataset.dtype.names):
+        data = dataset[rows]
+        arrays = [data[name] for name in names]
+    else:
+        arrays = [dataset[rows, name] for name in names]
+    self.add_columns([(name, array, {'variable_length': name in vlen})
+                      for name, array in zip(names, arrays)])
+
+
+def _read_keywords(self, dataset):
+    for attribute in dataset.attrs:
         # Due to a bug in HDF5, in order to get this to work in Python 3, we
         # need to encode string values in utf-8
-        if type(g[table].attrs[attribute]) in STRING_TYPES:
-            self.add_keyword(attribute, asstr(g[table].attrs[attribute]))
+        if type(dataset.attrs[attribute]) in STRING_TYPES:
+            self.add_keyword(attribute, asstr(dataset.attrs[attribute]))
         else:
-            self.add_keyword(attribute, g[table].attrs[attribute])
-
-
-    if f is not None:
-        f.close()
+            self.add_keyword(attribute, dataset.attrs[attribute])
 
 
 @auto_download_to_file
@@ -198,6 +331,36 @@ def read_set(self, filename, pedantic=False, verbose=True):
     if f is not None:
         f.close()
 
+def _to_array(self):
+    '''
+    Return the data of the table as a structured array, in which the
+    variable-length string columns are HDF5 variable-length strings
+    '''
+
+    vlen = [name for name in self.names if self._store.is_variable_length(name)]
+
+    if not vlen:
+        return self.data
+
+    dtype = []
+    for name in self.names:
+        column = self._store.column(name)
+        if name in vlen:
+            dtype.append((name, h5py.special_dtype(vlen=bytes)))
+        else:
+            dtype.append((name, column.dtype, column.shape[1:]))
+
+    array = np.zeros(len(self), dtype=dtype)
+
+    for name in self.names:
+        if name in vlen:
+            array[name] = self._store.column(name).tolist()
+        else:
+            array[name] = self._store.column(name)
+
+    return array
+
+
 def write(self, filename, compression=False, group="", append=False,
           overwrite=False, ignore_groups=False):
     '''
@@ -236,6 +399,73 @@ def write(self, filename, compression=False, group="", append=False,
 
     _check_h5py_installed()
 
+    f, g = _open_group(filename, group, append, overwrite)
+
+    name = _dataset_name(self, g, group, ignore_groups)
+
+    dset = g.create_dataset(name, data=_to_array(self), compression=compression)
+
+    _write_keywords(self, dset)
+
+    if f is not None:
+        f.close()
+
+
+class HDF5Writer(ChunkWriter):
+    '''
+    Write a table to an HDF5 file one chunk of rows at a time (see
+    atpy.open_writer). The table is written to a chunked dataset, which is
+    resized to append the rows of each chunk.
+
+    Required Arguments:
+
+        *filename*: [ string ]
+            The HDF5 file to write the table to
+
+          OR
+
+        *file or group handle*: [ h5py.highlevel.File | h5py.highlevel.Group ]
+            The HDF5 file handle or group handle to write the table to
+
+    Optional Keyword Arguments:
+
+        The same as for write()
+    '''
+
+    variable_length = True
+
+    def __init__(self, filename, compression=False, group="", append=False,
+                 overwrite=False, ignore_groups=False, schema=None):
+        _check_h5py_installed()
+        ChunkWriter.__init__(self, schema=schema)
+        self._f, self._g = _open_group(filename, group, append, overwrite)
+        self._group = group
+        self._compression = compression
+        self._ignore_groups = ignore_groups
+
+    def _open(self, table):
+        name = _dataset_name(table, self._g, self._group, self._ignore_groups)
+        dtype = _to_array(table).dtype
+        self._dataset = self._g.create_dataset(name, shape=(0,), dtype=dtype,
+                                               maxshape=(None,), chunks=True,
+                                               compression=self._compression)
+        _write_keywords(table, self._dataset)
+
+    def _write(self, table):
+        start = len(self._dataset)
+        self._dataset.resize((start + len(table),))
+        self._dataset[start:] = _to_array(table)
+
+    def _close(self):
+        if self._f is not None:
+            self._f.close()
+
+
+def _open_group(filename, group, append, overwrite):
+    '''
+    Open the file and group to write a table to
+    '''
+
     if isinstance(filename, h5py.highlevel.File) or isinstance(filename, h5py.highlevel.Group):
         f, g = None, filename
         if group:
@@ -252,6 +482,15 @@ def write(self, filename, compression=False, group="", append=False,
 
         f, g = _get_group(filename, group=group, append=append)
 
+    return f, g
+
+
+def _dataset_name(self, g, group, ignore_groups):
+    '''
+    Return the name of the dataset to write a table to, creating the groups
+    in the table name if needed
+    '''
+
     if self.table_name:
         name = self.table_name
     else:
@@ -267,8 +506,10 @@ def write(self, filename, compression=False, group="", append=False,
     if name in g.keys():
         raise Exception("Table %s/%s already exists" % (group, name))
 
-    dset = g.create_dataset(name, data=self.data, compression=compression)
+    return name
 
+
+def _write_keywords(self, dset):
     for keyword in self.keywords:
         # Due to a bug in HDF5, in order to get this to work in Python 3, we
         # need to encode string values in utf-8. In addition, we have to use
@@ -278,9 +519,6 @@ def write(self, filename, compression=False, group="", append=False,
         else:
             dset.attrs[keyword] = self.keywords[keyword]
 
-    if f is not None:
-        f.close()
-
 
 def write_set(self, filename, compression=False, group="", append=False,
               overwrite=False, ignore_groups=False, **kwargs):
@@ -363,7 +601,7 @@ def write_set(self, filename, compression=False, group="", append=False,
         if name in g.keys():
             raise Exception("Table %s/%s already exists" % (group, name))
 
-        dset = g.create_dataset(name, data=self.tables[table_key].data, compression=compression)
+        dset = g.create_dataset(name, data=_to_array(self.tables[table_key]), compression=compression)
 
         for keyword in self.tables[table_key].keywords:
             # Due to a bug in HDF5, in order to get this to work in Python 3, we
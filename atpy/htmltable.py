@@ -23,16 +23,20 @@ def write(self, filename):
         f.write("      <td><i>%s</i></td>\n" % self.columns[name].unit)
     f.write("    </tr>\n")
 
+    # Look up the arrays and formats once rather than for every value
+    columns = [(self[name], "%" + self.columns[name].format,
+                self.columns[name].dtype == np.uint64) for name in self.names]
+
     for i in range(self.__len__()):
 
         f.write("    <tr>\n")
 
-        for name in self.names:
+        for values, item_format, is_uint64 in columns:
 
-            if self.columns[name].dtype == np.uint64:
-                item = (("%" + self.columns[name].format) % long(self.data[name][i]))
+            if is_uint64:
+                item = item_format % long(values[i])
             else:
-                item = (("%" + self.columns[name].format) % self.data[name][i])
+                item = item_format % values[i]
 
             f.write("      <td>%s</td>\n" % item.strip())
 
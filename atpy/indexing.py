@@ -0,0 +1,202 @@
+from __future__ import print_function, division
+
+import numpy as np
+import numpy.ma as ma
+
+
+def _as_key(value, dtype):
+    '''
+    Convert a lookup value to the type used for the keys of an index on a
+    column with the given dtype.
+    '''
+    if dtype.kind == 'S' and not isinstance(value, bytes):
+        return str(value).encode('utf-8')
+    elif dtype.kind == 'U' and isinstance(value, bytes):
+        return value.decode('utf-8')
+    elif isinstance(value, np.generic):
+        return value.item()
+    else:
+        return value
+
+
+class PrimaryKeyIndex(object):
+    '''
+    Hash index mapping the values of a primary key column to row numbers.
+
+    Required Arguments:
+
+        *values*: [ numpy array ]
+            The values of the primary key column
+    '''
+
+    def __init__(self, values):
+
+        if isinstance(values, ma.MaskedArray):
+            if np.any(values.mask):
+                raise Exception("Primary key column cannot contain null values")
+            values = values.data
+
+        self.dtype = values.dtype
+        self._rows = dict(zip(values.tolist(), range(len(values))))
+
+        if len(self._rows) != len(values):
+            raise Exception("Primary key column cannot contain duplicate values")
+
+    def __len__(self):
+        return len(self._rows)
+
+    def extend(self, values, offset):
+        '''
+        Add the values of rows appended to the table, starting at row number
+        offset. The index is not modified if any of the values already exist.
+        '''
+
+        if isinstance(values, ma.MaskedArray):
+            if np.any(values.mask):
+                raise Exception("Primary key column cannot contain null values")
+            values = values.data
+
+        rows = dict(zip(values.tolist(), range(offset, offset + len(values))))
+
+        if len(rows) != len(values):
+            raise Exception("Primary key column cannot contain duplicate values")
+
+        for key in rows:
+            if key in self._rows:
+                raise Exception("Primary key column cannot contain duplicate values")
+
+        self._rows.update(rows)
+
+    def lookup(self, keys):
+        '''
+        Return the row number for a single key, or an array of row numbers for
+        a sequence of keys. A KeyError is raised if a key is not present.
+        '''
+
+        if np.isscalar(keys):
+            return self._rows[_as_key(keys, self.dtype)]
+
+        keys = np.asarray(keys)
+
+        if keys.dtype.kind == self.dtype.kind:
+            keys = keys.tolist()
+        else:
+            keys = [_as_key(key, self.dtype) for key in keys.tolist()]
+
+        rows = self._rows
+        return np.array([rows[key] for key in keys], dtype=np.intp)
+
+
+class KeyLocator(object):
+    '''
+    Provides access to the rows of a table through the values of its primary
+    key, using t.loc[key] for a single row or t.loc[keys] for several rows.
+    '''
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, keys):
+
+        index = self._table._get_primary_index()
+
+        if np.isscalar(keys):
+            return self._table.rows([index.lookup(keys)]).data[0]
+        else:
+            return self._table.rows(index.lookup(keys))
+
+
+class SortedIndex(object):
+    '''
+    Sorted index on a column, used to find the rows with values in a given
+    range, or equal to given values, with a binary search.
+
+    Required Arguments:
+
+        *values*: [ numpy array ]
+            The values of the column. Masked values are not included in the
+            index.
+    '''
+
+    def __init__(self, values=None):
+
+        if values is None:
+            return
+
+        if isinstance(values, ma.MaskedArray) and values.mask is not ma.nomask:
+            rows = np.flatnonzero(~values.mask)
+            order = rows[np.argsort(values.data[rows], kind='mergesort')]
+            values = values.data
+        else:
+            values = np.asarray(values)
+            order = np.argsort(values, kind='mergesort')
+
+        self.order = order
+        self.values = values[order]
+
+    @classmethod
+    def from_sorted(cls, values):
+        '''
+        Create an index on values that are already in ascending order. The
+        values are not copied.
+        '''
+        index = cls()
+        index.order = None
+        index.values = values
+        return index
+
+    def _rows(self, positions):
+        if self.order is None:
+            return positions
+        else:
+            return self.order[positions]
+
+    def _convert(self, value):
+        if self.values.dtype.kind in 'SU':
+            if np.isscalar(value):
+                return _as_key(value, self.values.dtype)
+            else:
+                return np.array([_as_key(v, self.values.dtype) for v in value])
+        else:
+            return value
+
+    def remap(self, mask):
+        '''
+        Return the index for the rows of the table selected by a boolean mask
+        '''
+        new = SortedIndex()
+        keep = mask[self.order]
+        new_rows = np.cumsum(mask) - 1
+        new.order = new_rows[self.order[keep]]
+        new.values = self.values[keep]
+        return new
+
+    def between(self, low, high):
+        '''
+        Return the row numbers (in increasing order) of the rows for which the
+        value is between low and high (inclusive)
+        '''
+        start = np.searchsorted(self.values, self._convert(low), side='left')
+        end = np.searchsorted(self.values, self._convert(high), side='right')
+        if self.order is None:
+            return np.arange(start, end)
+        else:
+            return np.sort(self.order[start:end])
+
+    def equal(self, values):
+        '''
+        Return the row numbers (in increasing order) of the rows for which the
+        value is equal to one of the given values
+        '''
+
+        values = np.atleast_1d(self._convert(values))
+
+        start = np.searchsorted(self.values, values, side='left')
+        end = np.searchsorted(self.values, values, side='right')
+
+        # Concatenate the ranges [start, end) without a Python loop
+        lengths = end - start
+        offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(start, lengths) + np.arange(lengths.sum()) - offsets
+
+        return np.unique(self._rows(positions))
@@ -7,6 +7,7 @@ import warnings
 
 from .helpers import smart_mask, format_length
 from .decorators import auto_download_to_file, auto_decompress_to_fileobj, auto_fileobj_to_file
+from .streaming import ChunkWriter
 
 # Define type conversion from IPAC table to numpy arrays
 type_dict = {}
@@ -46,7 +47,8 @@ invalid[np.float64] = np.float64(np.nan)
 @auto_download_to_file
 @auto_decompress_to_fileobj
 @auto_fileobj_to_file
-def read(self, filename, definition=3, verbose=False, smart_typing=False):
+def read(self, filename, definition=3, verbose=False, smart_typing=False,
+         columns=None):
     '''
     Read a table from a IPAC file
 
@@ -76,7 +78,13 @@ def read(self, filename, definition=3, verbose=False, smart_typing=False):
             a column containing only values between 0 and 255 can
             be stored as an unsigned 8-bit integer column. The
             default is false, so that all integer columns are
-            stored as 64-bit integers.
+            stored as 64-bit integers. This is the same as using
+            compact=True (see Table.compact).
+
+        *columns*: [ list of strings ]
+
+            The names of the columns to read. Only the characters
+            below these columns are extracted from each line.
     '''
 
     if not definition in [1, 2, 3]:
@@ -170,15 +178,25 @@ def read(self, filename, definition=3, verbose=False, smart_typing=False):
     else:
         nulls_given = True
 
+    # Find the positions of the columns to read
+    if columns is None:
+        selected = names
+    else:
+        for name in columns:
+            if not name in names:
+                raise Exception("Column %s does not exist" % name)
+        selected = list(columns)
+    positions = [names.index(name) for name in selected]
+
     # Pre-compute numpy column types
     numpy_types = {}
-    for name in names:
+    for name in selected:
         numpy_types[name] = type_dict[types[name]]
 
     # Data
 
     array = {}
-    for name in names:
+    for name in selected:
         array[name] = []
 
 
@@ -187,7 +205,7 @@ def read(self, filename, definition=3, verbose=False, smart_typing=False):
         if line.strip() == '':
             break
 
-        for i in range(len(pipes)-1):
+        for i in positions:
 
             first, last = pipes[i] + 1, pipes[i + 1]
 
@@ -217,7 +235,7 @@ def read(self, filename, definition=3, verbose=False, smart_typing=False):
 
     # Check that null values are of the correct type
     if nulls_given:
-        for name in names:
+        for name in selected:
             try:
                 n = numpy_types[name](nulls[name])
                 nulls[name] = n
@@ -234,58 +252,38 @@ def read(self, filename, definition=3, verbose=False, smart_typing=False):
                 nulls[name] = n
 
     # Convert to numpy arrays
-    for name in names:
-
-        if smart_typing:
-
-            dtype = None
-
-            low = min(array[name])
-            high = max(array[name])
-
-            if types[name] in ['i', 'int', 'integer']:
-                low, high = long(low), long(high)
-                for nt in [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.uint64, np.int64]:
-                    if low >= np.iinfo(nt).min and high <= np.iinfo(nt).max:
-                        dtype = nt
-                        break
-            elif types[name] in ['long']:
-                low, high = long(low), long(high)
-                for nt in [np.uint64, np.int64]:
-                    if low >= np.iinfo(nt).min and high <= np.iinfo(nt).max:
-                        dtype = nt
-                        break
-            elif types[name] in ['float', 'real']:
-                low, high = float(low), float(high)
-                for nt in [np.float32, np.float64]:
-                    if low >= np.finfo(nt).min and high <= np.finfo(nt).max:
-                        dtype = nt
-                        break
-            else:
-                dtype = type_dict[types[name]]
+    new_columns = []
+    for name in selected:
 
-        else:
-            dtype = type_dict[types[name]]
+        dtype = type_dict[types[name]]
 
-            # If max integer is larger than 2**63 then use uint64
-            if dtype == np.int64:
-                if max([long(x) for x in array[name]]) > 2**63:
-                    dtype = np.uint64
-                    warnings.warn("using type uint64 for column %s" % name)
+        # If max integer is larger than 2**63 then use uint64
+        if dtype == np.int64:
+            if max([long(x) for x in array[name]]) > 2**63:
+                dtype = np.uint64
+                warnings.warn("using type uint64 for column %s" % name)
 
         array[name] = np.array(array[name], dtype=dtype)
 
-        if smart_typing:
-            if np.min(array) >= 0 and np.max(array) <= 1:
-                array = array == 1
-
         if self._masked:
-            self.add_column(name, array[name], \
-                mask=smart_mask(array[name], nulls[name]), unit=units[name], \
-                fill=nulls[name])
+            new_columns.append((name, array[name], \
+                {'mask': smart_mask(array[name], nulls[name]), \
+                 'unit': units[name], 'fill': nulls[name]}))
         else:
-            self.add_column(name, array[name], \
-                null=nulls[name], unit=units[name])
+            new_columns.append((name, array[name], \
+                {'null': nulls[name], 'unit': units[name]}))
+
+    self.add_columns(new_columns)
+
+    # Columns cannot contain null values if no null values were given
+    if not nulls_given:
+        for name in selected:
+            if self._schema[name].dtype.kind != 'f':
+                self._cache_stats(name, null_count=0)
+
+    # Narrow the column types once all the values are known
+    if smart_typing:
+        self.compact(narrow=True)
 
 
 def write(self, filename, overwrite=False):
@@ -300,14 +298,65 @@ def write(self, filename, overwrite=False):
 
     self._raise_vector_columns()
 
+    _check_overwrite(filename, overwrite)
+
+    # Open file for writing
+    f = open(filename, 'w')
+
+    width = _write_header(self, f)
+
+    _write_rows(self, f, width)
+
+    f.close()
+
+
+class IPACWriter(ChunkWriter):
+    '''
+    Write a table to an IPAC file one chunk of rows at a time (see
+    atpy.open_writer). The header is written using the metadata of the first
+    chunk, and the rows of each chunk are appended to the file.
+
+    Required Arguments:
+
+        *filename*: [ string ]
+            The IPAC file to write the table to
+
+    Optional Keyword Arguments:
+
+        *overwrite*: [ True | False ]
+            Whether to overwrite any existing file without warning
+    '''
+
+    def __init__(self, filename, overwrite=False, schema=None):
+        ChunkWriter.__init__(self, schema=schema)
+        _check_overwrite(filename, overwrite)
+        self.filename = filename
+
+    def _open(self, table):
+        table._raise_vector_columns()
+        self._file = open(self.filename, 'w')
+        self._width = _write_header(table, self._file)
+
+    def _write(self, table):
+        _write_rows(table, self._file, self._width)
+
+    def _close(self):
+        self._file.close()
+
+
+def _check_overwrite(filename, overwrite):
     if os.path.exists(filename):
         if overwrite:
             os.remove(filename)
         else:
             raise Exception("File exists: %s" % filename)
 
-    # Open file for writing
-    f = open(filename, 'w')
+
+def _write_header(self, f):
+    '''
+    Write out the keywords, comments, and column definitions of a table, and
+    return the width of each column
+    '''
 
     for key in self.keywords:
         value = self.keywords[key]
@@ -373,20 +422,46 @@ def write(self, filename, overwrite=False):
     if len(line_nulls.replace("|", "").strip()) > 0:
         f.write(line_nulls)
 
+    return width
+
+
+def _write_rows(self, f, width):
+    '''
+    Write out the rows of a table, using the column widths returned by
+    _write_header()
+    '''
+
+    # Look up the arrays and formats once rather than for every value
+
+    columns = []
+
+    for name in self.names:
+
+        column = self.columns[name]
+
+        if column.dtype == np.uint64:
+            convert = long
+        elif sys.version_info[0] >= 3 and column.dtype.type == np.bytes_:
+            convert = lambda value: value.decode('utf-8')
+        else:
+            convert = None
+
+        columns.append((name, self[name], "%" + column.format,
+                        "%" + str(width[name]) + "s", width[name], convert))
+
     for i in range(self.__len__()):
 
         line = ""
 
-        for name in self.names:
-            if self.columns[name].dtype == np.uint64:
-                item = (("%" + self.columns[name].format) % long(self.data[name][i]))
-            elif sys.version_info[0] >= 3 and self.columns[name].dtype.type == np.bytes_:
-                item = (("%" + self.columns[name].format) % self.data[name][i].decode('utf-8'))
+        for name, values, item_format, width_format, item_width, convert in columns:
+
+            if convert is None:
+                item = item_format % values[i]
             else:
-                item = (("%" + self.columns[name].format) % self.data[name][i])
-            item = ("%" + str(width[name]) + "s") % item
+                item = item_format % convert(values[i])
+            item = width_format % item
 
-            if len(item) > width[name]:
+            if len(item) > item_width:
                 raise Exception('format for column %s (%s) is not wide enough to contain data' % (name, self.columns[name].format))
 
             line = line + " " + item
@@ -394,5 +469,3 @@ def write(self, filename, overwrite=False):
         line = line + " \n"
 
         f.write(line)
-
-    f.close()
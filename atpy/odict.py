@@ -2,69 +2,127 @@ from __future__ import print_function, division
 
 import numpy as np
 
+
 class odict(object):
+    '''
+    Ordered dictionary. The keys and values are stored in the keys and values
+    lists, in order, and a dictionary maps each key to its position so that
+    looking up a key does not require searching the list of keys.
+    '''
 
     def __init__(self):
-        self.keys = []
-        self.values = []
+        self._keys = []
+        self._values = []
+        self._positions = {}
+
+    def _get_keys(self):
+        return self._keys
+
+    def _set_keys(self, keys):
+        self._keys = keys
+        self._update_positions()
+
+    keys = property(_get_keys, _set_keys)
+
+    def _get_values(self):
+        return self._values
+
+    def _set_values(self, values):
+        self._values = values
+
+    values = property(_get_values, _set_values)
+
+    def _update_positions(self, start=0):
+        '''
+        Update the positions of the keys from position start onwards
+        '''
+        if start == 0:
+            self._positions = {}
+        positions = self._positions
+        for i in range(start, len(self._keys)):
+            positions[self._keys[i]] = i
 
     def __setitem__(self, key, value):
         if type(key) == int:
-            if key > len(self.keys) - 1:
+            if key > len(self._keys) - 1:
                 raise Exception("Element %i does not exist" % key)
             else:
-                self.values[key] = value
+                self._values[key] = value
         elif type(key) in [str, np.string_, unicode]:
-            if key in self.keys:
-                index = self.keys.index(key)
-                self.values[index] = value
+            if key in self._positions:
+                self._values[self._positions[key]] = value
             else:
-                self.keys.append(key)
-                self.values.append(value)
+                self._positions[key] = len(self._keys)
+                self._keys.append(key)
+                self._values.append(value)
         else:
             raise Exception("Wrong type for key: %s" % type(key))
 
     def __getitem__(self, key):
         if type(key) == int:
-            return self.values[key]
-        elif type(key) in [str, np.string_]:
-            index = self.keys.index(key)
-            return self.values[index]
+            return self._values[key]
+        elif type(key) in [str, np.string_, unicode]:
+            if not key in self._positions:
+                raise ValueError("%s is not in list" % key)
+            return self._values[self._positions[key]]
         else:
             raise Exception("Wrong type for key: %s" % type(key))
 
     def __repr__(self):
         string = "{"
-        for i, key in enumerate(self.keys):
+        for i, key in enumerate(self._keys):
             if i > 0:
                 string += ", "
-            string += "\n%s : %s" % (key, self.values[i])
+            string += "\n%s : %s" % (key, self._values[i])
         string += "\n}"
         return string
 
     def __contains__(self, key):
-        return key in self.keys
+        return key in self._positions
+
+    def index(self, key):
+        '''
+        Return the position of a key
+        '''
+        if not key in self._positions:
+            raise ValueError("%s is not in list" % key)
+        return self._positions[key]
 
     def pop(self, key):
-        index = self.keys.index(key)
-        self.keys.pop(index)
-        self.values.pop(index)
+        index = self.index(key)
+        self._keys.pop(index)
+        self._values.pop(index)
+        self._positions.pop(key)
+        self._update_positions(index)
 
     def __len__(self):
-        return len(self.keys)
+        return len(self._keys)
 
     def rename(self, oldkey, newkey):
-        index = self.keys.index(oldkey)
-        self.keys[index] = newkey
+        index = self.index(oldkey)
+        self._keys[index] = newkey
+        self._positions.pop(oldkey)
+        self._positions[newkey] = index
         return
 
     def insert(self, position, key, value):
-        self.keys.insert(position, key)
-        self.values.insert(position, value)
+        if position < 0:
+            position = max(len(self._keys) + position, 0)
+        position = min(position, len(self._keys))
+        self._keys.insert(position, key)
+        self._values.insert(position, value)
+        self._update_positions(position)
         return
 
     def __iter__(self):
-        return iter(self.keys)
+        return iter(self._keys)
+
+    def copy(self):
+        new = self.__class__()
+        new._keys = self._keys[:]
+        new._values = self._values[:]
+        new._positions = self._positions.copy()
+        return new
 
     def items(self):
-        return zip(self.keys, self.values)
+        return zip(self._keys, self._values)
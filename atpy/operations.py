@@ -0,0 +1,730 @@
+from __future__ import print_function, division
+
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import numpy.ma as ma
+
+# If the right table of a join is this many times smaller than the left
+# table, sorting it and using a binary search for each row of the left table
+# is faster than factorizing the keys of both tables.
+MERGE_SIZE_RATIO = 32
+
+
+def _default_null(dtype):
+    '''
+    Return the value used to represent missing values in a column of the
+    given type, for tables that do not use masked arrays.
+    '''
+    if dtype.kind == 'f':
+        return np.nan
+    elif dtype.kind in 'iu':
+        return np.iinfo(dtype).max
+    elif dtype.kind in 'SU':
+        return 'None'
+    else:
+        return None
+
+
+def _factorize(left, right):
+    '''
+    Given lists of key columns for the left and right tables, return integer
+    codes such that two rows have the same code if and only if all their keys
+    are equal, and the number of distinct codes.
+    '''
+
+    n_left = len(left[0])
+
+    codes = None
+
+    for lkey, rkey in zip(left, right):
+
+        values = np.concatenate((np.asarray(lkey), np.asarray(rkey)))
+
+        # Integer keys spanning a small range can be used directly
+        if values.dtype.kind in 'iu' and len(values) > 0 and \
+            int(values.max()) - int(values.min()) < 4 * len(values):
+            key_codes = (values - values.min()).astype(np.int64)
+            n_codes = int(key_codes.max()) + 1
+        else:
+            unique, key_codes = np.unique(values, return_inverse=True)
+            n_codes = len(unique)
+
+        if codes is None:
+            codes, total = key_codes, n_codes
+        else:
+            codes = codes * n_codes + key_codes
+            unique, codes = np.unique(codes, return_inverse=True)
+            total = len(unique)
+
+    return codes[:n_left], codes[n_left:], total
+
+
+def _hash_match(lcodes, rcodes, n_codes):
+    '''
+    Find the matching right rows for each left row using the codes as the
+    address in a table of buckets. Returns the order of the right rows
+    grouped by code, and for each left row the start and number of matches
+    in this order.
+    '''
+    order = np.argsort(rcodes, kind='mergesort')
+    counts = np.bincount(rcodes, minlength=n_codes)
+    starts = np.cumsum(counts) - counts
+    return order, starts[lcodes], counts[lcodes]
+
+
+def _merge_match(lkey, rkey):
+    '''
+    Find the matching right rows for each left row with a binary search in
+    the sorted right keys.
+    '''
+    lkey, rkey = np.asarray(lkey), np.asarray(rkey)
+    if len(rkey) > 1 and np.all(rkey[1:] >= rkey[:-1]):
+        order = np.arange(len(rkey))
+    else:
+        order = np.argsort(rkey, kind='mergesort')
+    rsorted = rkey[order]
+    starts = np.searchsorted(rsorted, lkey, side='left')
+    ends = np.searchsorted(rsorted, lkey, side='right')
+    return order, starts, ends - starts
+
+
+def _expand(order, starts, counts):
+    '''
+    Return the left and right row numbers for all matching pairs
+    '''
+    total = counts.sum()
+    left_rows = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    right_rows = order[np.repeat(starts, counts) + np.arange(total) - offsets]
+    return left_rows, right_rows
+
+
+def _valid(key):
+    if isinstance(key, ma.MaskedArray) and key.mask is not ma.nomask:
+        return ~key.mask
+    else:
+        return None
+
+
+def match_rows(left, right, keys, how='inner'):
+    '''
+    Return the row numbers in the left and right tables of the rows of the
+    joined table. Row numbers of -1 indicate that there is no matching row.
+    '''
+
+    lkeys = [left[key] for key in keys]
+    rkeys = [right[key] for key in keys]
+
+    n_left, n_right = len(left), len(right)
+
+    # Rows where any key is masked never match
+    lvalid = np.ones(n_left, dtype=bool)
+    rvalid = np.ones(n_right, dtype=bool)
+    for lkey, rkey in zip(lkeys, rkeys):
+        if _valid(lkey) is not None:
+            lvalid &= _valid(lkey)
+        if _valid(rkey) is not None:
+            rvalid &= _valid(rkey)
+    lkeys = [ma.getdata(key) for key in lkeys]
+    rkeys = [ma.getdata(key) for key in rkeys]
+
+    rrows = np.flatnonzero(rvalid)
+    rkeys = [key[rrows] for key in rkeys]
+
+    if len(keys) == 1 and (len(rrows) * MERGE_SIZE_RATIO < n_left or
+                           np.all(rkeys[0][1:] >= rkeys[0][:-1])):
+        order, starts, counts = _merge_match(lkeys[0], rkeys[0])
+    else:
+        lcodes, rcodes, n_codes = _factorize(lkeys, rkeys)
+        order, starts, counts = _hash_match(lcodes, rcodes, n_codes)
+
+    counts[~lvalid] = 0
+
+    order = rrows[order]
+
+    if how in ['left', 'outer']:
+        # Left rows without a match appear once, with no right row
+        unmatched = counts == 0
+        counts_out = np.where(unmatched, 1, counts)
+        left_rows, right_rows = _expand(order, starts, counts)
+        left_all = np.repeat(np.arange(n_left), counts_out)
+        right_all = -np.ones(len(left_all), dtype=np.intp)
+        right_all[~np.repeat(unmatched, counts_out)] = right_rows
+        left_rows, right_rows = left_all, right_all
+    elif how == 'inner':
+        left_rows, right_rows = _expand(order, starts, counts)
+    else:
+        raise Exception("how= should be one of 'inner', 'left', or 'outer'")
+
+    if how == 'outer':
+        matched = np.zeros(n_right, dtype=bool)
+        matched[right_rows[right_rows >= 0]] = True
+        extra = np.flatnonzero(~matched)
+        left_rows = np.concatenate((left_rows, -np.ones(len(extra), dtype=np.intp)))
+        right_rows = np.concatenate((right_rows, extra))
+
+    return left_rows, right_rows
+
+
+def _take(array, rows, missing, masked, null=None):
+    '''
+    Select rows from a column, where rows marked as missing are masked (for
+    masked tables) or set to the column null value, or to a default null
+    value if the column does not define one (otherwise). Returns the new
+    array and the null value used, if any.
+    '''
+
+    if len(array) == 0:
+        values = np.zeros((len(rows),) + array.shape[1:], dtype=array.dtype)
+        if isinstance(array, ma.MaskedArray):
+            values = ma.array(values, fill_value=array.fill_value)
+    else:
+        if missing is not None:
+            rows = np.where(missing, 0, rows)
+        values = array[rows]
+
+    if missing is None or not np.any(missing):
+        return values, None
+
+    if masked:
+        values = ma.array(values, copy=False)
+        values[missing] = ma.masked
+        return values, None
+
+    if null in ['', None]:
+        null = _default_null(values.dtype)
+    if null is None:
+        warnings.warn("No null value available for type %s - missing values set to zero" % values.dtype)
+        values[missing] = 0
+    else:
+        values[missing] = null
+    return values, null
+
+
+def join(left, right, keys, how='inner', suffixes=('_1', '_2')):
+    '''
+    Join two tables on one or more key columns. See Table.join.
+    '''
+
+    if isinstance(keys, basestring):
+        keys = [keys]
+
+    for key in keys:
+        if not key in left.names:
+            raise Exception("Column %s does not exist in the left table" % key)
+        if not key in right.names:
+            raise Exception("Column %s does not exist in the right table" % key)
+
+    left_rows, right_rows = match_rows(left, right, keys, how=how)
+
+    left_missing = left_rows < 0 if how == 'outer' else None
+    right_missing = right_rows < 0 if how != 'inner' else None
+
+    masked = left._masked or right._masked
+
+    names, arrays, headers = [], [], []
+
+    def add(name, values, header, null):
+        if null is None:
+            header = header.copy()
+        else:
+            header = header.copy(null=null)
+        names.append(name)
+        arrays.append(values)
+        headers.append(header)
+
+    lnames = [name for name in left.names if not name in keys]
+    rnames = [name for name in right.names if not name in keys]
+
+    for name in left.names:
+
+        if name in keys:
+            values, null = _take(left[name], left_rows, left_missing, masked,
+                                 null=left._schema[name].null)
+            header = left._schema[name]
+            if left_missing is not None and np.any(left_missing):
+                # Keys of rows only present in the right table
+                values = values.astype(np.promote_types(values.dtype, right[name].dtype), copy=False)
+                values[left_missing] = right[name][right_rows[left_missing]]
+                null = None
+                if values.dtype != header.dtype:
+                    header = header._promoted(values.dtype)
+            add(name, values, header, null)
+        else:
+            values, null = _take(left[name], left_rows, left_missing, masked,
+                                 null=left._schema[name].null)
+            if name in rnames:
+                new_name = name + suffixes[0]
+            else:
+                new_name = name
+            add(new_name, values, left._schema[name], null)
+
+    for name in rnames:
+        values, null = _take(right[name], right_rows, right_missing, masked,
+                             null=right._schema[name].null)
+        if name in lnames:
+            new_name = name + suffixes[1]
+        else:
+            new_name = name
+        add(new_name, values, right._schema[name], null)
+
+    table = left.__class__(masked=masked)
+    table.table_name = left.table_name
+    table.keywords = left.keywords.copy()
+    table._add_arrays(names, arrays, headers)
+
+    return table
+
+
+def _group_codes(columns):
+    '''
+    Given a list of key columns, return for each row the number of the group
+    it belongs to (with groups in increasing order of the keys) and the
+    number of groups.
+    '''
+
+    codes = None
+
+    for values in columns:
+
+        values = np.asarray(values)
+
+        if values.dtype.kind in 'iu' and len(values) > 0 and \
+            int(values.max()) - int(values.min()) < 4 * len(values):
+            # Use the values directly, then remove the unused codes
+            key_codes = (values - values.min()).astype(np.int64)
+            used = np.bincount(key_codes) > 0
+            key_codes = (np.cumsum(used) - 1)[key_codes]
+            n_codes = int(used.sum())
+        else:
+            unique, key_codes = np.unique(values, return_inverse=True)
+            n_codes = len(unique)
+
+        if codes is None:
+            codes, total = key_codes, n_codes
+        else:
+            codes = codes * n_codes + key_codes
+            unique, codes = np.unique(codes, return_inverse=True)
+            total = len(unique)
+
+    return codes.ravel(), total
+
+
+# Aggregation functions available in TableGroups.agg
+AGGREGATES = ['count', 'sum', 'mean', 'std', 'var', 'min', 'max', 'first', 'last']
+
+
+class TableGroups(object):
+    '''
+    Rows of a table grouped by the values of one or more key columns, as
+    returned by Table.group_by.
+    '''
+
+    def __init__(self, table, keys):
+
+        if isinstance(keys, basestring):
+            keys = [keys]
+
+        for key in keys:
+            if not key in table.names:
+                raise Exception("No such column: %s" % key)
+
+        self.table = table
+        self.keys = list(keys)
+
+        columns = [table._key_values(key) for key in keys]
+
+        # Rows with a masked key are not included in any group
+        valid = np.ones(len(table), dtype=bool)
+        for column in columns:
+            if _valid(column) is not None:
+                valid &= _valid(column)
+
+        if np.all(valid):
+            self._rows = None
+        else:
+            self._rows = np.flatnonzero(valid)
+            columns = [column[self._rows] for column in columns]
+
+        columns = [ma.getdata(column) for column in columns]
+
+        if len(columns[0]) == 0:
+            self._codes, self._n_groups = np.zeros(0, dtype=np.int64), 0
+        else:
+            self._codes, self._n_groups = _group_codes(columns)
+
+        self._order = None
+
+    def __len__(self):
+        return self._n_groups
+
+    def _column(self, name):
+        '''
+        Return the values and the mask of valid values for the rows of a
+        column that are in a group
+        '''
+        values = self.table[name]
+        if self._rows is not None:
+            values = values[self._rows]
+        return ma.getdata(values), _valid(values)
+
+    def _sorted(self):
+        '''
+        Return the order of the rows sorted by group, and the position of
+        the first row of each group in this order
+        '''
+        if self._order is None:
+            self._order = np.argsort(self._codes, kind='mergesort')
+            counts = np.bincount(self._codes, minlength=self._n_groups)
+            self._starts = np.cumsum(counts) - counts
+        return self._order, self._starts
+
+    def _reduce(self, function, values, valid):
+        '''
+        Compute a single aggregate for each group. Returns the values and the
+        mask of groups without any valid values (or None).
+        '''
+
+        codes, n = self._codes, self._n_groups
+
+        if valid is not None:
+            counts = np.bincount(codes[valid], minlength=n)
+        else:
+            counts = np.bincount(codes, minlength=n)
+
+        empty = counts == 0
+        if not np.any(empty):
+            empty = None
+
+        if function == 'count':
+            return counts, None
+
+        if function in ['first', 'last', 'min', 'max', 'sum']:
+
+            order, starts = self._sorted()
+
+            if valid is not None:
+                order = order[valid[order]]
+                starts = np.cumsum(counts) - counts
+
+            if len(order) == 0:
+                return np.zeros(n, dtype=values.dtype), empty
+
+            if function in ['min', 'max'] and values.dtype.kind in 'SU':
+                # Strings cannot be reduced, so sort them within each group
+                order = order[np.lexsort((values[order], codes[order]))]
+                function = 'first' if function == 'min' else 'last'
+
+            # Empty groups are left out, and are then set to zero
+            if empty is not None:
+                starts, counts = starts[~empty], counts[~empty]
+
+            if function == 'first':
+                result = values[order[starts]]
+            elif function == 'last':
+                result = values[order[starts + counts - 1]]
+            else:
+                sorted_values = values[order]
+                if function == 'sum' and sorted_values.dtype.kind == 'b':
+                    sorted_values = sorted_values.astype(int)
+                ufunc = {'min': np.minimum, 'max': np.maximum, 'sum': np.add}[function]
+                result = ufunc.reduceat(sorted_values, starts)
+
+            if empty is not None:
+                full = np.zeros((n,) + result.shape[1:], dtype=result.dtype)
+                full[~empty] = result
+                result = full
+
+            return result, empty
+
+        if function in ['mean', 'std', 'var']:
+
+            if values.dtype.kind not in 'iufb':
+                raise Exception("Cannot compute %s of non-numerical column" % function)
+
+            if valid is not None:
+                codes, values = codes[valid], values[valid]
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.bincount(codes, weights=values, minlength=n) / counts
+                if function == 'mean':
+                    return mean, empty
+                var = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=n) / counts
+                if function == 'var':
+                    return var, empty
+                return np.sqrt(var), empty
+
+        raise Exception("Unknown aggregation function: %s (should be one of %s)"
+                        % (function, ', '.join(AGGREGATES)))
+
+    def agg(self, functions):
+        '''
+        Compute aggregates of columns for each group and return a new table
+        instance with one row per group
+
+        Required Arguments:
+
+            *functions*: [ dict ]
+                A dictionary giving for each column name the aggregation
+                function, or a list of aggregation functions, to compute.
+                The available functions are count, sum, mean, std, var, min,
+                max, first, and last.
+
+        Returns:
+
+            A new table instance, containing the key columns followed by one
+            column for each aggregate. If a single function is given for a
+            column, the new column has the same name, otherwise the name of
+            the function is appended (e.g. mag_min).
+
+        Masked values are ignored. Groups without any valid values are
+        masked if the table uses masked arrays, and set to the column null
+        value otherwise.
+        '''
+
+        table = self.table
+
+        result = table.__class__(masked=table._masked)
+        result.table_name = table.table_name
+
+        order, starts = self._sorted()
+        first = order[starts]
+        if self._rows is not None:
+            first = self._rows[first]
+
+        for key in self.keys:
+            result.add_column(key, table[key][first], column_header=table._schema[key])
+
+        for name in functions:
+
+            if not name in table.names:
+                raise Exception("No such column: %s" % name)
+
+            if isinstance(functions[name], basestring):
+                names = [(name, functions[name])]
+            else:
+                names = [(name + '_' + function, function) for function in functions[name]]
+
+            values, valid = self._column(name)
+            header = table._schema[name]
+
+            for new_name, function in names:
+
+                array, empty = self._reduce(function, values, valid)
+
+                if function in ['count', 'var']:
+                    unit = ''
+                else:
+                    unit = header.unit
+
+                null = ''
+                if empty is not None and not table._masked:
+                    if header.null not in ['', None]:
+                        null = header.null
+                    else:
+                        null = _default_null(array.dtype)
+                    if null is None:
+                        null = ''
+                    else:
+                        array[empty] = null
+
+                if table._masked:
+                    result.add_column(new_name, array, unit=unit, mask=empty,
+                                      description=header.description)
+                else:
+                    result.add_column(new_name, array, unit=unit, null=null,
+                                      description=header.description)
+
+        return result
+
+
+def sort_order(columns, reverse):
+    '''
+    Return the permutation that sorts rows by the given columns (the first
+    column being the primary key). Sorting is stable, and masked values are
+    placed last. reverse is a list of booleans giving for each column
+    whether to sort in descending order.
+    '''
+
+    # np.lexsort uses the last key as the primary key
+    sort_keys = []
+
+    for values, descending in zip(columns, reverse):
+
+        mask = None
+        if isinstance(values, ma.MaskedArray) and values.mask is not ma.nomask \
+            and np.any(values.mask):
+            mask = values.mask
+        values = ma.getdata(values)
+
+        if values.ndim > 1:
+            raise Exception("Cannot sort on vector column")
+
+        if descending:
+            if values.dtype.kind == 'f':
+                values = -values
+            else:
+                values = -np.unique(values, return_inverse=True)[1].ravel()
+
+        if mask is not None:
+            sort_keys.append(mask)
+        sort_keys.append(values)
+
+    if len(sort_keys) == 1:
+        return np.argsort(sort_keys[0], kind='mergesort')
+    else:
+        return np.lexsort(sort_keys[::-1])
+
+
+ColumnStats = namedtuple('ColumnStats', ['min', 'max', 'count', 'null_count',
+                                         'mean', 'std'])
+
+
+def _null_values(values, null):
+    '''
+    Return a boolean array giving which values are equal to the column null
+    value (and which values are NaN for floating-point columns)
+    '''
+
+    if values.dtype.kind == 'f':
+        missing = np.isnan(values)
+    else:
+        missing = np.zeros(values.shape, dtype=bool)
+
+    if null is None or (isinstance(null, basestring) and null == ''):
+        return missing
+
+    try:
+        null = values.dtype.type(null)
+    except (TypeError, ValueError, OverflowError):
+        return missing
+
+    if values.dtype.kind != 'f' or not np.isnan(null):
+        missing |= values == null
+
+    return missing
+
+
+def column_stats(values, null=None):
+    '''
+    Return the minimum, maximum, number of valid values, number of missing
+    values, mean, and standard deviation of a column as a ColumnStats
+    tuple. Masked values and values equal to null are counted as missing
+    and are excluded from the other statistics. The mean and standard
+    deviation are None for string columns, and all the statistics except
+    the counts are None if there are no valid values.
+    '''
+
+    if isinstance(values, ma.MaskedArray):
+        missing = ma.getmaskarray(values).ravel()
+        values = ma.getdata(values).ravel()
+        if values.dtype.kind == 'f':
+            missing = missing | np.isnan(values)
+    else:
+        values = np.asarray(values).ravel()
+        missing = _null_values(values, null)
+
+    null_count = int(np.count_nonzero(missing))
+
+    if null_count > 0:
+        values = values[~missing]
+
+    count = len(values)
+
+    if count == 0:
+        return ColumnStats(None, None, 0, null_count, None, None)
+
+    if values.dtype.kind in 'SUO':
+        return ColumnStats(values[np.argmin(values)], values[np.argmax(values)],
+                           count, null_count, None, None)
+
+    if values.dtype.kind == 'b':
+        values = values.view(np.uint8)
+        low, high = values.min() == 1, values.max() == 1
+    else:
+        low, high = values.min(), values.max()
+
+    mean = values.mean(dtype=np.float64)
+    std = np.sqrt(np.mean(np.square(values - mean)))
+
+    return ColumnStats(low, high, count, null_count, mean, std)
+
+
+# Integer types to try when narrowing a column, smallest first
+INTEGER_TYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32,
+                 np.uint64, np.int64]
+
+
+def _fits(value, dtype):
+    '''
+    Return whether a value can be converted to a type without changing it
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            return bool(dtype.type(value) == value)
+        except (TypeError, ValueError, OverflowError):
+            return False
+
+
+def narrow_dtype(values, stats, null=None, tolerance=0.):
+    '''
+    Return the smallest type that can hold the values of a column, or None
+    if the column cannot be narrowed. Integer columns only containing 0 and
+    1 are converted to booleans, and 64-bit floats are converted to 32-bit
+    floats if the relative error is at most tolerance for all the values.
+    stats should be the statistics of the column (see column_stats).
+    '''
+
+    dtype = values.dtype
+
+    if stats.count == 0:
+        return None
+
+    # Non-masked columns keep their null value, which should also fit
+    masked = isinstance(values, ma.MaskedArray)
+    has_null = not masked and null is not None and \
+        not (isinstance(null, basestring) and null == '') and _fits(null, dtype)
+
+    if dtype.kind in 'iu':
+
+        low, high = int(stats.min), int(stats.max)
+
+        if has_null:
+            low, high = min(low, int(null)), max(high, int(null))
+        elif low >= 0 and high <= 1:
+            return np.dtype(bool)
+
+        for integer_type in INTEGER_TYPES:
+            if low >= np.iinfo(integer_type).min and \
+                high <= np.iinfo(integer_type).max:
+                new_dtype = np.dtype(integer_type)
+                break
+
+        if new_dtype.itemsize < dtype.itemsize:
+            return new_dtype
+
+    elif dtype.kind == 'f' and dtype.itemsize > 4:
+
+        new_dtype = np.dtype(np.float32)
+
+        if has_null and not _fits(null, new_dtype):
+            return None
+
+        data = ma.getdata(values)
+        narrow = data.astype(new_dtype)
+
+        with np.errstate(invalid='ignore', over='ignore'):
+            lossless = (narrow == data) | np.isnan(data)
+            if tolerance > 0:
+                lossless |= np.abs(narrow - data) <= tolerance * np.abs(data)
+
+        if masked:
+            lossless |= ma.getmaskarray(values)
+
+        if np.all(lossless):
+            return new_dtype
+
+    return None
@@ -0,0 +1,427 @@
+from __future__ import print_function, division
+
+import ast
+import sys
+import tokenize
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import numpy as np
+import numpy.ma as ma
+
+from .varstring import StringColumn
+
+# Number of rows evaluated at a time, so that the temporary arrays for each
+# sub-expression stay small enough to fit in the CPU cache
+CHUNK_SIZE = 65536
+
+def _startswith(values, prefix):
+    if isinstance(values, StringColumn):
+        return values.startswith(prefix)
+    return np.char.startswith(values, _coerce(prefix, values))
+
+
+def _strlen(values):
+    if isinstance(values, StringColumn):
+        return values.lengths()
+    return np.char.str_len(values)
+
+
+# Functions that can be used in expressions
+FUNCTIONS = {'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log,
+             'log10': np.log10, 'sin': np.sin, 'cos': np.cos, 'tan': np.tan,
+             'arcsin': np.arcsin, 'arccos': np.arccos, 'arctan': np.arctan,
+             'arctan2': np.arctan2, 'floor': np.floor, 'ceil': np.ceil,
+             'isnan': np.isnan, 'isfinite': np.isfinite,
+             'startswith': _startswith, 'strlen': _strlen}
+
+BINARY_OPERATORS = {ast.Add: np.add, ast.Sub: np.subtract,
+                    ast.Mult: np.multiply, ast.Div: np.true_divide,
+                    ast.FloorDiv: np.floor_divide, ast.Mod: np.mod,
+                    ast.Pow: np.power}
+
+COMPARISON_OPERATORS = {ast.Eq: np.equal, ast.NotEq: np.not_equal,
+                        ast.Lt: np.less, ast.LtE: np.less_equal,
+                        ast.Gt: np.greater, ast.GtE: np.greater_equal}
+
+# The comparison that is equivalent to each comparison operator when the
+# operands are swapped
+REVERSED_OPERATORS = {ast.Eq: ast.Eq, ast.NotEq: ast.NotEq, ast.Lt: ast.Gt,
+                      ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+
+# Since the categories of a categorical column are sorted, an order
+# comparison with a constant is a comparison of the codes with the position
+# of the constant in the categories (found with np.searchsorted on the given
+# side)
+CODE_COMPARISONS = {ast.Lt: ('left', np.less), ast.LtE: ('right', np.less),
+                    ast.Gt: ('right', np.greater_equal),
+                    ast.GtE: ('left', np.greater_equal)}
+
+# Node types for constants differ between Python versions
+if sys.version_info >= (3, 8):
+    CONSTANTS = (ast.Constant,)
+else:
+    CONSTANTS = tuple(getattr(ast, name) for name in ['Num', 'Str', 'Bytes', 'NameConstant']
+                      if hasattr(ast, name))
+
+NAMED_CONSTANTS = {'True': True, 'False': False}
+
+
+def _constant_value(node):
+    for attribute in ['value', 'n', 's']:
+        if hasattr(node, attribute):
+            return getattr(node, attribute)
+
+
+def parse(expression):
+    '''
+    Parse a query expression into an AST. The & | and ~ operators are
+    replaced by and, or, and not, so that they have the same precedence as
+    the boolean operators (e.g. "a > 1 & b < 2" is "a > 1 and b < 2").
+    '''
+
+    replace = {'&': 'and', '|': 'or', '~': 'not'}
+
+    tokens = []
+    for token in tokenize.generate_tokens(StringIO(expression).readline):
+        if token[0] == tokenize.OP and token[1] in replace:
+            tokens.append((tokenize.NAME, replace[token[1]]))
+        else:
+            tokens.append((token[0], token[1]))
+
+    source = tokenize.untokenize(tokens).strip()
+
+    try:
+        return ast.parse(source, mode='eval').body
+    except SyntaxError:
+        raise Exception("Invalid query expression: %s" % expression)
+
+
+def check(node, names):
+    '''
+    Check that an expression only uses supported operations, and return the
+    names of the columns it uses.
+    '''
+
+    used = set()
+
+    for child in ast.walk(node):
+
+        if isinstance(child, ast.Name):
+            if child.id in names:
+                used.add(child.id)
+            elif not child.id in NAMED_CONSTANTS and not child.id in FUNCTIONS:
+                raise Exception("No such column: %s" % child.id)
+        elif isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Name) or not child.func.id in FUNCTIONS \
+                or child.keywords:
+                raise Exception("Only the following functions can be used in queries: %s"
+                                % ', '.join(sorted(FUNCTIONS)))
+        elif isinstance(child, ast.Compare):
+            for op in child.ops:
+                if not type(op) in COMPARISON_OPERATORS:
+                    raise Exception("Unsupported comparison in query: %s" % type(op).__name__)
+        elif isinstance(child, ast.BinOp):
+            if not type(child.op) in BINARY_OPERATORS:
+                raise Exception("Unsupported operator in query: %s" % type(child.op).__name__)
+        elif isinstance(child, ast.UnaryOp):
+            if not isinstance(child.op, (ast.Not, ast.USub, ast.UAdd)):
+                raise Exception("Unsupported operator in query: %s" % type(child.op).__name__)
+        elif not isinstance(child, CONSTANTS + (ast.BoolOp, ast.And, ast.Or, ast.Load,
+                                                ast.expr_context, ast.operator,
+                                                ast.unaryop, ast.cmpop, ast.boolop)):
+            raise Exception("Unsupported syntax in query: %s" % type(child).__name__)
+
+    return used
+
+
+def _as_truth(value, n):
+    '''
+    Convert the result of a sub-expression to a pair of boolean arrays of
+    length n, giving the rows for which it is true and false. Masked values
+    are neither true nor false.
+    '''
+
+    if isinstance(value, ma.MaskedArray):
+        known = ~ma.getmaskarray(value)
+        value = value.filled(False)
+    else:
+        known = None
+
+    value = np.asarray(value, dtype=bool)
+
+    if value.ndim == 0:
+        value = np.repeat(value, n)
+    elif value.shape != (n,):
+        raise Exception("Query expression does not give one value per row")
+
+    if known is None:
+        return value, ~value
+    else:
+        if known.ndim == 0:
+            known = np.repeat(known, n)
+        return value & known, ~value & known
+
+
+def _coerce(value, other):
+    '''
+    Convert a string constant to bytes if it is compared to a bytes column
+    '''
+    if isinstance(other, np.ndarray) and other.dtype.kind == 'S' and \
+        not isinstance(value, (bytes, np.ndarray)) and isinstance(value, type(u'')):
+        return value.encode('utf-8')
+    return value
+
+
+def _compare(op, left, right):
+    '''
+    Compare two values, which may be columns. Variable-length string columns
+    are compared directly for equality, and decoded for other comparisons.
+    '''
+
+    if isinstance(right, StringColumn) and not isinstance(left, StringColumn):
+        left, right, op = right, left, REVERSED_OPERATORS[op]
+
+    if isinstance(left, StringColumn):
+        if op in (ast.Eq, ast.NotEq) and not isinstance(right, StringColumn):
+            result = left.equal(right)
+            return result if op is ast.Eq else ~result
+        left = left.to_array()
+        if isinstance(right, StringColumn):
+            right = right.to_array()
+
+    return COMPARISON_OPERATORS[op](_coerce(left, right), _coerce(right, left))
+
+
+class Evaluator(object):
+    '''
+    Evaluates an expression for a range of rows of a table. Sub-expressions
+    of and/or are only evaluated for the rows for which the result is not
+    yet known.
+    '''
+
+    def __init__(self, get_column, n_rows, get_codes=None):
+        self._get_column = get_column
+        self._get_codes = get_codes
+        self._cache = {}
+        self.n_rows = n_rows
+
+    def column(self, name, rows):
+        if not name in self._cache:
+            self._cache[name] = self._get_column(name)
+        values = self._cache[name]
+        if rows is None:
+            return values
+        else:
+            return values[rows]
+
+    def codes(self, name, rows):
+        '''
+        Return the codes and categories of a categorical column, or None if
+        the column is not categorical
+        '''
+        if self._get_codes is None:
+            return None
+        key = ('codes', name)
+        if not key in self._cache:
+            self._cache[key] = self._get_codes(name)
+        if self._cache[key] is None:
+            return None
+        codes, categories = self._cache[key]
+        if rows is None:
+            return codes, categories
+        else:
+            return codes[rows], categories
+
+    def compare_codes(self, node, rows):
+        '''
+        Compare a categorical column with a constant using the codes of the
+        column. Returns None if the comparison is not of this form.
+        '''
+
+        if len(node.ops) != 1:
+            return None
+
+        left, op, right = node.left, type(node.ops[0]), node.comparators[0]
+
+        if isinstance(left, CONSTANTS) and isinstance(right, ast.Name):
+            left, op, right = right, REVERSED_OPERATORS[op], left
+
+        if not isinstance(left, ast.Name) or not isinstance(right, CONSTANTS) \
+            or left.id in NAMED_CONSTANTS:
+            return None
+
+        encoded = self.codes(left.id, rows)
+
+        if encoded is None:
+            return None
+
+        codes, categories = encoded
+        value = _coerce(_constant_value(right), categories)
+
+        if np.asarray(value).dtype.kind != categories.dtype.kind:
+            return None
+
+        if op in CODE_COMPARISONS:
+            side, compare = CODE_COMPARISONS[op]
+            return compare(codes, np.intp(np.searchsorted(categories, value, side=side)))
+
+        position = np.searchsorted(categories, value)
+        if position == len(categories) or categories[position] != value:
+            position = -1
+
+        return COMPARISON_OPERATORS[op](codes, np.intp(position))
+
+    def mask(self, node, rows, n):
+        '''
+        Evaluate a boolean expression for the given rows (None for all rows)
+        and return a boolean array of length n
+        '''
+        return self.truth(node, rows, n)[0]
+
+    def truth(self, node, rows, n):
+        '''
+        Evaluate a boolean expression for the given rows (None for all rows)
+        and return boolean arrays of length n giving the rows for which it is
+        true and false. Comparisons involving masked values are neither, so
+        that they are also not selected when negated.
+        '''
+
+        if isinstance(node, ast.BoolOp):
+
+            # These may be columns of the table, so make sure they are copies
+            true, false = [np.array(x) for x in self.truth(node.values[0], rows, n)]
+
+            for value in node.values[1:]:
+
+                # Only rows that are not yet false (for and) or true (for or)
+                # need to be evaluated
+                if isinstance(node.op, ast.And):
+                    pending = ~false
+                else:
+                    pending = ~true
+
+                positions = np.flatnonzero(pending)
+
+                if len(positions) == 0:
+                    break
+
+                if rows is None:
+                    sub_rows = positions
+                else:
+                    sub_rows = rows[positions]
+
+                sub_true, sub_false = self.truth(value, sub_rows, len(positions))
+
+                if isinstance(node.op, ast.And):
+                    true[positions] &= sub_true
+                    false[positions] = sub_false
+                else:
+                    true[positions] = sub_true
+                    false[positions] &= sub_false
+
+            return true, false
+
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            true, false = self.truth(node.operand, rows, n)
+            return false, true
+
+        else:
+            return _as_truth(self.value(node, rows), n)
+
+    def value(self, node, rows):
+        '''
+        Evaluate an expression for the given rows (None for all rows)
+        '''
+
+        if isinstance(node, ast.Name):
+            if node.id in NAMED_CONSTANTS:
+                return NAMED_CONSTANTS[node.id]
+            return self.column(node.id, rows)
+
+        elif isinstance(node, CONSTANTS):
+            return _constant_value(node)
+
+        elif isinstance(node, ast.BinOp):
+            left = self.value(node.left, rows)
+            right = self.value(node.right, rows)
+            return BINARY_OPERATORS[type(node.op)](left, right)
+
+        elif isinstance(node, ast.UnaryOp):
+            operand = self.value(node.operand, rows)
+            if isinstance(node.op, ast.USub):
+                return -operand
+            elif isinstance(node.op, ast.UAdd):
+                return operand
+            else:
+                return np.logical_not(operand)
+
+        elif isinstance(node, ast.Compare):
+            result = self.compare_codes(node, rows)
+            if result is not None:
+                return result
+            left = self.value(node.left, rows)
+            result = None
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self.value(comparator, rows)
+                comparison = _compare(type(op), left, right)
+                if result is None:
+                    result = comparison
+                else:
+                    result = result & comparison
+                left = right
+            return result
+
+        elif isinstance(node, ast.BoolOp):
+            if rows is None:
+                return self.mask(node, rows, self.n_rows)
+            else:
+                return self.mask(node, rows, len(rows))
+
+        elif isinstance(node, ast.Call):
+            arguments = [self.value(argument, rows) for argument in node.args]
+            return FUNCTIONS[node.func.id](*arguments)
+
+        else:
+            raise Exception("Unsupported syntax in query: %s" % type(node).__name__)
+
+
+def query_rows(table, expression, chunk_size=CHUNK_SIZE):
+    '''
+    Return the numbers of the rows of a table for which an expression is
+    true
+    '''
+
+    node = parse(expression)
+    check(node, table.names)
+
+    store = table._store
+    n_rows = len(table)
+
+    rows = []
+
+    for start in range(0, n_rows, chunk_size):
+
+        end = min(start + chunk_size, n_rows)
+
+        def get_column(name):
+            return store.column_chunk(name, start, end)
+
+        def get_codes(name):
+            if store.is_categorical(name):
+                return (store.column_chunk(name, start, end, decode=False),
+                        store.categories(name))
+            return None
+
+        evaluator = Evaluator(get_column, end - start, get_codes)
+        mask = evaluator.mask(node, None, end - start)
+
+        rows.append(np.flatnonzero(mask) + start)
+
+    if rows:
+        return np.concatenate(rows)
+    else:
+        return np.zeros(0, dtype=np.intp)
@@ -1,11 +1,69 @@
+from __future__ import print_function, division
+
+import os
+import gzip
+import bz2
+import importlib
+
 _readers = {}
 _writers = {}
 _set_readers = {}
 _set_writers = {}
+_chunk_readers = {}
+_chunk_writers = {}
 _extensions = {}
+_detectors = []
+
+# Table types whose readers and chunk readers accept a columns= argument
+_column_readers = set()
+_column_chunk_readers = set()
 
+# Number of bytes read from the start of a file to determine the table type
+SNIFF_SIZE = 4096
 
-def register_reader(ttype, function, override=False):
+
+class _LazyFunction(object):
+    '''
+    A function that is only imported from its module the first time it is
+    called, given as 'module:function'. Module names starting with '.' are
+    relative to the atpy package.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._function = None
+
+    def _load(self):
+        if self._function is None:
+            module_name, function_name = self.path.split(':')
+            module = importlib.import_module(module_name, __name__.rpartition('.')[0])
+            self._function = getattr(module, function_name)
+        return self._function
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        return "<lazy function %s>" % self.path
+
+
+def _register(registry, ttype, function, override):
+    if not ttype in registry or override:
+        if type(function) == str:
+            function = _LazyFunction(function)
+        registry[ttype] = function
+    else:
+        raise Exception("Type %s is already defined" % ttype)
+
+
+def _register_columns(supported, ttype, columns):
+    if columns:
+        supported.add(ttype)
+    else:
+        supported.discard(ttype)
+
+
+def register_reader(ttype, function, override=False, columns=False):
     '''
     Register a table reader function.
 
@@ -15,19 +73,26 @@ def register_reader(ttype, function, override=False):
             The table type identifier. This is the string that will be used to
             specify the table type when reading.
 
-        *function*: [ function ]
-            The function to read in a single table.
+        *function*: [ function or string ]
+            The function to read in a single table. This can also be a
+            string 'module:function' giving the module containing the
+            function and its name, in which case the module is only
+            imported the first time a table of this type is read. Module
+            names starting with '.' are relative to the atpy package.
 
     Optional Keyword Arguments:
 
         *override*: [ True | False ]
             Whether to override any existing type if already present.
+
+        *columns*: [ True | False ]
+            Whether the function accepts a columns= argument giving the
+            names of the columns to read. If not, Table.read() reads all the
+            columns and then removes the ones that were not requested.
     '''
 
-    if not ttype in _readers or override:
-        _readers[ttype] = function
-    else:
-        raise Exception("Type %s is already defined" % ttype)
+    _register(_readers, ttype, function, override)
+    _register_columns(_column_readers, ttype, columns)
 
 
 def register_writer(ttype, function, override=False):
@@ -40,8 +105,9 @@ def register_writer(ttype, function, override=False):
             The table type identifier. This is the string that will be used to
             specify the table type when writing.
 
-        *function*: [ function ]
-            The function to write out a single table.
+        *function*: [ function or string ]
+            The function to write out a single table. This can also be a
+            string 'module:function' (see register_reader).
 
     Optional Keyword Arguments:
 
@@ -49,10 +115,7 @@ def register_writer(ttype, function, override=False):
             Whether to override any existing type if already present.
     '''
 
-    if not ttype in _writers or override:
-        _writers[ttype] = function
-    else:
-        raise Exception("Type %s is already defined" % ttype)
+    _register(_writers, ttype, function, override)
 
 
 def register_set_reader(ttype, function, override=False):
@@ -65,8 +128,9 @@ def register_set_reader(ttype, function, override=False):
             The table type identifier. This is the string that will be used to
             specify the table type when reading.
 
-        *function*: [ function ]
-            The function to read in a table set.
+        *function*: [ function or string ]
+            The function to read in a table set. This can also be a
+            string 'module:function' (see register_reader).
 
     Optional Keyword Arguments:
 
@@ -74,10 +138,7 @@ def register_set_reader(ttype, function, override=False):
             Whether to override any existing type if already present.
     '''
 
-    if not ttype in _set_readers or override:
-        _set_readers[ttype] = function
-    else:
-        raise Exception("Type %s is already defined" % ttype)
+    _register(_set_readers, ttype, function, override)
 
 
 def register_set_writer(ttype, function, override=False):
@@ -90,8 +151,9 @@ def register_set_writer(ttype, function, override=False):
             The table type identifier. This is the string that will be used to
             specify the table type when writing.
 
-        *function*: [ function ]
-            The function to write out a table set.
+        *function*: [ function or string ]
+            The function to write out a table set. This can also be a
+            string 'module:function' (see register_reader).
 
     Optional Keyword Arguments:
 
@@ -99,10 +161,65 @@ def register_set_writer(ttype, function, override=False):
             Whether to override any existing type if already present.
     '''
 
-    if not ttype in _set_writers or override:
-        _set_writers[ttype] = function
-    else:
-        raise Exception("Type %s is already defined" % ttype)
+    _register(_set_writers, ttype, function, override)
+
+
+def register_chunk_reader(ttype, function, override=False, columns=False):
+    '''
+    Register a function reading a table in chunks of rows, used by
+    atpy.iter_read().
+
+    Required Arguments:
+
+        *ttype*: [ string ]
+            The table type identifier. This is the string that will be used to
+            specify the table type when reading.
+
+        *function*: [ function or string ]
+            A generator function taking the same arguments as the reader
+            function for the type, plus a chunk_rows= argument, and yielding
+            Table instances with at most chunk_rows rows. The tables should
+            share their column headers (see Table.where). This can also be a
+            string 'module:function' (see register_reader).
+
+    Optional Keyword Arguments:
+
+        *override*: [ True | False ]
+            Whether to override any existing type if already present.
+
+        *columns*: [ True | False ]
+            Whether the function accepts a columns= argument (see
+            register_reader)
+    '''
+
+    _register(_chunk_readers, ttype, function, override)
+    _register_columns(_column_chunk_readers, ttype, columns)
+
+
+def register_chunk_writer(ttype, function, override=False):
+    '''
+    Register a class writing out a table in chunks of rows, used by
+    atpy.open_writer().
+
+    Required Arguments:
+
+        *ttype*: [ string ]
+            The table type identifier. This is the string that will be used to
+            specify the table type when writing.
+
+        *function*: [ class or string ]
+            A subclass of atpy.streaming.ChunkWriter taking the same
+            arguments as the writer function for the type, plus a schema=
+            argument. This can also be a string 'module:class' (see
+            register_reader).
+
+    Optional Keyword Arguments:
+
+        *override*: [ True | False ]
+            Whether to override any existing type if already present.
+    '''
+
+    _register(_chunk_writers, ttype, function, override)
 
 
 def register_extensions(ttype, extensions, override=False):
@@ -138,10 +255,159 @@ def register_extensions(ttype, extensions, override=False):
             raise Exception("Extension %s is already defined" % extension)
 
 
-def _determine_type(string, verbose):
+def register_detector(ttype, function, override=False, weak=False):
+    '''
+    Register a function that recognizes files of a specific table type from
+    their first bytes - used for auto type selection. The functions are tried
+    in the order in which they were registered, before the file extension is
+    checked (except for weak detectors, see below).
 
-    if not isinstance(string, basestring):
-        raise Exception('Could not determine table type (non-string argument)')
+    Required Arguments:
+
+        *ttype*: [ string ]
+            The table type identifier. This is the string that is used to
+            specify the table type when reading.
+
+        *function*: [ function ]
+            A function that takes the first bytes of a file (up to
+            SNIFF_SIZE bytes, after decompressing gzip and bzip2 files) and
+            returns whether the file is of this type.
+
+    Optional Keyword Arguments:
+
+        *override*: [ True | False ]
+            Whether to override the function for the type if already present.
+
+        *weak*: [ True | False ]
+            Whether the function only looks for a text pattern that files of
+            other types could also contain. Weak detectors are not used for
+            local files whose extension is registered, so that the extension
+            determines their type.
+    '''
+
+    for detector in _detectors:
+        if detector[0] == ttype:
+            if override:
+                detector[1:] = [function, weak]
+                return
+            else:
+                raise Exception("Type %s is already defined" % ttype)
+
+    _detectors.append([ttype, function, weak])
+
+
+class PrefixedFile(object):
+    '''
+    A file object whose first bytes have already been read, for example to
+    determine the table type. Reading from it returns these bytes followed
+    by the rest of the file, so that the file does not need to be read (or
+    downloaded) again.
+    '''
+
+    def __init__(self, fileobj, prefix):
+        self._fileobj = fileobj
+        self._prefix = prefix
+        self.name = getattr(fileobj, 'name', None)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._prefix + self._fileobj.read()
+            self._prefix = b''
+        else:
+            data = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            if len(data) < size:
+                data += self._fileobj.read(size - len(data))
+        return data
+
+    def close(self):
+        self._fileobj.close()
+
+
+def _is_url(string):
+    return string.lower().startswith('http://') or string.lower().startswith('ftp://')
+
+
+def _read_prefix(fileobj):
+    '''
+    Read the first bytes of a file object, decompressing it if it is
+    compressed with gzip or bzip2. Returns a file object that can be read
+    from the start (decompressed) and the bytes read.
+    '''
+
+    prefix = fileobj.read(SNIFF_SIZE)
+
+    if prefix[:2] == b'\x1f\x8b':
+        fileobj = gzip.GzipFile(fileobj=PrefixedFile(fileobj, prefix))
+        prefix = fileobj.read(SNIFF_SIZE)
+    elif prefix[:3] == b'BZh':
+        fileobj = bz2.BZ2File(PrefixedFile(fileobj, prefix))
+        prefix = fileobj.read(SNIFF_SIZE)
+
+    return PrefixedFile(fileobj, prefix), prefix
+
+
+def _detect_type(args, verbose):
+    '''
+    Determine the table type for reading from the first bytes of the file,
+    URL, or file object given as the first argument, or from the file
+    extension if these are not recognized. URLs with a known extension are
+    not downloaded, and local files with a known extension are only checked
+    with the detectors that are not weak. Returns the table type and the arguments to pass to the
+    reader. URLs and file objects are replaced by a file object returning
+    the bytes already read followed by the rest of the file.
+    '''
+
+    source = args[0]
+    prefix = None
+    known_extension = False
+
+    if hasattr(source, 'read'):
+        source, prefix = _read_prefix(source)
+        args = (source,) + tuple(args[1:])
+    elif isinstance(source, basestring):
+        if _is_url(source):
+            if _extension(source) in _extensions:
+                return _determine_type(source, verbose), args
+            from .decorators import Request, urlopen
+            source, prefix = _read_prefix(urlopen(Request(args[0])))
+            args = (source,) + tuple(args[1:])
+        elif os.path.isfile(source):
+            known_extension = _extension(source) in _extensions
+            f = open(source, 'rb')
+            try:
+                prefix = _read_prefix(f)[1]
+            finally:
+                f.close()
+
+    if prefix:
+        for ttype, function, weak in _detectors:
+            if weak and known_extension:
+                continue
+            if function(prefix):
+                if verbose:
+                    print("Auto-detected table type: %s" % ttype)
+                # The SQL reader expects the database type first, and can
+                # only open local files
+                if ttype == 'sql':
+                    if not isinstance(args[0], basestring):
+                        raise Exception("SQLite input must be a local file")
+                    args = ('sqlite',) + tuple(args)
+                return ttype, args
+
+    if isinstance(args[0], basestring):
+        return _determine_type(args[0], verbose), args
+    elif getattr(source, 'name', None):
+        return _determine_type(source.name, verbose), args
+    else:
+        raise Exception('Could not determine table type')
+
+
+def _extension(string):
+    '''
+    Return the file extension of a filename or URL, ignoring any gzip or
+    bzip2 extension
+    '''
 
     s = str(string).lower()
 
@@ -152,6 +418,16 @@ def _determine_type(string, verbose):
         if extension.lower() in ['gz', 'bz2', 'bzip2']:
             extension = s.split('.')[-2]
 
+    return extension
+
+
+def _determine_type(string, verbose):
+
+    if not isinstance(string, basestring):
+        raise Exception('Could not determine table type (non-string argument)')
+
+    extension = _extension(string)
+
     if extension in _extensions:
         table_type = _extensions[extension]
         if verbose:
@@ -161,70 +437,105 @@ def _determine_type(string, verbose):
 
     return table_type
 
-from . import fitstable
+HDF5_SIGNATURE = b'\x89HDF\r\n\x1a\n'
 
-register_reader('fits', fitstable.read)
-register_writer('fits', fitstable.write)
-register_set_reader('fits', fitstable.read_set)
-register_set_writer('fits', fitstable.write_set)
-register_extensions('fits', ['fit', 'fits'])
 
-from . import votable
+def _is_fits(prefix):
+    return prefix.startswith(b'SIMPLE  =')
 
-register_reader('vo', votable.read)
-register_writer('vo', votable.write)
-register_set_reader('vo', votable.read_set)
-register_set_writer('vo', votable.write_set)
-register_extensions('vo', ['xml', 'vot'])
 
-from . import ipactable
+def _is_hdf5(prefix):
+    # The superblock can be at 0, 512, 1024, 2048, ... bytes
+    for offset in [0, 512, 1024, 2048]:
+        if prefix[offset:offset + 8] == HDF5_SIGNATURE:
+            return True
+    return False
 
-register_reader('ipac', ipactable.read)
-register_writer('ipac', ipactable.write)
-register_extensions('ipac', ['ipac', 'tbl'])
 
-from . import sqltable
+def _is_sqlite(prefix):
+    return prefix.startswith(b'SQLite format 3\x00')
 
-register_reader('sql', sqltable.read)
-register_writer('sql', sqltable.write)
-register_set_reader('sql', sqltable.read_set)
-register_set_writer('sql', sqltable.write_set)
-register_extensions('sql', ['sqlite', 'postgres', 'mysql', 'db'])
 
-from . import asciitables
+def _is_votable(prefix):
+    return prefix.lstrip().startswith(b'<') and b'<VOTABLE' in prefix
 
-register_reader('cds', asciitables.read_cds)
-register_reader('mrt', asciitables.read_cds)
 
-register_reader('latex', asciitables.read_latex)
-register_writer('latex', asciitables.write_latex)
+def _is_ipac(prefix):
+    # Any comment ('\ text') and keyword ('\key = value') lines should be
+    # followed by the column names ('|name|...|')
+    for line in prefix.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line[:1] == b'\\':
+            if not line[1:2] in [b'', b' '] and not b'=' in line:
+                return False
+        else:
+            return line[:1] == b'|' and line[-1:] == b'|' and \
+                len(line.replace(b'|', b'').strip()) > 0
+    return False
 
-register_reader('rdb', asciitables.read_rdb)
-register_writer('rdb', asciitables.write_rdb)
-register_extensions('rdb', ['rdb'])
 
-register_reader('daophot', asciitables.read_daophot)
+register_detector('fits', _is_fits)
+register_detector('hdf5', _is_hdf5)
+register_detector('sql', _is_sqlite)
+register_detector('vo', _is_votable, weak=True)
+register_detector('ipac', _is_ipac, weak=True)
 
-register_reader('ascii', asciitables.read_ascii)
-register_writer('ascii', asciitables.write_ascii)
+# The modules for each table type are only imported when a table of this
+# type is first read or written, so that importing atpy stays fast.
 
-from . import hdf5table
+register_reader('fits', '.fitstable:read', columns=True)
+register_writer('fits', '.fitstable:write')
+register_set_reader('fits', '.fitstable:read_set')
+register_set_writer('fits', '.fitstable:write_set')
+register_chunk_writer('fits', '.fitstable:FITSWriter')
+register_extensions('fits', ['fit', 'fits'])
 
-register_reader('hdf5', hdf5table.read)
-register_set_reader('hdf5', hdf5table.read_set)
-register_writer('hdf5', hdf5table.write)
-register_set_writer('hdf5', hdf5table.write_set)
-register_extensions('hdf5', ['hdf5', 'h5'])
+register_reader('vo', '.votable:read', columns=True)
+register_writer('vo', '.votable:write')
+register_set_reader('vo', '.votable:read_set')
+register_set_writer('vo', '.votable:write_set')
+register_extensions('vo', ['xml', 'vot'])
 
-from . import irsa_service
+register_reader('ipac', '.ipactable:read', columns=True)
+register_writer('ipac', '.ipactable:write')
+register_chunk_writer('ipac', '.ipactable:IPACWriter')
+register_extensions('ipac', ['ipac', 'tbl'])
 
-register_reader('irsa', irsa_service.read)
+register_reader('sql', '.sqltable:read', columns=True)
+register_writer('sql', '.sqltable:write')
+register_set_reader('sql', '.sqltable:read_set')
+register_set_writer('sql', '.sqltable:write_set')
+register_chunk_writer('sql', '.sqltable:SQLWriter')
+register_extensions('sql', ['sqlite', 'postgres', 'mysql', 'db'])
+
+register_reader('cds', '.asciitables:read_cds')
+register_reader('mrt', '.asciitables:read_cds')
+
+register_reader('latex', '.asciitables:read_latex')
+register_writer('latex', '.asciitables:write_latex')
+
+register_reader('rdb', '.asciitables:read_rdb')
+register_writer('rdb', '.asciitables:write_rdb')
+register_extensions('rdb', ['rdb'])
+
+register_reader('daophot', '.asciitables:read_daophot')
 
-from . import vo_conesearch
+register_reader('ascii', '.asciitables:read_ascii')
+register_writer('ascii', '.asciitables:write_ascii')
+
+register_reader('hdf5', '.hdf5table:read', columns=True)
+register_set_reader('hdf5', '.hdf5table:read_set')
+register_writer('hdf5', '.hdf5table:write')
+register_set_writer('hdf5', '.hdf5table:write_set')
+register_chunk_reader('hdf5', '.hdf5table:iter_read', columns=True)
+register_chunk_writer('hdf5', '.hdf5table:HDF5Writer')
+register_extensions('hdf5', ['hdf5', 'h5'])
 
-register_reader('vo_conesearch', vo_conesearch.read)
+register_reader('irsa', '.irsa_service:read')
 
-from . import htmltable
+register_reader('vo_conesearch', '.vo_conesearch:read')
 
-register_writer('html', htmltable.write)
+register_writer('html', '.htmltable:write')
 register_extensions('html', ['html', 'htm'])
@@ -420,3 +420,46 @@ def insert_row(cursor, dbtype, table_name, row, fixnan=False):
 
     cursor.execute(query, row)
     return
+
+
+def insert_rows(cursor, dbtype, table_name, rows, fixnan=False):
+    '''
+    Insert several rows into an SQL database (assumes all columns are
+    specified) with a single call to executemany
+
+    Required Arguments:
+
+        *cursor*: [ DB API cursor object ]
+            A cursor for the current database in the DB API formalism
+
+        *dbtype*: [ 'sqlite' | 'mysql' | 'postgres' ]
+            The type of database
+
+        *table_name*: [ string ]
+            The name of the table to get column information about
+
+        *rows*: [ list of tuples ]
+            A list of tuples containing all the values to insert into each
+            row
+    '''
+
+    if len(rows) == 0:
+        return
+
+    query = 'insert into ' + table_name + ' values ('
+    query += (insert_symbol[dbtype] + ', ') * (len(rows[0]) - 1)
+    query += insert_symbol[dbtype] + ")"
+
+    if fixnan and dbtype in ['postgres', 'mysql']:
+        for j, row in enumerate(rows):
+            for i, e in enumerate(row):
+                if type(e) == float and math.isnan(e):
+                    row = list(row)
+                    if dbtype == 'postgres':
+                        row[i] = str(e)
+                    else:
+                        row[i] = None
+            rows[j] = row
+
+    cursor.executemany(query, rows)
+    return
@@ -3,12 +3,14 @@ from __future__ import print_function, division
 # NOTE: docstring is long and so only written once!
 #       It is copied for the other routines
 
+import itertools
 import warnings
 
 import numpy as np
 
 from . import sqlhelper as sql
 from .exceptions import TableException, ExistingTableException
+from .streaming import ChunkWriter
 
 invalid = {}
 invalid[np.uint8] = np.iinfo(np.uint8).max
@@ -22,6 +24,9 @@ invalid[np.int64] = np.iinfo(np.int64).max
 invalid[np.float32] = np.float32(np.nan)
 invalid[np.float64] = np.float64(np.nan)
 
+# Number of rows inserted with each call to executemany
+INSERT_BATCH_SIZE = 1000
+
 
 def read(self, dbtype, *args, **kwargs):
     '''
@@ -43,6 +48,12 @@ def read(self, dbtype, *args, **kwargs):
             any valid SQL command provided that the result is a single
             table.
 
+        *columns*: [ list of strings ]
+            The names of the columns to read. Only these columns are
+            selected from the table, unless the query= argument is
+            specified, in which case the other columns are removed after
+            running the query.
+
     The remaining arguments depend on the database type:
 
     * SQLite:
@@ -113,6 +124,11 @@ def read(self, dbtype, *args, **kwargs):
     else:
         query = None
 
+    if 'columns' in kwargs:
+        selected = kwargs.pop('columns')
+    else:
+        selected = None
+
     # Erase existing content
     self.reset()
 
@@ -166,7 +182,17 @@ def read(self, dbtype, *args, **kwargs):
 
         cursor = connection.cursor()
 
-        cursor.execute('select * from ' + table_name)
+        if selected is None:
+            cursor.execute('select * from ' + table_name)
+        else:
+            for name in selected:
+                if not name in column_names:
+                    raise Exception("Column %s does not exist" % name)
+            column_types = [column_types[column_names.index(name)] for name in selected]
+            column_names = list(selected)
+            if not all(key in column_names for key in primary_keys):
+                primary_keys = []
+            cursor.execute('select ' + ', '.join(column_names) + ' from ' + table_name)
 
     results = cursor.fetchall()
 
@@ -176,6 +202,8 @@ def read(self, dbtype, *args, **kwargs):
     else:
         raise Exception("SQL query did not return any records")
 
+    columns = []
+
     for i, column in enumerate(results.dtype.names):
 
         if self._masked:
@@ -186,11 +214,11 @@ def read(self, dbtype, *args, **kwargs):
                     results[column][mask] = "NULL"
                 else:
                     results[column][mask] = 0.
-                mask = mask.astype(np.object_)
             else:
                 mask = None
 
-            self.add_column(column, results[column], dtype=column_types[i], mask=mask)
+            columns.append((column, results[column], \
+                {'dtype': column_types[i], 'mask': mask}))
 
         else:
 
@@ -200,7 +228,10 @@ def read(self, dbtype, *args, **kwargs):
             else:
                 null = 'None'
 
-            self.add_column(column, results[column], dtype=column_types[i], null=null)
+            columns.append((column, results[column], \
+                {'dtype': column_types[i], 'null': null}))
+
+    self.add_columns(columns)
 
     # Set primary key if present
     if len(primary_keys) == 1:
@@ -222,6 +253,56 @@ def write(self, dbtype, *args, **kwargs):
     # Open the connection
     connection, cursor = sql.connect_database(dbtype, *args, **kwargs)
 
+    table_name = _create_table(self, cursor, dbtype, overwrite)
+
+    _insert_rows(self, cursor, dbtype, table_name)
+
+    # Close connection
+    connection.commit()
+    cursor.close()
+
+write.__doc__ = read.__doc__
+
+
+class SQLWriter(ChunkWriter):
+    '''
+    Write a table to an SQL database one chunk of rows at a time (see
+    atpy.open_writer). The table is created using the metadata of the first
+    chunk, and the rows of each chunk are inserted in batches. The changes
+    are committed when the writer is closed.
+
+    The arguments are the same as for write().
+    '''
+
+    def __init__(self, dbtype, *args, **kwargs):
+
+        ChunkWriter.__init__(self, schema=kwargs.pop('schema', None))
+
+        if 'overwrite' in kwargs:
+            self._overwrite = kwargs.pop('overwrite')
+        else:
+            self._overwrite = False
+
+        self._dbtype = dbtype
+        self._connection, self._cursor = sql.connect_database(dbtype, *args, **kwargs)
+
+    def _open(self, table):
+        table._raise_vector_columns()
+        self._table_name = _create_table(table, self._cursor, self._dbtype, self._overwrite)
+
+    def _write(self, table):
+        _insert_rows(table, self._cursor, self._dbtype, self._table_name)
+
+    def _close(self):
+        self._connection.commit()
+        self._cursor.close()
+
+
+def _create_table(self, cursor, dbtype, overwrite):
+    '''
+    Create the database table for a table, and return its name
+    '''
+
     # Check that table name is set
     if not self.table_name:
         raise Exception("Table name is not set")
@@ -249,20 +330,20 @@ def write(self, dbtype, *args, **kwargs):
                                         for name in self.names]
     sql.create_table(cursor, dbtype, table_name, columns, primary_key=self._primary_key)
 
+    return table_name
 
-    # Insert row
-    float_column = [self.columns[name].dtype.type in [np.float32, np.float64] for name in self.names]
-
-    for i in range(self.__len__()):
-        row = self.row(i, python_types=True)
 
-        sql.insert_row(cursor, dbtype, table_name, row, fixnan=not self._masked)
-
-    # Close connection
-    connection.commit()
-    cursor.close()
+def _insert_rows(self, cursor, dbtype, table_name):
+    '''
+    Insert the rows of a table into the database table, in batches
+    '''
 
-write.__doc__ = read.__doc__
+    rows = self.iter_rows()
+    while True:
+        batch = list(itertools.islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            break
+        sql.insert_rows(cursor, dbtype, table_name, batch, fixnan=not self._masked)
 
 
 def read_set(self, dbtype, *args, **kwargs):
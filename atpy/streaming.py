@@ -0,0 +1,266 @@
+from __future__ import print_function, division
+
+import numpy as np
+
+from . import registry
+from .basetable import Table
+from .varstring import StringColumn
+
+# Default number of rows in each chunk returned by iter_read
+DEFAULT_CHUNK_ROWS = 100000
+
+
+def iter_read(*args, **kwargs):
+    '''
+    Read a table from a file/database in chunks of rows. For table types
+    with a chunk reader (see register_chunk_reader), only one chunk is held
+    in memory at a time. Other table types are read in full and then split
+    into chunks.
+
+    Optional Keyword Arguments:
+
+        *chunk_rows*: [ integer ]
+            The maximum number of rows in each chunk (the last chunk may be
+            shorter)
+
+        *verbose*: [ True | False ]
+            Whether to print out warnings when reading (default is True)
+
+        *type*: [ string ]
+            The file/database format. If this is not specified, it is
+            determined in the same way as for Table.read().
+
+        *columns*: [ list of strings ]
+            The names of the columns to read, as for Table.read()
+
+    The remaining arguments are passed on to the reader for the table type,
+    as for Table.read().
+
+    Returns an iterator over Table instances. The chunks share their column
+    headers, keywords, and comments.
+    '''
+
+    chunk_rows = kwargs.pop('chunk_rows', DEFAULT_CHUNK_ROWS)
+
+    if chunk_rows < 1:
+        raise Exception("chunk_rows should be a positive integer")
+
+    if 'verbose' in kwargs:
+        verbose = kwargs['verbose']
+    else:
+        verbose = True
+
+    if 'type' in kwargs:
+        table_type = kwargs.pop('type').lower()
+    else:
+        table_type, args = registry._detect_type(args, verbose)
+
+    # Chunk readers read from local files and databases, so URLs and file
+    # objects are read in full
+    source = args[0]
+    local = not hasattr(source, 'read') and \
+        not (isinstance(source, basestring) and registry._is_url(source))
+
+    if table_type in registry._chunk_readers and local:
+        columns = kwargs.pop('columns', None)
+        if type(columns) == str:
+            columns = [columns]
+        if columns is not None and table_type in registry._column_chunk_readers:
+            kwargs['columns'] = columns
+            columns = None
+        for chunk in registry._chunk_readers[table_type](*args, chunk_rows=chunk_rows, **kwargs):
+            if columns is not None:
+                chunk = chunk.select_columns(columns)
+            yield chunk
+    else:
+        table = Table()
+        table.read(*args, type=table_type, **kwargs)
+        for chunk in table.iter_chunks(chunk_rows, as_table=True):
+            yield chunk
+
+
+def open_writer(*args, **kwargs):
+    '''
+    Open a file/database to write out a table one chunk of rows at a time,
+    so that the whole table never needs to be held in memory.
+
+    Optional Keyword Arguments:
+
+        *schema*: [ Schema or Table ]
+            The column headers of the table (for example t.schema). If this
+            is not specified, the column headers of the first chunk are
+            used. The values in all the chunks should fit in the column
+            types, so this should be specified if string columns in later
+            chunks can contain longer strings than in the first chunk.
+
+        *type*: [ string ]
+            The file/database format. If this is not specified, it is
+            determined from the file extension, as for Table.write().
+
+    The remaining arguments are passed on to the writer for the table type,
+    as for Table.write().
+
+    Returns a writer object (see ChunkWriter), which should be closed once
+    all the chunks have been written, for example by using it in a with
+    statement::
+
+        with atpy.open_writer('catalog.hdf5') as writer:
+            for chunk in atpy.iter_read('catalog.fits'):
+                writer.write(chunk)
+    '''
+
+    schema = kwargs.pop('schema', None)
+
+    if 'verbose' in kwargs:
+        verbose = kwargs.pop('verbose')
+    else:
+        verbose = True
+
+    if 'type' in kwargs:
+        table_type = kwargs.pop('type').lower()
+    elif type(args[0]) == str:
+        table_type = registry._determine_type(args[0], verbose)
+    else:
+        raise Exception('Could not determine table type')
+
+    if not table_type in registry._chunk_writers:
+        raise Exception("Table type %s cannot be written in chunks" % table_type)
+
+    return registry._chunk_writers[table_type](*args, schema=schema, **kwargs)
+
+
+class ChunkWriter(object):
+    '''
+    Base class for the objects returned by open_writer(), which write out a
+    table one chunk of rows at a time.
+
+    Subclasses should define _open(table) to start writing the table, using
+    the metadata of the first chunk, _write(table) to write out the rows of
+    each chunk, and _close() to finish writing the table.
+
+    Optional Keyword Arguments:
+
+        *schema*: [ Schema or Table ]
+            The column headers of the table
+    '''
+
+    # Whether the format stores variable-length strings, in which case
+    # variable-length string columns are not converted to the string length
+    # of the schema
+    variable_length = False
+
+    def __init__(self, schema=None):
+        if isinstance(schema, Table):
+            schema = schema.schema
+        self.schema = schema
+        self.n_rows = 0
+        self._started = False
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, table):
+        '''
+        Write out the rows of a table. All the tables written should have the
+        same columns.
+
+        Required Arguments:
+
+            *table*: [ Table ]
+                The table containing the rows to write out
+        '''
+
+        if self._closed:
+            raise Exception("Writer is closed")
+
+        if self.schema is None:
+            self.schema = table.schema
+
+        table = self._conform(table)
+
+        if not self._started:
+            self._open(table)
+            self._started = True
+
+        self._write(table)
+
+        self.n_rows += len(table)
+
+    def close(self):
+        '''
+        Finish writing out the table. If no rows were written, an empty table
+        is written out if the column headers are known.
+        '''
+
+        if self._closed:
+            return
+
+        if not self._started and self.schema is not None:
+            table = Table()
+            for name in self.schema:
+                header = self.schema[name]
+                table.add_column(name, np.zeros(0, dtype=header.dtype),
+                                 column_header=header)
+            self.write(table)
+
+        if self._started:
+            self._close()
+
+        self._closed = True
+
+    def _conform(self, table):
+        '''
+        Return the table with its columns converted to the types of the
+        schema if needed
+        '''
+
+        if list(table.names) != list(self.schema.keys):
+            raise Exception("Column names do not match")
+
+        def conforms(name):
+            if self.variable_length and table._store.is_variable_length(name):
+                return True
+            return table.schema[name].dtype == self.schema[name].dtype
+
+        if all(conforms(name) for name in table.names):
+            return table
+
+        conformed = Table(name=table.table_name, masked=table._masked)
+
+        for name in table.names:
+
+            header = self.schema[name]
+            values = table._store.column(name)
+
+            if conforms(name):
+                conformed.add_column(name, values, column_header=table.schema[name])
+                continue
+
+            if isinstance(values, StringColumn):
+                values = values.to_array()
+
+            if values.dtype != header.dtype:
+                if not np.can_cast(values.dtype, header.dtype):
+                    raise Exception("Values in column %s do not fit in type %s"
+                                    % (name, header.dtype))
+                values = values.astype(header.dtype)
+
+            conformed.add_column(name, values, column_header=header)
+
+        conformed.keywords = table.keywords
+        conformed.comments = table.comments
+
+        return conformed
+
+    def _open(self, table):
+        raise NotImplementedError()
+
+    def _write(self, table):
+        raise NotImplementedError()
+
+    def _close(self):
+        raise NotImplementedError()
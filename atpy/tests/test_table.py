@@ -0,0 +1,529 @@
+from __future__ import division
+
+import bz2
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from .. import Table, iter_read, open_writer
+from .. import registry
+
+
+@contextmanager
+def temporary_directory():
+    directory = tempfile.mkdtemp()
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory)
+
+
+def simple_table(n=10):
+    t = Table(name='atpy_test')
+    t.add_column('a', np.arange(n))
+    t.add_column('b', np.arange(n) * 2.)
+    return t
+
+
+def test_columns_and_data_consistent():
+    t = simple_table()
+    t.add_column('c', np.ones((10, 3)), before='b')
+    assert t.names == ('a', 'c', 'b')
+    assert t.data.dtype.names == ('a', 'c', 'b')
+    t.data['b'][0] = -1.
+    assert t.b[0] == -1.
+    t.a = 5
+    assert np.all(t.data['a'] == 5)
+
+
+def test_remove_add_after_data():
+    t = simple_table()
+    t.data
+    t.remove_columns('a')
+    t.add_column('d', np.zeros(10))
+    assert t.data.dtype.names == ('b', 'd')
+    np.testing.assert_array_equal(t.data['b'], np.arange(10) * 2.)
+
+
+def test_add_columns():
+    t = simple_table()
+    t.add_columns([('c', np.ones(10)),
+                   ('d', np.arange(10), {'unit': 'km', 'dtype': np.int16})],
+                  after='a')
+    assert t.names == ('a', 'c', 'd', 'b')
+    assert t.columns['d'].unit == 'km'
+    assert t.d.dtype == np.int16
+
+
+def test_select_columns_shares_data():
+    t = simple_table()
+    t.add_column('c', np.ones(10))
+    t.data
+    p = t.select_columns(['c', 'a'])
+    assert p.names == ('c', 'a')
+    assert np.may_share_memory(p.a, t.a)
+    p.a[0] = 99
+    assert t.a[0] == 99
+    p.compact()
+    p.a[0] = 0
+    assert t.a[0] == 99
+    assert p.data.dtype.names == ('c', 'a')
+
+
+def test_where_chained():
+    t = simple_table(100)
+    t2 = t.where(t.a > 10).where(np.arange(89) % 2 == 0).rows([3, 1, -1])
+    np.testing.assert_array_equal(t2.a, [17, 13, 99])
+    np.testing.assert_array_equal(t2.data['b'], [34., 26., 198.])
+
+
+def test_where_independent():
+    t = simple_table()
+    t.add_keyword('origin', 'test')
+    t2 = t.where(t.a < 5)
+    t['a'] = 0
+    t.sort('b')
+    np.testing.assert_array_equal(t2.a, np.arange(5))
+    assert t2._schema is t._schema
+    t2.add_keyword('origin', 'subset')
+    t2.columns['a'].unit = 'm'
+    assert t.keywords['origin'] == 'test'
+    assert t.columns['a'].unit == ''
+    t3 = t.rows([1, 2])
+    t.columns['b'].format = '10.4f'
+    assert t3.columns['b'].format != '10.4f'
+    assert t3.columns['a'] is not t2.columns['a']
+    t2.b = -1.
+    assert np.all(t.b >= 0.)
+
+
+def test_where_parent_changed_in_place():
+    t = Table(masked=True)
+    t.add_column('a', np.arange(10))
+    t.add_column('b', np.arange(10) * 2., mask=np.arange(10) == 3)
+    s = t.where(t.a < 5)
+    r = t.rows([4, 3])
+    t.a[0] = 99
+    t.b.mask[3] = False
+    t.data['b'][4] = -1.
+    np.testing.assert_array_equal(s.a, [0, 1, 2, 3, 4])
+    np.testing.assert_array_equal(s.b.mask, [False, False, False, True, False])
+    np.testing.assert_array_equal(r.b.filled(0.), [8., 0.])
+    assert t.a[0] == 99 and t.b[4] == -1.
+
+
+def test_append_rows():
+    t = Table()
+    for i in range(50):
+        batch = simple_table(7)
+        batch.a = i
+        t.append_rows(batch)
+    assert len(t) == 350
+    assert len(t._store._buffers['a']) > len(t)
+    t.freeze()
+    assert t._store._buffers == {}
+    np.testing.assert_array_equal(t.a, np.repeat(np.arange(50), 7))
+    np.testing.assert_array_equal(t.data['b'], np.tile(np.arange(7) * 2., 50))
+
+
+def test_primary_key_loc():
+    t = simple_table()
+    t.a = np.arange(10) * 3 + 100
+    t.set_primary_key('a')
+    assert t.loc[103]['b'] == 2.
+    np.testing.assert_array_equal(t.loc[[127, 100]].b, [18., 0.])
+    t.append(t.where(t.b > 100.))
+    t2 = simple_table(3)
+    t.append_rows(t2)
+    assert t.loc[2]['b'] == 4.
+    assert t.where(t.b > 4.).loc[112]['b'] == 8.
+    try:
+        t.append(t2)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("duplicate keys were appended")
+
+
+def test_sorted_index():
+    t = simple_table(1000)
+    np.random.seed(1)
+    t.b = np.random.random(1000) * 20.
+    expected = t.where((t.b >= 12.) & (t.b <= 14.)).a
+    t.add_index('b')
+    np.testing.assert_array_equal(t.between('b', 12., 14.).a, expected)
+    sub = t.where(t.a % 3 == 0)
+    np.testing.assert_array_equal(sub.between('b', 12., 14.).a, expected[expected % 3 == 0])
+    np.testing.assert_array_equal(sub.rows([5, 1, 2]).between('b', 0., 20.).a, [15, 3, 6])
+    t.add_index('a')
+    np.testing.assert_array_equal(t.lookup('a', [7, 3, 7, 2000]).a, [3, 7])
+    t['b'] = 13.
+    assert len(t.between('b', 12., 14.)) == 1000
+
+
+def test_index_masked():
+    t = Table(masked=True)
+    t.add_column('x', np.array([1., 2., 3., 2.]), mask=[False, True, False, False])
+    expected_between = t.between('x', 1.5, 2.5).x
+    expected_lookup = t.lookup('x', [2., 3.]).x
+    np.testing.assert_array_equal(expected_between, [2.])
+    np.testing.assert_array_equal(expected_lookup, [3., 2.])
+    t.add_index('x')
+    np.testing.assert_array_equal(t.between('x', 1.5, 2.5).x, expected_between)
+    np.testing.assert_array_equal(t.lookup('x', [2., 3.]).x, expected_lookup)
+
+
+def test_index_after_parent_changes():
+    # Selections keep a correct index when the parent table is changed
+    t = simple_table()
+    t.add_index('b')
+    s = t.where(t.a < 5)
+    t.sort('b', reverse=True)
+    np.testing.assert_array_equal(s.between('b', 4., 6.).a, [2, 3])
+    s = t.where(t.a < 5)
+    t['b'] = 100.
+    np.testing.assert_array_equal(s.between('b', 0., 10.).a, [4, 3, 2, 1, 0])
+    t = simple_table()
+    t.add_index('b')
+    s = t.where(t.a < 5)
+    t.append(t)
+    np.testing.assert_array_equal(s.lookup('b', [4.]).a, [2])
+
+
+def test_join():
+    t1 = simple_table(6)
+    t1.columns['b'].unit = 'km'
+    t2 = Table()
+    t2.add_column('a', np.array([4, 2, 2, 9]))
+    t2.add_column('b', np.array([1., 2., 3., 4.]))
+    t2.add_column('c', np.array([10, 20, 30, 40]), null=-1)
+    j = t1.join(t2, 'a')
+    assert j.names == ('a', 'b_1', 'b_2', 'c')
+    np.testing.assert_array_equal(j.a, [2, 2, 4])
+    np.testing.assert_array_equal(j.b_2, [2., 3., 1.])
+    assert j.columns['b_1'].unit == 'km'
+    j = t1.join(t2, ['a'], how='left')
+    assert len(j) == 7
+    assert np.sum(j.c == -1) == 4
+    j = t1.join(t2, 'a', how='outer')
+    np.testing.assert_array_equal(j.a, [0, 1, 2, 2, 3, 4, 5, 9])
+    assert np.sum(np.isnan(j.b_1)) == 1
+
+
+def test_outer_join_promoted_keys():
+    t1 = Table()
+    t1.add_column('a', np.array([1, 2], dtype=np.int32))
+    t2 = Table()
+    t2.add_column('a', np.array([2, 2 ** 40], dtype=np.int64))
+    j = t1.join(t2, 'a', how='outer')
+    np.testing.assert_array_equal(j.a, [1, 2, 2 ** 40])
+    assert j.columns['a'].dtype == np.int64
+    assert j.columns['a'].dtype == j.a.dtype
+
+
+def test_group_by():
+    t = simple_table(9)
+    t.add_column('f', np.array([3, 1, 3, 1, 2, 3, 1, 1, 3]))
+    t.columns['b'].unit = 'mJy'
+    g = t.group_by('f').agg({'b': ['min', 'max', 'mean'], 'a': 'count'})
+    assert set(g.names) == set(['f', 'b_min', 'b_max', 'b_mean', 'a'])
+    np.testing.assert_array_equal(g.f, [1, 2, 3])
+    np.testing.assert_array_equal(g.a, [4, 1, 4])
+    np.testing.assert_array_equal(g.b_min, [2., 8., 0.])
+    np.testing.assert_array_equal(g.b_max, [14., 8., 16.])
+    np.testing.assert_allclose(g.b_mean, [8.5, 8., 7.5])
+    assert g.columns['b_mean'].unit == 'mJy'
+
+
+def test_sort_descending():
+    t = simple_table(6)
+    t.add_column('c', np.array([2, 1, 2, 1, 2, 1]))
+    t.sort(['c', 'b'], reverse=[False, True])
+    np.testing.assert_array_equal(t.a, [5, 3, 1, 4, 2, 0])
+    assert t._sorted_by == [('c', False), ('b', True)]
+    np.testing.assert_array_equal(t.between('c', 2, 2).a, [4, 2, 0])
+    np.testing.assert_array_equal(t.where(t.a > 1).lookup('c', [1]).a, [5, 3])
+    t.c = 0
+    assert t._sorted_by is None
+
+
+def test_query():
+    t = simple_table(200)
+    t.add_column('flag', np.arange(200) % 3)
+    t2 = t.query("a < 50 and (b > 10) & flag == 0 or a == 199")
+    expected = ((t.a < 50) & (t.b > 10) & (t.flag == 0)) | (t.a == 199)
+    np.testing.assert_array_equal(t2.a, t.a[expected])
+    t3 = t.where(t.a % 2 == 0).query("~(flag != 1) & sqrt(b) >= 10")
+    np.testing.assert_array_equal(t3.a, [52, 58, 64] + list(range(70, 200, 6)))
+    try:
+        t.query("a.__class__")
+    except Exception:
+        pass
+    else:
+        raise AssertionError("attribute access was allowed in query")
+
+
+def test_query_masked():
+    t = Table(masked=True)
+    t.add_column('a', np.arange(5))
+    t.add_column('x', np.array([0., 2., 3., 0., 5.]), mask=[False, False, True, True, False])
+    np.testing.assert_array_equal(t.query("x > 1").a, [1, 4])
+    np.testing.assert_array_equal(t.query("~(x > 1)").a, [0])
+    np.testing.assert_array_equal(t.query("not x > 1 or a == 3").a, [0, 3])
+    np.testing.assert_array_equal(t.query("not (x > 1 and a > 2)").a, [0, 1, 2])
+
+
+def test_iter_chunks_rows():
+    t = simple_table(25)
+    chunks = list(t.iter_chunks(10))
+    assert [len(chunk['a']) for chunk in chunks] == [10, 10, 5]
+    assert np.may_share_memory(chunks[1]['b'], t.b)
+    tables = list(t.where(t.a % 2 == 1).iter_chunks(5, as_table=True))
+    np.testing.assert_array_equal(tables[2].a, [21, 23])
+    rows = list(t.iter_rows(named=True, chunk_size=7))
+    assert len(rows) == 25
+    assert rows[12].a == 12 and rows[12].b == 24.
+    assert type(rows[12].a) is int
+
+
+def test_columns_order():
+    t = simple_table()
+    t.add_column('c', np.ones(10), before='b')
+    t.add_column('d', np.ones(10), position=0)
+    t.rename_column('a', 'e')
+    t.remove_columns(['c'])
+    assert t.columns.keys == ['d', 'e', 'b']
+    assert t.columns.index('b') == 2
+    assert t.columns['b'] is t.columns[2]
+
+
+def test_shared_schema():
+    t1 = simple_table()
+    t2 = simple_table(5)
+    t2.schema = t1.schema
+    assert t2._schema is t1._schema
+    t1.append(t2)
+    assert len(t1) == 15
+    t2.columns['a'].unit = 'km'
+    assert t1.columns['a'].unit == ''
+    assert t1._schema != t2._schema
+
+
+def test_null_bitmaps():
+    t = Table(masked=True)
+    t.add_column('a', [1, 2, 3, 4], mask=[False, True, False, True])
+    t.add_column('b', [1., 2., 3., 4.])
+    assert t._store.null_count('a') == 2
+    assert t._store.null_count('b') == 0
+    assert 'a' in t._store._validity
+    assert 'b' not in t._store._validity
+    t2 = t.where(t.b > 1.5)
+    assert np.all(t2.a.mask == [True, False, True])
+    t2.append_rows(t)
+    t2.freeze()
+    assert t2._store.null_count('a') == 4
+    assert np.all(t2.a.mask == [True, False, True, False, True, False, True])
+
+
+def test_stats():
+    t = Table()
+    t.add_column('a', [3, 1, -999, 5], null=-999)
+    s = t.stats('a')
+    assert s.min == 1 and s.max == 5
+    assert s.count == 3 and s.null_count == 1
+    np.testing.assert_allclose(s.mean, 3.)
+    assert 'a' in t._stats
+    t.a = [1, 2, 3, 4]
+    assert not 'a' in t._stats
+    assert t.stats('a').max == 4
+    t.append(t)
+    assert t.stats('a').count == 8
+
+
+def test_compact_narrow():
+    t = Table()
+    t.add_column('a', [3, 1, -999, 5], null=-999)
+    t.add_column('b', [0, 1, 1, 0])
+    t.add_column('c', [1.5, 2.25, np.nan, 4.])
+    t.add_column('d', [0.1, 0.2, 0.3, 0.4])
+    assert t.compact(narrow=True) == 4 * (6 + 7 + 4)
+    assert t.a.dtype == np.int16 and t.columns['a'].dtype == np.int16
+    assert t.b.dtype == bool
+    assert t.c.dtype == np.float32
+    assert t.d.dtype == np.float64
+    assert t.compact(narrow=True, tolerance=1.e-6) == 16
+    assert t.d.dtype == np.float32
+
+
+def test_categorical():
+    t = Table()
+    t.add_column('f', np.array([b'V', b'B', b'R', b'V', b'B']), categorical=True)
+    t.add_column('x', [1, 2, 3, 4, 5])
+    assert t._store.codes('f').dtype == np.uint8
+    assert np.all(t.f == [b'V', b'B', b'R', b'V', b'B'])
+    assert np.all(t.query("f == 'V'").x == [1, 4])
+    assert np.all(t.query("f > 'B'").x == [1, 3, 4])
+    t.sort('f')
+    assert np.all(t.x == [2, 5, 3, 1, 4])
+    u = Table()
+    u.add_column('f', np.array([b'A']))
+    u.add_column('x', [6])
+    t.append(u)
+    assert np.all(t.f == [b'B', b'B', b'R', b'V', b'V', b'A'])
+    assert np.all(t.data['f'] == t.f)
+
+
+def test_variable_length():
+    t = Table()
+    t.add_column('c', ['hello', 'a' * 100, 'hi', '', 'help'], variable_length=True)
+    t.add_column('x', [1, 2, 3, 4, 5])
+    assert t._store._strings['c'].nbytes == 111
+    assert np.all(t.c.lengths() == [5, 100, 2, 0, 4])
+    assert np.all((t.c == 'hi') == [False, False, True, False, False])
+    assert np.all(t.query("startswith(c, 'he')").x == [1, 5])
+    t2 = t.where(t.x != 2)
+    assert t2.c[0] == b'hello'
+    t2.compact()
+    assert t2._store._strings['c'].nbytes == 11
+    t2.sort('c')
+    assert np.all(t2.x == [4, 1, 5, 3])
+    t2.append(t2)
+    assert np.all(t2.data['c'] == [b'', b'hello', b'help', b'hi'] * 2)
+
+
+def test_concatenate():
+    t1 = Table(name='a')
+    t1.add_column('x', np.array([1, 2], dtype=np.int16))
+    t1.add_column('s', ['a', 'b'])
+    t1.add_keyword('field', 1)
+    t2 = Table()
+    t2.add_column('x', np.array([3], dtype=np.int64))
+    t2.add_column('s', ['ccc'])
+    t = Table.concatenate([t1, t2, t1])
+    assert t.table_name == 'a'
+    assert t.keywords['field'] == 1
+    assert t.x.dtype == np.int64
+    assert t.columns['s'].dtype.itemsize == t.s.dtype.itemsize == t2.s.dtype.itemsize
+    assert np.all(t.x == [1, 2, 3, 1, 2])
+    t = Table.concatenate(table for table in [t2, t1])
+    assert np.all(t.s == ['ccc', 'a', 'b'])
+
+
+# Lists the modules loaded by 'import atpy' in a new interpreter
+IMPORT_SCRIPT = """
+import sys
+import atpy
+print(' '.join(sys.modules))
+"""
+
+
+def test_import_lazy():
+    # The modules for each table type are only imported when needed
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT])
+    modules = output.decode('ascii').split()
+    for module in ['atpy.fitstable', 'atpy.votable', 'atpy.hdf5table',
+                   'atpy.sqltable', 'atpy.ipactable', 'atpy.asciitables',
+                   'atpy.htmltable', 'atpy.irsa_service', 'atpy.vo_conesearch',
+                   'astropy', 'h5py', 'sqlite3']:
+        assert not module in modules
+
+
+def test_detect_type():
+    header = b'\\fixlen = T\n|   a|\n| int|\n    1\n'
+    compressed = io.BytesIO()
+    f = gzip.GzipFile(fileobj=compressed, mode='wb')
+    f.write(header)
+    f.close()
+    for data in [header, compressed.getvalue(), bz2.compress(header)]:
+        table_type, args = registry._detect_type((io.BytesIO(data),), False)
+        assert table_type == 'ipac'
+        assert args[0].read() == header
+    try:
+        registry._detect_type((io.BytesIO(b'SQLite format 3\x00'),), False)
+    except Exception as e:
+        assert 'local file' in str(e)
+    else:
+        raise AssertionError("SQLite file object was accepted")
+    assert registry._detect_type(('sqlite', 'example.db'), False)[0] == 'sql'
+    # URLs with a known extension are not downloaded
+    url = 'http://example.invalid/catalog.tbl'
+    assert registry._detect_type((url,), False) == ('ipac', (url,))
+
+
+def test_detect_type_text():
+    assert not registry._is_ipac(b'\\begin{table}\n\\centering\n')
+    assert not registry._is_ipac(b'\\fixlen = T\na b c\n')
+    with temporary_directory() as directory:
+        # Text that is not an IPAC header is left to the extension
+        for name in ['x.tex', 'x.txt']:
+            filename = os.path.join(directory, name)
+            with open(filename, 'wb') as f:
+                f.write(b'\\begin{table}\n\\begin{tabular}{|c|c|}\n')
+            try:
+                registry._detect_type((filename,), False)
+            except Exception as e:
+                assert 'extension' in str(e)
+            else:
+                raise AssertionError("%s was detected as a table" % name)
+        # A registered extension wins over text detection
+        filename = os.path.join(directory, 'x.rdb')
+        with open(filename, 'wb') as f:
+            f.write(b'|   a|\n| int|\n    1\n')
+        assert registry._detect_type((filename,), False)[0] == 'rdb'
+
+
+def test_iter_read():
+    t = simple_table(n=25)
+    t.add_keyword('field', 'm31')
+    with temporary_directory() as directory:
+        filename = os.path.join(directory, 'test.tbl')
+        t.write(filename, type='ipac')
+        chunks = list(iter_read(filename, chunk_rows=10, verbose=False))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert chunks[2]._schema is chunks[0]._schema
+    assert chunks[2].keywords['field'] == 'm31'
+    assert np.all(chunks[2].a == np.arange(20, 25))
+
+
+def test_open_writer():
+    t = simple_table(n=25)
+    t.add_column('c', np.array([b'a', b'abc', b'ab', b'', b'a'] * 5))
+    t.add_keyword('field', 'm31')
+    with temporary_directory() as directory:
+        filename = os.path.join(directory, 'test.tbl')
+        with open_writer(filename, schema=t.schema) as writer:
+            for chunk in t.iter_chunks(10, as_table=True):
+                writer.write(chunk.where(chunk.c != b'abc'))
+        u = Table(filename, verbose=False)
+    assert writer.n_rows == 20
+    assert u.keywords['field'] == 'm31'
+    assert np.all(u.a == t.a[t.c != b'abc'])
+    assert np.all(u.c.astype(t.c.dtype) == t.c[t.c != b'abc'])
+
+
+def test_read_columns():
+    t = simple_table(n=25)
+    t.add_column('c', np.arange(25) * 3)
+    with temporary_directory() as directory:
+        filename = os.path.join(directory, 'test.tbl')
+        t.write(filename, type='ipac')
+        u = Table(filename, columns=['c', 'a'], verbose=False)
+        assert u.names == ('c', 'a')
+        assert np.all(u.c == t.c)
+        chunks = list(iter_read(filename, columns=['b'], chunk_rows=10, verbose=False))
+        assert chunks[0].names == ('b',)
+        # Columns selected by a query are removed after reading
+        filename = os.path.join(directory, 'test.db')
+        t.write('sqlite', filename)
+        u = Table('sqlite', filename, table='atpy_test',
+                  query='select * from atpy_test', columns=['b', 'a'],
+                  verbose=False)
+    assert u.names == ('b', 'a')
+    assert np.all(u.b == t.b)
@@ -0,0 +1,272 @@
+from __future__ import print_function, division
+
+import numpy as np
+import numpy.ma as ma
+
+# The start and end position of each string in the buffer
+SPAN_DTYPE = np.dtype([('start', np.int64), ('end', np.int64)])
+
+
+def _ranges(starts, lengths):
+    '''
+    Return the positions start, start + 1, ..., start + length - 1 for each
+    pair of values in starts and lengths, concatenated
+    '''
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total)
+
+
+def _spans(lengths):
+    '''
+    Return the spans of consecutive strings with the given lengths
+    '''
+    spans = np.empty(len(lengths), dtype=SPAN_DTYPE)
+    spans['end'] = np.cumsum(lengths)
+    spans['start'] = spans['end'] - lengths
+    return spans
+
+
+def _to_bytes(array):
+    # ndarray.tobytes was only added in numpy 1.9, and tostring was removed
+    # in numpy 2.0
+    if hasattr(array, 'tobytes'):
+        return array.tobytes()
+    else:
+        return array.tostring()
+
+
+def _as_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    elif isinstance(value, type(u'')):
+        return value.encode('utf-8')
+    else:
+        return str(value).encode('utf-8')
+
+
+class StringColumn(object):
+    '''
+    A column of variable-length byte strings. The strings are stored one
+    after the other in a single buffer of bytes, and the column holds the
+    start and end position of each string in the buffer. Selecting rows only
+    selects the positions, so that the buffer is shared with the original
+    column.
+
+    Required Arguments:
+
+        *spans*: [ numpy array ]
+            An array with the SPAN_DTYPE type giving the start and end
+            position of each string
+
+        *buffer*: [ numpy array ]
+            An array of bytes (with type uint8) containing the strings
+
+    Optional Keyword Arguments:
+
+        *mask*: [ numpy array ]
+            An array of booleans indicating which values are masked
+    '''
+
+    def __init__(self, spans, buffer, mask=None):
+        self.spans = spans
+        self.buffer = buffer
+        if mask is ma.nomask:
+            mask = np.zeros(len(spans), dtype=bool)
+        self.mask = mask
+
+    @classmethod
+    def from_values(cls, values, mask=None):
+        '''
+        Create a column from a sequence of strings, or from an array of
+        fixed-length strings
+        '''
+
+        if isinstance(values, StringColumn):
+            return cls(values.spans, values.buffer, mask=mask)
+
+        if isinstance(values, ma.MaskedArray):
+            if mask is None:
+                mask = ma.getmaskarray(values)
+            values = ma.getdata(values)
+
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'S':
+
+            # Copy the characters of each string without the padding
+            values = values.ravel()
+            lengths = np.char.str_len(values).astype(np.int64)
+            characters = values.view(np.uint8).reshape(len(values), values.itemsize)
+            buffer = characters[np.arange(values.itemsize) < lengths[:, np.newaxis]]
+
+        else:
+
+            strings = [_as_bytes(value) for value in values]
+            lengths = np.array([len(string) for string in strings], dtype=np.int64)
+            buffer = np.frombuffer(b''.join(strings), dtype=np.uint8).copy()
+
+        return cls(_spans(lengths), buffer, mask=mask)
+
+    @classmethod
+    def concatenate(cls, columns):
+        '''
+        Create a column containing the strings of several columns, one after
+        the other, with a single buffer holding only these strings
+        '''
+        columns = [column.compact() for column in columns]
+        if len(columns) == 0:
+            return cls(np.zeros(0, dtype=SPAN_DTYPE), np.zeros(0, dtype=np.uint8))
+        lengths = np.concatenate([column.lengths() for column in columns])
+        buffer = np.concatenate([column.buffer for column in columns])
+        return cls(_spans(lengths), buffer)
+
+    def __len__(self):
+        return len(self.spans)
+
+    @property
+    def shape(self):
+        return (len(self.spans),)
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def size(self):
+        return len(self.spans)
+
+    @property
+    def itemsize(self):
+        '''
+        The length of the longest string
+        '''
+        if len(self.spans) == 0:
+            return 0
+        return int(self.lengths().max())
+
+    @property
+    def dtype(self):
+        '''
+        The type of a fixed-length string array that can hold all the values
+        '''
+        return np.dtype('S%i' % max(self.itemsize, 1))
+
+    @property
+    def nbytes(self):
+        return self.spans.nbytes + self.buffer.nbytes
+
+    def lengths(self):
+        '''
+        Return the length of each string
+        '''
+        return self.spans['end'] - self.spans['start']
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            span = self.spans[item]
+            return _to_bytes(self.buffer[span['start']:span['end']])
+        if self.mask is None:
+            mask = None
+        else:
+            mask = self.mask[item]
+        return StringColumn(self.spans[item], self.buffer, mask=mask)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tolist(self):
+        return list(self)
+
+    def _match(self, value, prefix):
+        '''
+        Return whether each string is equal to (or starts with) a value
+        '''
+
+        value = np.frombuffer(_as_bytes(value), dtype=np.uint8)
+        lengths = self.lengths()
+
+        if prefix:
+            candidates = np.flatnonzero(lengths >= len(value))
+        else:
+            candidates = np.flatnonzero(lengths == len(value))
+
+        result = np.zeros(len(self), dtype=bool)
+
+        if len(value) == 0:
+            result[candidates] = True
+        elif len(candidates) > 0:
+            positions = self.spans['start'][candidates][:, np.newaxis] + np.arange(len(value))
+            result[candidates] = np.all(self.buffer[positions] == value, axis=1)
+
+        return self._with_mask(result)
+
+    def _with_mask(self, result):
+        if self.mask is None:
+            return result
+        return ma.array(result, mask=self.mask)
+
+    def equal(self, value):
+        '''
+        Return whether each string is equal to a value
+        '''
+        return self._match(value, False)
+
+    def startswith(self, prefix):
+        '''
+        Return whether each string starts with a prefix
+        '''
+        return self._match(prefix, True)
+
+    def __eq__(self, other):
+        return self.equal(other)
+
+    def __ne__(self, other):
+        return ~self.equal(other)
+
+    __hash__ = None
+
+    def to_array(self):
+        '''
+        Return the strings as an array of fixed-length strings (a masked array
+        if the column has a mask)
+        '''
+        lengths = self.lengths()
+        array = np.zeros(len(self), dtype=self.dtype)
+        if array.itemsize > 0 and len(array) > 0:
+            characters = array.view(np.uint8).reshape(len(array), array.itemsize)
+            characters[np.arange(array.itemsize) < lengths[:, np.newaxis]] = \
+                self.buffer[_ranges(self.spans['start'], lengths)]
+        return self._with_mask(array)
+
+    def __array__(self, dtype=None, copy=None):
+        array = ma.getdata(self.to_array())
+        if dtype is not None:
+            array = array.astype(dtype)
+        return array
+
+    def compact(self):
+        '''
+        Return a copy of the column with a buffer only containing the
+        strings of the column, in order
+        '''
+        lengths = self.lengths()
+        buffer = self.buffer[_ranges(self.spans['start'], lengths)]
+        return StringColumn(_spans(lengths), buffer, mask=self.mask)
+
+    def __repr__(self):
+        n = len(self)
+        if n > 6:
+            positions = [0, 1, 2, None, n - 3, n - 2, n - 1]
+        else:
+            positions = range(n)
+        values = []
+        for position in positions:
+            if position is None:
+                values.append('...')
+            elif self.mask is not None and self.mask[position]:
+                values.append('--')
+            else:
+                values.append(repr(self[position]))
+        return "StringColumn([%s])" % ", ".join(values)
@@ -41,7 +41,8 @@ def _list_tables(filename, pedantic=False):
 @auto_download_to_file
 @auto_decompress_to_fileobj
 @auto_fileobj_to_file
-def read(self, filename, pedantic=False, tid=-1, verbose=True):
+def read(self, filename, pedantic=False, tid=-1, verbose=True, variable_length=False,
+         columns=None):
     '''
     Read a table from a VOT file
 
@@ -59,6 +60,16 @@ def read(self, filename, pedantic=False, tid=-1, verbose=True):
         *pedantic*: [ True | False ]
             When *pedantic* is True, raise an error when the file violates
             the VO Table specification, otherwise issue a warning.
+
+        *variable_length*: [ True | False ]
+            Whether to read variable-length string fields (with
+            arraysize="*") into variable-length string columns (see
+            Table.set_variable_length) rather than fixed-length string
+            columns.
+
+        *columns*: [ list of strings ]
+            The IDs of the fields to read. Only these fields are
+            converted when parsing the VO file.
     '''
 
     self.reset()
@@ -73,17 +84,29 @@ def read(self, filename, pedantic=False, tid=-1, verbose=True):
         else:
             raise TableException(tables, 'tid')
 
-    votable = parse(filename, pedantic=pedantic)
+    votable = parse(filename, pedantic=pedantic, columns=columns)
     for id, table in enumerate(votable.iter_tables()):
         if id==tid:
             break
 
+    # The fields that were not requested are not present in the array
+    if columns is None:
+        fields = table.fields
+    else:
+        fields = dict((str(field.ID), field) for field in table.fields)
+        for name in columns:
+            if not name in fields:
+                raise Exception("Column %s does not exist" % name)
+        fields = [fields[name] for name in columns]
+
     if table.ID:
         self.table_name = str(table.ID)
     elif table.name:
         self.table_name = str(table.name)
 
-    for field in table.fields:
+    new_columns = []
+
+    for field in fields:
 
         colname = field.ID
 
@@ -92,17 +115,26 @@ def read(self, filename, pedantic=False, tid=-1, verbose=True):
         else:
             data = np.array([], dtype=field.converter.format)
 
-        if len(data) > 0 and data.ndim == 1 and not np.all([np.isscalar(x) for x in data]):
+        vlen_field = field.datatype in ['char', 'unicodeChar'] and \
+            field.arraysize is not None and field.arraysize.endswith('*')
+
+        # String fields do not need to be checked for vector values
+        if not vlen_field and len(data) > 0 and data.ndim == 1 and \
+            data.dtype.type == np.object_ and not np.all([np.isscalar(x) for x in data]):
             warnings.warn("VO Variable length vector column detected (%s) - converting to string" % colname)
             data = np.array([str(x) for x in data])
 
         if self._masked:
-            self.add_column(str(colname), np.array(data), \
-                unit=field.unit, mask=data.mask[colname], \
-                description=field.description)
+            new_columns.append((str(colname), np.array(data), \
+                {'unit': field.unit, 'mask': data.mask[colname], \
+                 'description': field.description,
+                 'variable_length': variable_length and vlen_field}))
         else:
-            self.add_column(str(colname), np.array(data),
-                unit=field.unit, description=field.description)
+            new_columns.append((str(colname), np.array(data), \
+                {'unit': field.unit, 'description': field.description,
+                 'variable_length': variable_length and vlen_field}))
+
+    self.add_columns(new_columns)
 
     for param in table.params:
         self.add_keyword(param.ID, param.value)
@@ -131,7 +163,7 @@ def _to_table(self, vo_table):
     fields = []
     for i, name in enumerate(self.names):
 
-        data = self.data[name]
+        data = self[name]
         unit = self.columns[name].unit
         description = self.columns[name].description
         dtype = self.columns[name].dtype
@@ -197,7 +229,19 @@ def _to_table(self, vo_table):
         # At the moment, null values in VO table are dealt with via a
         # 'mask' record array
 
-        if column_type == np.string_:
+        if self._store.is_variable_length(name):
+            column = self._store.column(name)
+            values = np.empty(len(column), dtype=np.object_)
+            values[:] = column.tolist()
+            table.array[name] = values
+            if self._masked:
+                table.array.mask[name] = column.mask
+            else:
+                null = self.columns[name].null
+                if type(null) != bytes:
+                    null = str(null).encode('utf-8')
+                table.array.mask[name] = column.equal(null)
+        elif column_type == np.string_:
             table.array[name] = self.data[name].astype(np.object_)
             if self._masked:
                 table.array.mask[name] = self.data[name].mask.astype(np.object_)